@@ -3,10 +3,11 @@ import cv2
 import numpy as np
 import os
 from mtcnn import MTCNN
-from keras_facenet import FaceNet
 from pymongo import MongoClient
 from sklearn.metrics.pairwise import cosine_similarity
 from env_config import get_required_env
+from frame_source import open_frame_source, strip_source_args
+from embedding_store import EMBEDDING_MODEL_VERSION, load_embedder, select_embeddings, stored_model
 
 # MongoDB Setup
 client = MongoClient(get_required_env("MONGODB_URI"))
@@ -14,7 +15,7 @@ db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
 users_collection = db['users']
 
 # Initialize FaceNet embedder and MTCNN face detector
-embedder = FaceNet()
+embedder = load_embedder()
 detector = MTCNN()
 
 def align_face(face, output_size=(160, 160)):
@@ -25,7 +26,11 @@ def get_embeddings_from_db(email):
     """Retrieve stored embeddings from MongoDB for a given user."""
     user_data = users_collection.find_one({"email": email})
     if user_data and "embeddings" in user_data:
-        return [np.array(embedding) for embedding in user_data['embeddings']]
+        embeddings = select_embeddings(user_data)
+        if embeddings is None:
+            print(f"Embeddings for {email} are from {stored_model(user_data)}, not {EMBEDDING_MODEL_VERSION}; re-register first.")
+            return None
+        return [np.array(embedding) for embedding in embeddings]
     else:
         print(f"No embeddings found for user {email}.")
         return None
@@ -36,9 +41,9 @@ def authenticate_user(email, threshold=0.5):
     if stored_embeddings is None:
         return False
 
-    cap = cv2.VideoCapture(0)
+    cap = open_frame_source()
     if not cap.isOpened():
-        raise IOError("Cannot open webcam")
+        raise IOError(f"Cannot open {cap.kind} source")
 
     print("Capturing face for authentication. Press 'q' to quit.")
     authenticated = False
@@ -46,6 +51,8 @@ def authenticate_user(email, threshold=0.5):
     while True:
         ret, frames = cap.read()
         if not ret:
+            if cap.exhausted:
+                break
             continue
 
         faces = detector.detect_faces(frames)
@@ -90,8 +97,9 @@ def authenticate_user(email, threshold=0.5):
 import sys
 
 if __name__ == "__main__":
+    strip_source_args(sys.argv)
     if len(sys.argv) != 2:
-        print("Usage: python Authentication.py <email>")
+        print("Usage: python Authentication.py <email> [--source SPEC] [--pace realtime|fast|FPS] [--once]")
         sys.exit(1)
     
     email = sys.argv[1]
@@ -2,53 +2,54 @@ import cv2
 import numpy as np
 import os
 from mtcnn import MTCNN
-from keras_facenet import FaceNet
-import datetime
 from pymongo import MongoClient
 from env_config import get_required_env
+from frame_source import open_frame_source, strip_source_args
+from embedding_store import CROPS_COLLECTION, align_crop, embedding_update, extract_crop, load_embedder, save_face_crops
 
 # MongoDB Setup
 client = MongoClient(get_required_env("MONGODB_URI"))
 db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
 users_collection = db['users']
+crops_collection = db[CROPS_COLLECTION]
 
 # Initialize FaceNet embedder and MTCNN face detector
-embedder = FaceNet()
+embedder = load_embedder()
 detector = MTCNN()
 
-def align_face(face, output_size=(160, 160)):
-    return cv2.resize(face, output_size)
-
-def save_face_embeddings_to_db(name, email, face_embeddings):
+def save_face_embeddings_to_db(name, email, face_embeddings, face_crops=None):
     try:
-        # Update existing user with face embeddings
-        result = users_collection.update_one(
-            {"email": email},
-            {"$set": {
-                "embeddings": [embedding.tolist() for embedding in face_embeddings],
-                "face_updated_at": datetime.datetime.now()
-            }}
-        )
+        # Update existing user with face embeddings (same update as the streaming registration)
+        result = users_collection.update_one({"email": email}, embedding_update(face_embeddings))
         if result.matched_count > 0:
             print(f"Face embeddings saved for user: {name}")
         else:
             print(f"User not found: {email}")
             raise Exception(f"User not found: {email}")
+        if face_crops:
+            # Retained so embeddings can be regenerated when the model changes (see reembed.py)
+            try:
+                save_face_crops(crops_collection, email, face_crops)
+            except Exception as crop_err:
+                print(f"Warning: Could not store face crops for {email}: {crop_err}")
     except Exception as e:
         print("Error saving face embeddings to MongoDB:", e)
         raise e
 
 def capture_and_save_multiple_embeddings(name, email, max_images):
-    cap = cv2.VideoCapture(0)
+    cap = open_frame_source()
     if not cap.isOpened():
-        raise IOError("Cannot open webcam")
+        raise IOError(f"Cannot open {cap.kind} source")
 
     print(f"Capturing up to {max_images} face embeddings. Press 'q' to stop early.")
     face_embeddings = []
+    face_crops = []
 
     while len(face_embeddings) < max_images:
         ret, frames = cap.read()
         if not ret:
+            if cap.exhausted:
+                break
             continue
 
         faces = detector.detect_faces(frames)
@@ -57,18 +58,18 @@ def capture_and_save_multiple_embeddings(name, email, max_images):
                 x1, y1, width, height = face['box']
                 x1, y1 = max(0, x1), max(0, y1)
                 x2, y2 = x1 + width, y1 + height
-                face_pixels = frames[y1:y2, x1:x2]
+                crop, crop_box = extract_crop(frames, face['box'])
 
-                if face_pixels.size == 0:
+                if crop.size == 0 or crop_box[2] <= 0 or crop_box[3] <= 0:
                     continue
 
-                face_pixels = cv2.cvtColor(face_pixels, cv2.COLOR_BGR2RGB)
-                face_pixels = align_face(face_pixels)
-                face_pixels = np.expand_dims(face_pixels, axis=0)
+                face_pixels = np.expand_dims(align_crop(crop, crop_box), axis=0)
                 face_embedding = embedder.embeddings(face_pixels)
 
                 if face_embedding is not None and face_embedding.size > 0:
                     face_embeddings.append(face_embedding.flatten())
+                    # Copied before the boxes are drawn onto the frame it was sliced from
+                    face_crops.append((crop.copy(), crop_box))
                     print(f"Captured image {len(face_embeddings)} of {max_images}.")
                     cv2.rectangle(frames, (x1, y1), (x2, y2), (0, 255, 0), 2)
                     cv2.putText(frames, f"Captured {len(face_embeddings)}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
@@ -84,7 +85,7 @@ def capture_and_save_multiple_embeddings(name, email, max_images):
     cv2.destroyAllWindows()
 
     if face_embeddings:
-        save_face_embeddings_to_db(name, email, face_embeddings)
+        save_face_embeddings_to_db(name, email, face_embeddings, face_crops)
     else:
         print("No face embeddings captured.")
         raise Exception("No face embeddings captured.")
@@ -93,8 +94,9 @@ def capture_and_save_multiple_embeddings(name, email, max_images):
 import sys
 
 if __name__ == "__main__":
+    strip_source_args(sys.argv)
     if len(sys.argv) != 3:
-        print("Usage: python Registration.py <name> <email>")
+        print("Usage: python Registration.py <name> <email> [--source SPEC] [--pace realtime|fast|FPS] [--once]")
         sys.exit(1)
     
     name = sys.argv[1]
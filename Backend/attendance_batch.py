@@ -0,0 +1,241 @@
+"""Offline attendance extraction from a recorded video.
+
+Frames are sampled at --sample-fps, split into time-range chunks and fanned out to
+worker processes that run MTCNN detection and batched FaceNet embedding. The parent
+matches every face against the registered gallery once, deduplicates identities across
+the whole video and writes a standard `attendances` session document (plus first-seen
+offsets) through the same write-behind path as live sessions.
+
+Usage: python attendance_batch.py VIDEO [--sample-fps 2] [--workers N] [--threshold 0.5]
+                                  [--recorded-at 2024-05-01T09:00:00] [--min-sightings 1] [--dry-run]
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from crowd_batch import plan_chunks
+
+FACE_SIZE = (160, 160)
+EMBED_BATCH = 64
+
+_detector = None
+_embedder = None
+
+
+def _init_worker(threads):
+    global _detector, _embedder
+    cv2.setNumThreads(1)
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except Exception:
+        pass
+    from mtcnn import MTCNN
+    from embedding_store import load_embedder
+    _detector = MTCNN()
+    _embedder = load_embedder()
+
+
+def embed_chunk(task):
+    """Worker: embeddings of every face on the sampled frames of one chunk, as (offset_s, float32 vector)."""
+    path, fps, start_frame, end_frame, stride = task
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return {"error": f"Cannot open {path}", "faces": [], "seconds": 0.0}
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    # Crops are embedded every EMBED_BATCH faces, so a worker holds at most one batch of them
+    crops, offsets, faces = [], [], []
+
+    def embed_pending():
+        vectors = _embedder.embeddings(np.stack(crops)).astype(np.float32)
+        faces.extend(zip(offsets, vectors))
+        crops.clear()
+        offsets.clear()
+
+    index = start_frame
+    try:
+        while index < end_frame:
+            if (index - start_frame) % stride:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            offset = index / fps
+            index += 1
+            # Same detection/alignment as the live multi-face loop so scores are comparable
+            for face in _detector.detect_faces(frame) or []:
+                x1, y1, width, height = face['box']
+                x1, y1 = max(0, x1), max(0, y1)
+                face_pixels = frame[y1:y1 + height, x1:x1 + width]
+                if face_pixels.size == 0:
+                    continue
+                crops.append(cv2.resize(cv2.cvtColor(face_pixels, cv2.COLOR_BGR2RGB), FACE_SIZE))
+                offsets.append(offset)
+                if len(crops) >= EMBED_BATCH:
+                    embed_pending()
+    finally:
+        cap.release()
+    if crops:
+        embed_pending()
+    return {"faces": faces, "seconds": (index - start_frame) / fps}
+
+
+class IdentityTracker:
+    """Deduplicates matches across the video, keeping first/last sighting and best similarity per user."""
+
+    def __init__(self):
+        self.people = {}
+
+    def add(self, match, offset):
+        person = self.people.get(match["email"])
+        if person is None:
+            self.people[match["email"]] = {
+                "email": match["email"],
+                "name": match["name"],
+                "similarity": match["similarity"],
+                "first_seen_s": offset,
+                "last_seen_s": offset,
+                "sightings": 1,
+            }
+            return
+        person["similarity"] = max(person["similarity"], match["similarity"])
+        person["first_seen_s"] = min(person["first_seen_s"], offset)
+        person["last_seen_s"] = max(person["last_seen_s"], offset)
+        person["sightings"] += 1
+
+    def recognized(self, min_sightings, recorded_at):
+        users = []
+        for person in sorted(self.people.values(), key=lambda p: p["first_seen_s"]):
+            if person["sightings"] < min_sightings:
+                continue
+            users.append({
+                **person,
+                "similarity": round(person["similarity"], 4),
+                "first_seen_s": round(person["first_seen_s"], 2),
+                "last_seen_s": round(person["last_seen_s"], 2),
+                "first_seen_at": recorded_at + person["first_seen_s"],
+            })
+        return users
+
+
+def _parse_recorded_at(value, path):
+    if value:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    # Best guess for a recording: when the file was last written
+    return os.path.getmtime(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline attendance extraction from a recorded video")
+    parser.add_argument("video")
+    parser.add_argument("--sample-fps", type=float, default=2.0, help="frames analysed per second of video")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--chunk-seconds", type=float, default=60.0)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--min-sightings", type=int, default=1, help="sightings needed before a user counts as present")
+    parser.add_argument("--recorded-at", help="ISO start time of the recording (default: file modification time)")
+    parser.add_argument("--session-id", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="print the session document instead of saving it")
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    from env_config import get_required_env
+    from face_gallery import load_gallery
+
+    client = MongoClient(get_required_env("MONGODB_URI"))
+    db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
+    gallery = load_gallery(db['users'])
+    print(f"[VideoAttendance] Gallery: {gallery.load_stats}")
+    if len(gallery) == 0:
+        print("[VideoAttendance] No registered users with embeddings found.")
+        sys.exit(1)
+
+    cap = cv2.VideoCapture(args.video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+    stride = max(1, int(round(fps / args.sample_fps)))
+    tasks, total_seconds = plan_chunks([args.video], args.chunk_seconds, stride)
+    if not tasks:
+        sys.exit(1)
+    workers = max(1, min(args.workers, len(tasks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"[VideoAttendance] {len(tasks)} chunks, every {stride}th frame, {workers} workers x {threads} threads")
+
+    tracker = IdentityTracker()
+    started = time.perf_counter()
+    done_seconds = 0.0
+    faces_seen = 0
+    failures = 0
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        for done, result in enumerate(pool.imap_unordered(embed_chunk, tasks), 1):
+            if result.get("error"):
+                failures += 1
+                print(f"[VideoAttendance] Chunk failed: {result['error']}")
+                continue
+            for offset, vector in result["faces"]:
+                match = gallery.best_match(vector, args.threshold)
+                if match:
+                    tracker.add(match, offset)
+            faces_seen += len(result["faces"])
+            done_seconds += result["seconds"]
+            elapsed = time.perf_counter() - started
+            print(f"[VideoAttendance] {done}/{len(tasks)} chunks | {done_seconds / 60:.1f}/{total_seconds / 60:.1f} min "
+                  f"| {faces_seen} faces | {len(tracker.people)} people | {done_seconds / elapsed:.1f}x real time",
+                  flush=True)
+
+    recorded_at = _parse_recorded_at(args.recorded_at, args.video)
+    users = tracker.recognized(args.min_sightings, recorded_at)
+    session_id = args.session_id or int(recorded_at * 1000)
+    message = f"Video attendance completed. {len(users)} users recognized."
+    session = {
+        "timestamp": recorded_at,
+        "recognized_users": users,
+        "total_recognized": len(users),
+        "status": "success" if users else "failed",
+        "message": message,
+        "source": {
+            "type": "video",
+            "path": os.path.abspath(args.video),
+            "duration_s": round(total_seconds, 1),
+            "sample_fps": fps / stride,
+            "failed_chunks": failures,
+        },
+    }
+    elapsed = time.perf_counter() - started
+    print(f"[VideoAttendance] {message} Processed {total_seconds / 60:.1f} min of video in {elapsed:.1f}s")
+
+    if args.dry_run:
+        print(json.dumps({"session_id": session_id, **session}, indent=2, default=str))
+        return
+
+    from attendance_rollups import ROLLUP_COLLECTION, ensure_attendance_indexes, record_daily_rollup
+    from attendance_writer import AttendanceWriter
+    ensure_attendance_indexes(db['attendances'], db[ROLLUP_COLLECTION])
+    writer = AttendanceWriter(
+        db['attendances'],
+        on_session_closed=lambda sid, fields: record_daily_rollup(db[ROLLUP_COLLECTION], sid, fields)
+    )
+    writer.close_session(session_id, session)
+    saved = writer.flush(timeout=30.0)
+    stats = writer.stats()
+    # flush() is False while the session is still queued; a dropped session must never be reported as saved
+    if not saved or stats["dropped_sessions"] or stats["queue_depth"]:
+        print(f"[VideoAttendance] Failed to save session {session_id}: {stats['last_error']}")
+        sys.exit(1)
+    print(f"[VideoAttendance] Saved attendance session {session_id}")
+
+
+if __name__ == "__main__":
+    main()
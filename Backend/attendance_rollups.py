@@ -0,0 +1,90 @@
+import datetime
+import os
+import sys
+import time
+
+from pymongo import ASCENDING, DESCENDING
+
+ROLLUP_COLLECTION = "attendance_daily"
+
+
+def ensure_attendance_indexes(attendance_collection, rollup_collection):
+    """Indexes backing the attendance query API in server.js."""
+    attendance_collection.create_index([("session_id", ASCENDING)], unique=True)
+    # Multikey + time: "when was user X present" without scanning every session
+    attendance_collection.create_index([("recognized_users.email", ASCENDING), ("timestamp", DESCENDING)])
+    attendance_collection.create_index([("timestamp", DESCENDING)])
+    rollup_collection.create_index([("date", ASCENDING)], unique=True)
+
+
+def rollup_date(timestamp):
+    """Day bucket (UTC, YYYY-MM-DD) for an epoch-seconds session timestamp."""
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date().isoformat()
+
+
+def record_daily_rollup(rollup_collection, session_id, session):
+    """Fold a closed session into its day's rollup document.
+
+    Idempotent: the session id is remembered on the rollup so counters are
+    only incremented once even if the session is saved again.
+    """
+    timestamp = session.get("timestamp") or time.time()
+    date = rollup_date(timestamp)
+    emails = sorted({u["email"] for u in session.get("recognized_users", []) if u.get("email")})
+    # Unique users per day; $addToSet is naturally idempotent
+    rollup_collection.update_one(
+        {"date": date},
+        {
+            "$addToSet": {"users": {"$each": emails}},
+            "$setOnInsert": {"sessions": 0, "successful_sessions": 0, "recognitions": 0, "session_ids": []},
+            "$set": {"updated_at": time.time()},
+        },
+        upsert=True,
+    )
+    rollup_collection.update_one(
+        {"date": date, "session_ids": {"$ne": session_id}},
+        {
+            "$inc": {
+                "sessions": 1,
+                "successful_sessions": 1 if session.get("status") == "success" else 0,
+                "recognitions": len(emails),
+            },
+            "$push": {"session_ids": session_id},
+        },
+    )
+
+
+def backfill_rollups(attendance_collection, rollup_collection, batch_size=1000):
+    """Rebuild rollups from existing attendance documents (safe to re-run)."""
+    processed = 0
+    cursor = attendance_collection.find(
+        {"session_id": {"$exists": True}},
+        {"session_id": 1, "timestamp": 1, "status": 1, "recognized_users.email": 1},
+        batch_size=batch_size,
+    )
+    for doc in cursor:
+        if doc.get("timestamp") is None:
+            continue
+        record_daily_rollup(rollup_collection, doc["session_id"], doc)
+        processed += 1
+        if processed % batch_size == 0:
+            print(f"[Rollup] {processed} sessions processed")
+    return processed
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    from env_config import get_required_env
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("indexes", "backfill"):
+        print("Usage: python attendance_rollups.py [indexes|backfill]")
+        sys.exit(1)
+
+    client = MongoClient(get_required_env("MONGODB_URI"))
+    db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
+    ensure_attendance_indexes(db['attendances'], db[ROLLUP_COLLECTION])
+    print("[Rollup] Indexes ensured")
+    if sys.argv[1] == "backfill":
+        started = time.time()
+        count = backfill_rollups(db['attendances'], db[ROLLUP_COLLECTION])
+        print(f"[Rollup] Backfilled {count} sessions in {time.time() - started:.1f}s")
@@ -0,0 +1,267 @@
+import atexit
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+# Exponential backoff between background retries is capped here, so a long outage is still retried often
+MAX_BACKOFF_S = 30.0
+
+
+def _retryable(error):
+    """Outages (no primary, network errors, timeouts) rather than writes MongoDB rejected."""
+    return isinstance(error, ConnectionFailure) or error.has_error_label("RetryableWriteError")
+
+
+class AttendanceWriter:
+    """Write-behind queue for attendance documents.
+
+    Updates are coalesced per session in memory and flushed with a single
+    unordered bulk_write when max_batch sessions are pending or every
+    flush_interval seconds. Callers (the inference loop) only take a short
+    in-process lock and never wait on MongoDB.
+
+    on_session_closed(session_id, fields) runs on the writer thread once a
+    session queued with close_session() has been written (daily rollups).
+    on_flush(seconds) is called with the duration of every bulk_write.
+
+    A session is dropped after max_retries failed background writes, except
+    when MongoDB is unreachable: then it is retried until it has been failing
+    for give_up_after seconds. Synchronous flush() attempts never count
+    towards either limit.
+    """
+
+    def __init__(self, collection, max_batch=100, flush_interval=1.0, max_retries=5, backoff_base=0.5,
+                 give_up_after=3600.0, on_session_closed=None, on_flush=None):
+        self.collection = collection
+        self.on_session_closed = on_session_closed
+        self.on_flush = on_flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.give_up_after = give_up_after
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # session_id -> {"set": {...}, "add_users": {email: user}, "attempts": int, "failing_since": float|None,
+        #                "closed": bool}
+        self._pending = {}
+        # (session_id, fields) whose close hook failed and must be retried
+        self._pending_closes = []
+        self._retry_at = 0.0
+        self._stats = {
+            "flushes": 0,
+            "ops_written": 0,
+            "failures": 0,
+            "retries": 0,
+            "dropped_sessions": 0,
+            "close_hook_failures": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": 0.0,
+            "last_error": None,
+        }
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- Producer side (non-blocking) ---
+    def add_user(self, session_id, user):
+        """Queue a recognized user for $addToSet into the session document."""
+        with self._lock:
+            entry = self._entry(session_id)
+            if "recognized_users" in entry["set"]:
+                # A full snapshot is already queued; keep it authoritative
+                users = entry["set"]["recognized_users"]
+                if not any(u["email"] == user["email"] for u in users):
+                    users.append(user)
+            else:
+                entry["add_users"].setdefault(user["email"], user)
+            depth = len(self._pending)
+        if depth >= self.max_batch:
+            self._wake.set()
+
+    def save_session(self, session_id, fields):
+        """Queue a $set of session fields; queued additions are folded into a recognized_users snapshot."""
+        with self._lock:
+            entry = self._entry(session_id)
+            entry["set"].update(fields)
+            if "recognized_users" in fields:
+                snapshot = list(fields["recognized_users"])
+                known = {u["email"] for u in snapshot}
+                snapshot.extend(u for email, u in entry["add_users"].items() if email not in known)
+                entry["set"]["recognized_users"] = snapshot
+                entry["add_users"].clear()
+            depth = len(self._pending)
+        if depth >= self.max_batch:
+            self._wake.set()
+
+    def close_session(self, session_id, fields):
+        """Queue the final state of a session; on_session_closed fires after it is written."""
+        self.save_session(session_id, fields)
+        with self._lock:
+            self._entry(session_id)["closed"] = True
+        self._wake.set()
+
+    def _entry(self, session_id):
+        entry = self._pending.get(session_id)
+        if entry is None:
+            entry = {"set": {}, "add_users": {}, "attempts": 0, "failing_since": None, "closed": False}
+            self._pending[session_id] = entry
+        return entry
+
+    # --- Flushing ---
+    def flush(self, timeout=5.0):
+        """Synchronously write everything queued so far (used on stop/shutdown).
+
+        True only if the queue drained and no session was dropped meanwhile;
+        on False whatever is still queued stays with the background thread.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            dropped = self._stats["dropped_sessions"]
+        delay = self.backoff_base
+        while True:
+            self._flush_once(ignore_backoff=True, count_attempt=False)
+            with self._lock:
+                if self._stats["dropped_sessions"] != dropped:
+                    return False
+                if not self._pending and not self._pending_closes:
+                    return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, MAX_BACKOFF_S)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush_once()
+
+    def _flush_once(self, ignore_backoff=False, count_attempt=True):
+        with self._flush_lock:
+            with self._lock:
+                if not ignore_backoff and time.monotonic() < self._retry_at:
+                    return
+                retry_closes, self._pending_closes = self._pending_closes, []
+                batch, self._pending = self._pending, {}
+            self._run_close_hooks(retry_closes)
+            if not batch:
+                return
+
+            operations = []
+            for session_id, entry in batch.items():
+                update = {}
+                if entry["set"]:
+                    update["$set"] = {"session_id": session_id, **entry["set"]}
+                if entry["add_users"]:
+                    update["$addToSet"] = {"recognized_users": {"$each": list(entry["add_users"].values())}}
+                if update:
+                    operations.append(UpdateOne({"session_id": session_id}, update, upsert=True))
+
+            started = time.perf_counter()
+            try:
+                if operations:
+                    self.collection.bulk_write(operations, ordered=False)
+            except PyMongoError as e:
+                self._requeue(batch, e, count_attempt)
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if self.on_flush and operations:
+                self.on_flush(elapsed_ms / 1000)
+            with self._lock:
+                self._retry_at = 0.0
+                self._stats["flushes"] += 1
+                self._stats["ops_written"] += len(operations)
+                self._stats["last_flush_ms"] = round(elapsed_ms, 2)
+                self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], elapsed_ms), 2)
+            self._run_close_hooks([(sid, entry["set"]) for sid, entry in batch.items() if entry["closed"]])
+
+    def _run_close_hooks(self, closed):
+        if not self.on_session_closed:
+            return
+        for session_id, fields in closed:
+            try:
+                self.on_session_closed(session_id, fields)
+            except Exception as e:
+                print(f"[Attendance] Close hook failed for session {session_id}, will retry: {e}")
+                with self._lock:
+                    self._stats["close_hook_failures"] += 1
+                    self._pending_closes.append((session_id, fields))
+
+    def _requeue(self, batch, error, count_attempt=True):
+        """Merge a failed batch back under anything queued since, with exponential backoff.
+
+        count_attempt=False (synchronous flushes) requeues without spending
+        the retry budget, so it never drops a session.
+        """
+        print(f"[Attendance] Bulk write failed, will retry: {error}")
+        now = time.monotonic()
+        retryable = _retryable(error)
+        step = 1 if count_attempt else 0
+        attempts = max(entry["attempts"] for entry in batch.values()) + step
+        with self._lock:
+            self._stats["failures"] += 1
+            self._stats["last_error"] = str(error)
+            for session_id, failed in batch.items():
+                if failed["failing_since"] is None:
+                    failed["failing_since"] = now
+                if count_attempt:
+                    if retryable and now - failed["failing_since"] > self.give_up_after:
+                        self._stats["dropped_sessions"] += 1
+                        print(f"[Attendance] Giving up on session {session_id} after "
+                              f"{self.give_up_after:.0f}s of failed writes")
+                        continue
+                    if not retryable and failed["attempts"] + 1 > self.max_retries:
+                        self._stats["dropped_sessions"] += 1
+                        print(f"[Attendance] Giving up on session {session_id} after {self.max_retries} retries")
+                        continue
+                self._stats["retries"] += 1
+                newer = self._pending.get(session_id)
+                if newer is None:
+                    failed["attempts"] += step
+                    self._pending[session_id] = failed
+                    continue
+                merged_set = {**failed["set"], **newer["set"]}
+                merged_add = {**failed["add_users"], **newer["add_users"]}
+                if "recognized_users" in merged_set:
+                    # $set and $addToSet on the same field conflict; fold additions into the snapshot
+                    snapshot = list(merged_set["recognized_users"])
+                    known = {u["email"] for u in snapshot}
+                    snapshot.extend(u for email, u in merged_add.items() if email not in known)
+                    merged_set["recognized_users"] = snapshot
+                    merged_add = {}
+                self._pending[session_id] = {
+                    "set": merged_set,
+                    "add_users": merged_add,
+                    "attempts": failed["attempts"] + step,
+                    "failing_since": failed["failing_since"],
+                    "closed": failed["closed"] or newer["closed"],
+                }
+            if count_attempt:
+                self._retry_at = now + min(self.backoff_base * (2 ** (attempts - 1)), MAX_BACKOFF_S)
+
+    def stats(self):
+        with self._lock:
+            pending_users = sum(len(e["add_users"]) for e in self._pending.values())
+            return {
+                "queue_depth": len(self._pending),
+                "pending_user_additions": pending_users,
+                "pending_close_hooks": len(self._pending_closes),
+                **self._stats,
+            }
+
+    def close(self, timeout=5.0):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=1.0)
+        if not self.flush(timeout):
+            stats = self.stats()
+            print(f"[Attendance] {stats['queue_depth']} session(s) unsaved at shutdown, "
+                  f"{stats['dropped_sessions']} dropped since start")
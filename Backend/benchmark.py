@@ -0,0 +1,640 @@
+"""CPU benchmark suite for the detection, embedding, matching, encoding and counting paths.
+
+Runs without a camera, MongoDB or network: frames come from a frame source (recorded
+media or the synthetic generator), galleries are synthetic and model weights must
+already be cached locally. Results are written as JSON with machine metadata, and
+`compare` flags every benchmark whose median got slower than a baseline by more than
+--tolerance.
+
+`colocated` runs every service's loop at once, one process each, first with the
+libraries' default thread pools and then governed by a cpu_resources config, and
+compares total throughput.
+
+Usage: python benchmark.py run [--media video:samples/classroom.mp4] [--frames 60] [--only detect,embed,...]
+                               [--gallery-sizes 1000,10000,100000,1000000] [--output results.json] [--baseline base.json]
+       python benchmark.py compare BASELINE.json RESULTS.json [--tolerance 0.15]
+       python benchmark.py colocated --cpu-config cpu_resources.json [--seconds 60] [--services crowd_counting,...]
+"""
+import argparse
+import base64
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+BENCHMARKS = ("detect", "embed", "gallery", "jpeg", "yolo", "loops")
+EMBED_BATCH_SIZES = (1, 2, 4, 8, 16, 32)
+DEFAULT_GALLERY_SIZES = "1000,10000,100000,1000000"
+DEFAULT_MEDIA = "synthetic:640x480?seed=1"
+DEFAULT_TOLERANCE = 0.15
+EMBEDDING_DIM = 512
+PACKAGES = ("numpy", "opencv-python", "tensorflow", "keras-facenet", "mtcnn", "ultralytics", "torch", "scikit-learn")
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS",
+                   "TF_NUM_INTEROP_THREADS")
+COLOCATED_SERVICES = ("face_registration", "single_face", "multi_face", "crowd_counting")
+# Lines a colocated worker writes among the libraries' own output
+WORKER_READY = "[Bench] worker ready"
+WORKER_RESULT = "[Bench] worker result "
+
+
+# --- Timing ---
+def summarize(times, items=1):
+    """Latency percentiles in ms plus throughput in items/s for a list of per-call durations (s)."""
+    ordered = sorted(times)
+    total = sum(ordered)
+    return {
+        "samples": len(ordered),
+        "mean_ms": round(total / len(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "per_s": round(items * len(ordered) / total, 2) if total else 0.0,
+    }
+
+
+def measure(fn, repeat, warmup=2, items=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return summarize(times, items)
+
+
+def cycle(items):
+    """Callable returning the next item each call, wrapping around."""
+    state = {"i": 0}
+
+    def next_item():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return next_item
+
+
+# --- Shared inputs and models ---
+class Context:
+    """Frames and models shared between benchmarks, loaded on first use."""
+
+    def __init__(self, args):
+        self.args = args
+        self._frames = None
+        self._detector = None
+        self._embedder = None
+        self._yolo = None
+
+    def frames(self):
+        if self._frames is None:
+            from frame_source import open_frame_source
+            source = open_frame_source(self.args.media, pace="fast", loop=True)
+            if not source.isOpened():
+                raise RuntimeError(f"Cannot open {self.args.media}")
+            self._frames = []
+            while len(self._frames) < self.args.frames:
+                ok, frame = source.read()
+                if not ok:
+                    break
+                self._frames.append(frame)
+            source.release()
+            if not self._frames:
+                raise RuntimeError(f"No frames read from {self.args.media}")
+        return self._frames
+
+    def detector(self):
+        if self._detector is None:
+            from mtcnn import MTCNN
+            self._detector = MTCNN()
+        return self._detector
+
+    def embedder(self):
+        if self._embedder is None:
+            from embedding_store import load_embedder
+            self._embedder = load_embedder()
+        return self._embedder
+
+    def yolo(self):
+        if self._yolo is None:
+            if not os.path.exists(self.args.yolo_model):
+                # Never let ultralytics fetch weights in the middle of a benchmark run
+                raise RuntimeError(f"{self.args.yolo_model} not found locally")
+            from ultralytics import YOLO
+            self._yolo = YOLO(self.args.yolo_model)
+        return self._yolo
+
+
+def synthetic_gallery(size, per_user, seed=0):
+    """FaceGallery of random unit vectors, filled in chunks so no float64 copy of the matrix exists."""
+    import numpy as np
+    from face_gallery import FaceGallery
+    rng = np.random.default_rng(seed)
+    rows = size * per_user
+    matrix = np.empty((rows, EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, rows, 65536):
+        block = rng.standard_normal((min(65536, rows - start), EMBEDDING_DIM), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:start + len(block)] = block
+    owners = np.repeat(np.arange(size, dtype=np.int32), per_user)
+    users = [(f"bench{i}@example.com", f"Bench User {i}") for i in range(size)]
+    return FaceGallery(users, matrix, owners, {"users": size, "embeddings": rows})
+
+
+# --- Benchmarks ---
+def bench_detect(ctx):
+    detector = ctx.detector()
+    frames = ctx.frames()
+    next_frame = cycle(frames)
+    faces = [len(detector.detect_faces(frame) or []) for frame in frames]
+    result = measure(lambda: detector.detect_faces(next_frame()), ctx.args.repeat)
+    return {"detect/mtcnn": {**result, "faces_per_frame": round(sum(faces) / len(faces), 2)}}
+
+
+def bench_embed(ctx):
+    import numpy as np
+    embedder = ctx.embedder()
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in EMBED_BATCH_SIZES:
+        batch = rng.integers(0, 256, (batch_size, 160, 160, 3), dtype=np.uint8)
+        results[f"embed/facenet/bs={batch_size}"] = measure(
+            lambda: embedder.embeddings(batch), ctx.args.repeat, items=batch_size)
+    return results
+
+
+def bench_gallery(ctx):
+    import numpy as np
+    rng = np.random.default_rng(1)
+    queries = list(rng.standard_normal((64, EMBEDDING_DIM), dtype=np.float32))
+    results = {}
+    for size in sorted(int(s) for s in ctx.args.gallery_sizes.split(",")):
+        gallery = synthetic_gallery(size, ctx.args.embeddings_per_user)
+        next_query = cycle(queries)
+        result = measure(lambda: gallery.best_match(next_query(), threshold=0.5), ctx.args.repeat)
+        results[f"gallery/match/{size}"] = {**result, "matrix_mb": round(gallery.matrix.nbytes / (1024 * 1024), 1)}
+        del gallery
+    return results
+
+
+def bench_jpeg(ctx):
+    import cv2
+    frames = ctx.frames()
+    params = [cv2.IMWRITE_JPEG_QUALITY, ctx.args.jpeg_quality]
+    encoded = [cv2.imencode(".jpg", frame, params)[1].tobytes() for frame in frames]
+    next_frame, next_jpeg = cycle(frames), cycle(encoded)
+    return {
+        "jpeg/encode": {
+            **measure(lambda: cv2.imencode(".jpg", next_frame(), params), ctx.args.repeat),
+            "bytes": int(sum(len(j) for j in encoded) / len(encoded)),
+        },
+        "jpeg/base64": measure(lambda: base64.b64encode(next_jpeg()), ctx.args.repeat),
+    }
+
+
+def _crowd_roi():
+    """The ROI the crowd counting service would use (CROWD_CAMERA_ID, CROWD_ROI / CROWD_ROI_FILE)."""
+    from crowd_roi import load_roi
+    return load_roi(os.getenv("CROWD_CAMERA_ID", "default"))
+
+
+def bench_yolo(ctx):
+    from crowd_roi import detect_people
+    model, roi = ctx.yolo(), _crowd_roi()
+    next_frame = cycle(ctx.frames())
+    return {"yolo/count": measure(lambda: len(detect_people(model, next_frame(), roi)), ctx.args.repeat)}
+
+
+# Per-frame loops: the body of each service's capture loop, minus its pacing sleep,
+# over a fast-paced frame source with a viewer attached so frames are JPEG-encoded.
+def _run_loop(ctx, step):
+    from frame_buffer import FrameBuffer
+    from frame_source import open_frame_source
+    frame_buffer = FrameBuffer(jpeg_quality=ctx.args.jpeg_quality)
+    source = open_frame_source(ctx.args.media, pace="fast", loop=True)
+    times = []
+    try:
+        for index in range(ctx.args.frames + 2):
+            started = time.perf_counter()
+            ok, frame = source.read()
+            if not ok:
+                break
+            step(index, frame)
+            frame_buffer.touch()
+            frame_buffer.publish(frame)
+            if index >= 2:
+                times.append(time.perf_counter() - started)
+    finally:
+        source.release()
+    if not times:
+        raise RuntimeError(f"No frames read from {ctx.args.media}")
+    return summarize(times)
+
+
+def _face_crops(frame, faces):
+    from embedding_store import align_crop, extract_crop
+    crops = []
+    for face in faces:
+        crop, box = extract_crop(frame, face["box"])
+        if crop.size and box[2] > 0 and box[3] > 0:
+            crops.append(align_crop(crop, box))
+    return crops
+
+
+def _loop_step(ctx, service):
+    """The per-frame body of service's capture loop, with its models loaded."""
+    import cv2
+    import numpy as np
+    if service == "crowd_counting":
+        from crowd_roi import detect_people
+        model, roi = ctx.yolo(), _crowd_roi()
+
+        def crowd_step(index, frame):
+            people = detect_people(model, frame, roi)
+            for x1, y1, x2, y2 in people:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            if roi is not None:
+                roi.draw(frame)
+            cv2.putText(frame, f"Current: {len(people)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+        return crowd_step
+
+    detector, embedder = ctx.detector(), ctx.embedder()
+    if service == "face_registration":
+        # Registration embeds one sample a second; at the source's 30 fps that is every 30th frame
+        def registration_step(index, frame):
+            faces = detector.detect_faces(frame) or []
+            if faces:
+                largest = max(faces, key=lambda f: f["box"][2] * f["box"][3])
+                x, y, w, h = largest["box"]
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                if index % 30 == 0:
+                    crops = _face_crops(frame, [largest])
+                    if crops:
+                        embedder.embeddings(np.expand_dims(crops[0], axis=0))
+        return registration_step
+
+    if service == "multi_face":
+        target = synthetic_gallery(ctx.args.loop_gallery, ctx.args.embeddings_per_user)
+    else:
+        target = synthetic_gallery(1, ctx.args.embeddings_per_user, seed=2)
+
+    def match_step(index, frame):
+        faces = detector.detect_faces(frame) or []
+        for crop, face in zip(_face_crops(frame, faces), faces):
+            embedding = embedder.embeddings(np.expand_dims(crop, axis=0)).flatten()
+            target.best_match(embedding, threshold=0.5)
+            x, y, w, h = face["box"]
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    return match_step
+
+
+def bench_loops(ctx):
+    results = {
+        "loop/single": _run_loop(ctx, _loop_step(ctx, "single_face")),
+        "loop/multi": _run_loop(ctx, _loop_step(ctx, "multi_face")),
+        "loop/registration": _run_loop(ctx, _loop_step(ctx, "face_registration")),
+    }
+    try:
+        crowd_step = _loop_step(ctx, "crowd_counting")
+    except Exception as e:
+        results["loop/crowd"] = {"skipped": str(e)}
+    else:
+        results["loop/crowd"] = _run_loop(ctx, crowd_step)
+    return results
+
+
+BENCHMARK_FUNCTIONS = {
+    "detect": bench_detect,
+    "embed": bench_embed,
+    "gallery": bench_gallery,
+    "jpeg": bench_jpeg,
+    "yolo": bench_yolo,
+    "loops": bench_loops,
+}
+
+
+# --- Metadata ---
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _package_versions():
+    from importlib import metadata
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine_metadata():
+    meta = {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_model": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "memory_gb": None,
+        "packages": _package_versions(),
+        "thread_env": {name: os.environ[name] for name in THREAD_ENV_VARS if name in os.environ},
+        "git_commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        import psutil
+        meta["memory_gb"] = round(psutil.virtual_memory().total / 1024 ** 3, 1)
+    except ImportError:
+        pass
+    return meta
+
+
+# --- Commands ---
+def _offline_env():
+    # CPU only, offline: hide GPUs before TensorFlow/torch are imported and keep ultralytics off the network
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+    os.environ.setdefault("YOLO_OFFLINE", "1")
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+
+def run(args):
+    _offline_env()
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARK_FUNCTIONS]
+    if unknown:
+        print(f"[Bench] Unknown benchmark(s): {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+        sys.exit(2)
+
+    ctx = Context(args)
+    results = {}
+    for name in selected:
+        started = time.perf_counter()
+        try:
+            produced = BENCHMARK_FUNCTIONS[name](ctx)
+        except Exception as e:
+            print(f"[Bench] {name}: skipped ({e})")
+            results[name] = {"skipped": str(e)}
+            continue
+        results.update(produced)
+        for key, value in produced.items():
+            if "p50_ms" in value:
+                print(f"[Bench] {key:<28} p50 {value['p50_ms']:>10.3f} ms  p95 {value['p95_ms']:>10.3f} ms  "
+                      f"{value['per_s']:>10.1f}/s")
+            else:
+                print(f"[Bench] {key:<28} skipped ({value.get('skipped')})")
+        print(f"[Bench] {name} done in {time.perf_counter() - started:.1f}s")
+
+    report = {
+        "meta": machine_metadata(),
+        "config": {
+            "media": args.media,
+            "frames": args.frames,
+            "repeat": args.repeat,
+            "gallery_sizes": args.gallery_sizes,
+            "embeddings_per_user": args.embeddings_per_user,
+            "loop_gallery": args.loop_gallery,
+            "jpeg_quality": args.jpeg_quality,
+            "yolo_model": args.yolo_model,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare_reports(baseline, report, args.tolerance) else 0)
+
+
+def compare_reports(baseline, current, tolerance):
+    """Print a comparison table; returns the names of benchmarks that regressed beyond tolerance."""
+    for key in ("cpu_model", "cpu_count", "packages", "thread_env"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"[Bench] Warning: {key} differs from the baseline "
+                  f"({baseline['meta'].get(key)} -> {current['meta'].get(key)})")
+    for key in ("media", "frames", "jpeg_quality", "yolo_model", "embeddings_per_user"):
+        if baseline["config"].get(key) != current["config"].get(key):
+            print(f"[Bench] Warning: config {key} differs ({baseline['config'].get(key)} -> {current['config'].get(key)})")
+
+    regressions = []
+    print(f"\n{'benchmark':<28} {'baseline p50':>13} {'current p50':>13} {'change':>9}")
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if "p50_ms" not in base or not now or "p50_ms" not in now:
+            continue
+        change = now["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -tolerance:
+            flag = "  faster"
+        print(f"{name:<28} {base['p50_ms']:>10.3f} ms {now['p50_ms']:>10.3f} ms {change:>+8.1%}{flag}")
+    missing = [name for name, base in baseline["results"].items() if "p50_ms" in base
+               and "p50_ms" not in current["results"].get(name, {})]
+    if missing:
+        print(f"[Bench] Not measured in this run: {', '.join(missing)}")
+    print(f"\n[Bench] {len(regressions)} regression(s) beyond {tolerance:.0%}")
+    return regressions
+
+
+def compare(args):
+    with open(args.baseline_file) as f:
+        baseline = json.load(f)
+    with open(args.results_file) as f:
+        current = json.load(f)
+    sys.exit(1 if compare_reports(baseline, current, args.tolerance) else 0)
+
+
+def worker(args):
+    """One service's loop body in its own process, run flat out for --seconds once the parent sends a line."""
+    from cpu_resources import configure_cpu
+    cpu = configure_cpu(args.service, args.cpu_config)
+    _offline_env()
+    ctx = Context(args)
+    try:
+        # Import the framework first so its pools are sized before the models initialize it
+        if args.service == "crowd_counting":
+            import ultralytics  # noqa: F401
+        else:
+            import mtcnn  # noqa: F401
+        cpu.apply_frameworks()
+        from frame_buffer import FrameBuffer
+        step = _loop_step(ctx, args.service)
+        frames = ctx.frames()
+        step(0, frames[0].copy())
+    except Exception as e:
+        print(WORKER_READY, flush=True)
+        print(WORKER_RESULT + json.dumps({"service": args.service, "skipped": str(e)}), flush=True)
+        return
+    frame_buffer = FrameBuffer(jpeg_quality=args.jpeg_quality)
+    print(WORKER_READY, flush=True)
+    sys.stdin.readline()
+
+    times = []
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    index = 0
+    while time.perf_counter() < deadline:
+        frame_started = time.perf_counter()
+        frame = frames[index % len(frames)].copy()
+        step(index, frame)
+        frame_buffer.touch()
+        frame_buffer.publish(frame)
+        times.append(time.perf_counter() - frame_started)
+        index += 1
+    elapsed = time.perf_counter() - started
+    result = {
+        "service": args.service,
+        **summarize(times),
+        "fps": round(len(times) / elapsed, 2),
+        "cpu_cores": round((time.process_time() - cpu_started) / elapsed, 2),
+        "cpu": cpu.effective(),
+    }
+    print(WORKER_RESULT + json.dumps(result), flush=True)
+
+
+def _colocated_phase(args, services, cpu_config):
+    """Start one worker per service, release them together and collect their results."""
+    env = {name: value for name, value in os.environ.items() if name not in THREAD_ENV_VARS}
+    env.pop("CPU_RESOURCES_FILE", None)
+    common = ["--media", args.media, "--frames", str(args.frames), "--seconds", str(args.seconds),
+              "--loop-gallery", str(args.loop_gallery), "--embeddings-per-user", str(args.embeddings_per_user),
+              "--jpeg-quality", str(args.jpeg_quality), "--yolo-model", args.yolo_model, "--cpu-config", cpu_config]
+    workers = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", "--service", service, *common],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env)
+        for service in services
+    ]
+    try:
+        for process in workers:
+            for line in process.stdout:
+                if line.startswith(WORKER_READY):
+                    break
+        for process in workers:
+            try:
+                process.stdin.write("go\n")
+                process.stdin.flush()
+            except OSError:  # the worker already failed; its result says why
+                pass
+        results = {}
+        for service, process in zip(services, workers):
+            results[service] = {"skipped": "worker exited without a result"}
+            for line in process.stdout:
+                if line.startswith(WORKER_RESULT):
+                    results[service] = json.loads(line[len(WORKER_RESULT):])
+                    break
+        return results
+    finally:
+        for process in workers:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+
+def colocated(args):
+    if not args.cpu_config:
+        print("[Bench] colocated needs --cpu-config (or CPU_RESOURCES_FILE) for the governed run")
+        sys.exit(2)
+    services = args.services.split(",")
+    phases = {}
+    for mode, cpu_config in (("default", ""), ("governed", args.cpu_config)):
+        print(f"[Bench] {mode}: {len(services)} service loop(s) together for {args.seconds}s")
+        phases[mode] = _colocated_phase(args, services, cpu_config)
+
+    print(f"\n{'service':<20} {'default fps':>12} {'governed fps':>13} {'change':>9} {'p95 ms':>15}")
+    totals = {mode: 0.0 for mode in phases}
+    for service in services:
+        default, governed = phases["default"][service], phases["governed"][service]
+        if "fps" not in default or "fps" not in governed:
+            print(f"{service:<20} skipped ({default.get('skipped') or governed.get('skipped')})")
+            continue
+        totals["default"] += default["fps"]
+        totals["governed"] += governed["fps"]
+        change = governed["fps"] / default["fps"] - 1 if default["fps"] else 0.0
+        print(f"{service:<20} {default['fps']:>12.2f} {governed['fps']:>13.2f} {change:>+8.1%} "
+              f"{default['p95_ms']:>7.1f}/{governed['p95_ms']:<7.1f}")
+    change = totals["governed"] / totals["default"] - 1 if totals["default"] else 0.0
+    print(f"{'total':<20} {totals['default']:>12.2f} {totals['governed']:>13.2f} {change:>+8.1%}")
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": machine_metadata(),
+            "config": {"media": args.media, "seconds": args.seconds, "services": services, "yolo_model": args.yolo_model,
+                       "cpu_config": args.cpu_config},
+            "totals_fps": {mode: round(total, 2) for mode, total in totals.items()},
+            "results": phases,
+        }, f, indent=2)
+    print(f"[Bench] Wrote {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write a JSON report")
+    run_parser.add_argument("--media", default=DEFAULT_MEDIA, help="frame source spec for frame-based benchmarks")
+    run_parser.add_argument("--frames", type=int, default=60, help="frames used by frame-based benchmarks and loops")
+    run_parser.add_argument("--repeat", type=int, default=50, help="timed calls per micro-benchmark")
+    run_parser.add_argument("--only", help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    run_parser.add_argument("--gallery-sizes", default=DEFAULT_GALLERY_SIZES, help="identities per gallery benchmark")
+    run_parser.add_argument("--embeddings-per-user", type=int, default=1,
+                            help="rows per identity (registration stores 10; 1M x 10 needs ~20 GB)")
+    run_parser.add_argument("--loop-gallery", type=int, default=1000, help="identities in the multi-face loop gallery")
+    run_parser.add_argument("--jpeg-quality", type=int, default=80)
+    run_parser.add_argument("--yolo-model", default="yolov8x.pt")
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    run_parser.add_argument("--baseline", help="compare against this report after running")
+    run_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("baseline_file")
+    compare_parser.add_argument("results_file")
+    compare_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                                help="allowed slowdown of the median before a benchmark counts as regressed")
+
+    colocated_parser = commands.add_parser("colocated", help="all service loops at once, default vs governed threads")
+    worker_parser = commands.add_parser("worker", help="one service loop of a colocated run (internal)")
+    for sub in (colocated_parser, worker_parser):
+        sub.add_argument("--media", default=DEFAULT_MEDIA)
+        sub.add_argument("--frames", type=int, default=60, help="frames decoded up front and cycled")
+        sub.add_argument("--seconds", type=float, default=60.0, help="measured run per phase")
+        sub.add_argument("--loop-gallery", type=int, default=1000)
+        sub.add_argument("--embeddings-per-user", type=int, default=1)
+        sub.add_argument("--jpeg-quality", type=int, default=80)
+        sub.add_argument("--yolo-model", default="yolov8x.pt")
+    colocated_parser.add_argument("--cpu-config", default=os.getenv("CPU_RESOURCES_FILE", ""),
+                                  help="cpu_resources JSON for the governed phase")
+    colocated_parser.add_argument("--services", default=",".join(COLOCATED_SERVICES))
+    colocated_parser.add_argument("--output", default="colocated_results.json")
+    worker_parser.add_argument("--service", choices=COLOCATED_SERVICES, required=True)
+    worker_parser.add_argument("--cpu-config", default="")
+
+    args = parser.parse_args()
+    {"run": run, "compare": compare, "colocated": colocated, "worker": worker}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Bulk face enrollment from an image folder tree.
+
+Layout: ROOT/<email>/*.jpg (one folder per person) plus a CSV with `email,name` columns.
+Images are decoded in a thread pool, faces are detected and embedded in large batches,
+and users are written with one bulk_write per chunk (faceRegistered=true).
+
+Re-running is safe: users that already have embeddings are skipped unless --force, and
+every chunk is committed before the next starts, so an interrupted run resumes where it
+stopped. Per-image failures are written to --failures.
+
+Usage: python bulk_enroll.py ROOT --names names.csv [--batch-size 64] [--decode-threads 8]
+                             [--max-images 10] [--failures enrollment_failures.csv] [--force]
+"""
+import argparse
+import csv
+import datetime
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+
+from embedding_store import CROPS_COLLECTION, align_crop, crops_update, embedding_update, encode_crop, extract_crop, load_embedder
+from env_config import get_required_env
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def load_names(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["email"].strip().lower(): row["name"].strip() for row in csv.DictReader(f) if row.get("email")}
+
+
+def scan_tree(root, max_images):
+    """[(email, [image paths])] for every person folder, sorted for a stable resume order."""
+    people = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        images = sorted(
+            os.path.join(entry.path, name) for name in os.listdir(entry.path)
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+        people.append((entry.name.strip().lower(), images[:max_images]))
+    return people
+
+
+def largest_face_crop(image, detection):
+    """Retained-crop form (crop with margin, face box inside it) of the largest detected face, or None."""
+    if not detection:
+        return None
+    crop, box = extract_crop(image, max(detection, key=lambda d: d["box"][2] * d["box"][3])["box"])
+    if crop.size == 0 or box[2] <= 0 or box[3] <= 0:
+        return None
+    return crop, box
+
+
+class BulkEnroller:
+    def __init__(self, users_collection, crops_collection, names, batch_size=64, decode_threads=8, force=False):
+        from mtcnn import MTCNN
+        self.users = users_collection
+        self.crops = crops_collection
+        self.names = names
+        self.batch_size = batch_size
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_threads)
+        self.force = force
+        self.detector = MTCNN()
+        self.embedder = load_embedder()
+        self.failures = []
+        self.stats = {"people": 0, "enrolled": 0, "skipped_existing": 0, "images": 0, "embedded": 0,
+                      "failed_images": 0, "failed_people": 0}
+
+    def already_enrolled(self, emails):
+        if self.force:
+            return set()
+        cursor = self.users.find(
+            {"email": {"$in": emails}, "faceRegistered": True, "embeddings.0": {"$exists": True}},
+            {"_id": 0, "email": 1},
+        )
+        return {doc["email"] for doc in cursor}
+
+    def _fail(self, email, image, reason):
+        self.failures.append({"email": email, "image": image, "reason": reason})
+        self.stats["failed_images"] += 1
+
+    def enroll_chunk(self, people):
+        """Decode, detect, embed and write one chunk of people; returns images processed."""
+        done = self.already_enrolled([email for email, _ in people])
+        self.stats["skipped_existing"] += len(done)
+        todo = [(email, images) for email, images in people if email not in done]
+        jobs = [(email, path) for email, images in todo for path in images]
+        for email, images in todo:
+            if not images:
+                self._fail(email, "", "no images in folder")
+        if not jobs:
+            return 0
+
+        # cv2.imread releases the GIL while decoding, so threads give real parallelism here
+        decoded = list(self.decode_pool.map(lambda job: cv2.imread(job[1]), jobs))
+        crops, owners = [], []
+        for start in range(0, len(jobs), self.batch_size):
+            batch_jobs = jobs[start:start + self.batch_size]
+            batch_images = decoded[start:start + self.batch_size]
+            valid = [i for i, image in enumerate(batch_images) if image is not None]
+            for i, image in enumerate(batch_images):
+                if image is None:
+                    self._fail(*batch_jobs[i], "unreadable image")
+            if not valid:
+                continue
+            rgb = [cv2.cvtColor(batch_images[i], cv2.COLOR_BGR2RGB) for i in valid]
+            detections = self.detector.detect_faces(rgb)
+            for i, detection in zip(valid, detections):
+                found = largest_face_crop(batch_images[i], detection)
+                if found is None:
+                    self._fail(*batch_jobs[i], "no face detected")
+                    continue
+                crops.append(found)
+                owners.append(batch_jobs[i][0])
+        del decoded
+
+        embeddings_by_user = {}
+        crops_by_user = {}
+        for start in range(0, len(crops), self.batch_size):
+            batch = crops[start:start + self.batch_size]
+            vectors = self.embedder.embeddings(np.stack([align_crop(crop, box) for crop, box in batch]))
+            for email, vector, (crop, box) in zip(owners[start:start + self.batch_size], vectors, batch):
+                embeddings_by_user.setdefault(email, []).append(vector)
+                crops_by_user.setdefault(email, []).append(encode_crop(crop, box))
+        self.stats["embedded"] += len(crops)
+
+        now = datetime.datetime.now()
+        operations = []
+        crop_operations = []
+        for email, _ in todo:
+            embeddings = embeddings_by_user.get(email)
+            if not embeddings:
+                self.stats["failed_people"] += 1
+                continue
+            update = embedding_update(embeddings)
+            update["$setOnInsert"] = {"name": self.names.get(email, email), "createdAt": now, "enrolledBy": "bulk"}
+            operations.append(UpdateOne({"email": email}, update, upsert=True))
+            crop_operations.append(UpdateOne({"email": email}, crops_update(crops_by_user[email]), upsert=True))
+        if operations:
+            # Crops first: a user marked enrolled always has crops to re-embed from
+            self.crops.bulk_write(crop_operations, ordered=False)
+            self.users.bulk_write(operations, ordered=False)
+            self.stats["enrolled"] += len(operations)
+        return len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk face enrollment from ROOT/<email>/*.jpg")
+    parser.add_argument("root")
+    parser.add_argument("--names", required=True, help="CSV with email,name columns")
+    parser.add_argument("--batch-size", type=int, default=64, help="images per detection/embedding batch")
+    parser.add_argument("--decode-threads", type=int, default=min(16, (os.cpu_count() or 4) * 2))
+    parser.add_argument("--max-images", type=int, default=10, help="images used per person (registration captures 10)")
+    parser.add_argument("--chunk-people", type=int, default=100, help="people committed per bulk_write")
+    parser.add_argument("--failures", default="enrollment_failures.csv")
+    parser.add_argument("--force", action="store_true", help="re-enroll people who already have embeddings")
+    args = parser.parse_args()
+
+    names = load_names(args.names)
+    people = scan_tree(args.root, args.max_images)
+    missing = [email for email, _ in people if email not in names]
+    if missing:
+        print(f"[Enroll] {len(missing)} folder(s) have no name in {args.names}; using the email as name")
+    print(f"[Enroll] {len(people)} people, {sum(len(images) for _, images in people)} images")
+
+    client = MongoClient(get_required_env("MONGODB_URI"))
+    db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
+    enroller = BulkEnroller(db["users"], db[CROPS_COLLECTION], names, args.batch_size, args.decode_threads, args.force)
+
+    started = time.perf_counter()
+    try:
+        for start in range(0, len(people), args.chunk_people):
+            chunk = people[start:start + args.chunk_people]
+            enroller.stats["images"] += enroller.enroll_chunk(chunk)
+            enroller.stats["people"] += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"[Enroll] {enroller.stats['people']}/{len(people)} people | {enroller.stats['enrolled']} enrolled "
+                  f"| {enroller.stats['skipped_existing']} already enrolled | {enroller.stats['failed_images']} failed images "
+                  f"| {enroller.stats['images'] / elapsed if elapsed else 0:.1f} images/s", flush=True)
+    except KeyboardInterrupt:
+        print("[Enroll] Interrupted; completed chunks are saved, re-run to resume")
+    finally:
+        enroller.decode_pool.shutdown(wait=False)
+        if enroller.failures:
+            with open(args.failures, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["email", "image", "reason"])
+                writer.writeheader()
+                writer.writerows(enroller.failures)
+            print(f"[Enroll] {len(enroller.failures)} failure(s) written to {args.failures}")
+
+    elapsed = time.perf_counter() - started
+    stats = enroller.stats
+    print(f"[Enroll] Done in {elapsed:.1f}s: {stats['enrolled']} enrolled, {stats['skipped_existing']} skipped, "
+          f"{stats['failed_people']} without a usable image; {stats['images']} images at "
+          f"{stats['images'] / elapsed if elapsed else 0:.1f} images/s")
+    sys.exit(1 if stats["failed_people"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import json
+import os
+import sys
+
+import env_config  # noqa: F401  (loads Backend/.env for CPU_RESOURCES_FILE)
+
+try:
+    import threadpoolctl
+except ImportError:  # BLAS pools are then only reported through their environment variables
+    threadpoolctl = None
+
+# One JSON file for every service on the box:
+# {"default": {...}, "services": {"crowd_counting": {"threads": 4, "affinity": "4-7"}, ...}}
+# Without it the services keep the libraries' defaults (every pool sized to all cores).
+CPU_RESOURCES_FILE = os.getenv("CPU_RESOURCES_FILE", "")
+# Read by OpenMP/BLAS/TensorFlow when their pools are created, so they are set before those imports
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+INTEROP_ENV_VARS = ("TF_NUM_INTEROP_THREADS",)
+
+
+def parse_cpus(spec):
+    """"0-3,6" or [0, 1, 2] -> sorted CPU ids."""
+    if isinstance(spec, (list, tuple)):
+        return sorted({int(cpu) for cpu in spec})
+    cpus = set()
+    for part in str(spec).replace(" ", "").split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        elif part:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpus(cpus):
+    """[0, 1, 2, 3, 6] -> "0-3,6"."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuResources:
+    """Thread pool sizes and CPU affinity for one service.
+
+    threads sizes the compute pools (OpenMP, BLAS, TensorFlow intra-op,
+    torch); "auto" splits the service's CPUs between the co-located services
+    (share, default the number of configured services). interop_threads and
+    opencv_threads default to 1: each service runs one frame at a time.
+    """
+
+    def __init__(self, service, threads=None, interop_threads=1, opencv_threads=1, affinity=None, share=1):
+        self.service = service
+        self.governed = threads is not None or affinity is not None
+        self.affinity = parse_cpus(affinity) if affinity is not None else None
+        self.interop_threads = interop_threads
+        self.opencv_threads = opencv_threads
+        self.share = max(1, int(share))
+        self.threads = threads
+        self.warnings = []
+
+    @classmethod
+    def load(cls, service, path=None):
+        """Settings for service from the config file ("default" overlaid by "services"[service])."""
+        path = CPU_RESOURCES_FILE if path is None else path
+        if not path:
+            return cls(service)
+        with open(path) as f:
+            config = json.load(f)
+        services = config.get("services", {})
+        settings = {"share": len(services) or 1, **config.get("default", {}), **services.get(service, {})}
+        if "affinity" in services.get(service, {}) and "share" not in services.get(service, {}):
+            # Pinned services own their CPUs; "auto" then uses all of them
+            settings["share"] = 1
+        return cls(service, **settings)
+
+    def _resolved_threads(self):
+        if self.threads != "auto":
+            return self.threads
+        cpus = self.affinity or _available_cpus()
+        return max(1, len(cpus) // self.share)
+
+    # --- Applying ---
+    def apply_environment(self):
+        """Pin the process and export pool sizes; must run before numpy, cv2, TensorFlow or torch are imported."""
+        if not self.governed:
+            return self
+        if self.affinity is not None:
+            if hasattr(os, "sched_setaffinity"):
+                usable = [cpu for cpu in self.affinity if cpu in set(range(os.cpu_count() or 1))]
+                if usable != self.affinity:
+                    self.warnings.append(f"CPUs {sorted(set(self.affinity) - set(usable))} do not exist")
+                if usable:
+                    os.sched_setaffinity(0, usable)
+                    self.affinity = usable
+            else:
+                self.warnings.append("CPU affinity is not supported on this platform")
+                self.affinity = None
+        self.threads = self._resolved_threads()
+        if self.threads is not None:
+            # An explicit environment variable still wins, so one service can be overridden for a test
+            for name in THREAD_ENV_VARS:
+                os.environ.setdefault(name, str(self.threads))
+        for name in INTEROP_ENV_VARS:
+            os.environ.setdefault(name, str(self.interop_threads))
+        return self
+
+    def apply_frameworks(self):
+        """Size the pools of the frameworks imported so far, then print the effective settings."""
+        if self.governed:
+            if "cv2" in sys.modules:
+                sys.modules["cv2"].setNumThreads(self.opencv_threads)
+            if "torch" in sys.modules and self.threads is not None:
+                torch = sys.modules["torch"]
+                torch.set_num_threads(self.threads)
+                try:
+                    torch.set_num_interop_threads(self.interop_threads)
+                except RuntimeError as e:  # only allowed before torch's first parallel work
+                    self.warnings.append(f"torch inter-op threads: {e}")
+            if "tensorflow" in sys.modules and self.threads is not None:
+                tf = sys.modules["tensorflow"]
+                try:
+                    tf.config.threading.set_intra_op_parallelism_threads(self.threads)
+                    tf.config.threading.set_inter_op_parallelism_threads(self.interop_threads)
+                except RuntimeError as e:  # TensorFlow already initialized; its env vars were set earlier
+                    self.warnings.append(f"TensorFlow threads: {e}")
+        print(f"[CPU] {self.describe()}")
+        for warning in self.warnings:
+            print(f"[CPU] Warning: {warning}")
+        return self
+
+    # --- Reporting ---
+    def effective(self):
+        """What the process actually runs with, read back from each library."""
+        info = {
+            "governed": self.governed,
+            "cpu_count": os.cpu_count(),
+            "affinity": _available_cpus(),
+            "env": {name: os.environ.get(name) for name in THREAD_ENV_VARS + INTEROP_ENV_VARS},
+        }
+        if "cv2" in sys.modules:
+            info["opencv_threads"] = sys.modules["cv2"].getNumThreads()
+        if "torch" in sys.modules:
+            torch = sys.modules["torch"]
+            info["torch_threads"] = torch.get_num_threads()
+            info["torch_interop_threads"] = torch.get_num_interop_threads()
+        if "tensorflow" in sys.modules:
+            threading_config = sys.modules["tensorflow"].config.threading
+            # 0 means TensorFlow picks (all cores)
+            info["tf_intra_op_threads"] = threading_config.get_intra_op_parallelism_threads()
+            info["tf_inter_op_threads"] = threading_config.get_inter_op_parallelism_threads()
+        if threadpoolctl is not None:
+            info["blas"] = [{"api": pool["internal_api"], "threads": pool["num_threads"]}
+                            for pool in threadpoolctl.threadpool_info()]
+        if self.warnings:
+            info["warnings"] = self.warnings
+        return info
+
+    def describe(self):
+        info = self.effective()
+        cpus = info["affinity"]
+        parts = [f"{len(cpus)} of {info['cpu_count']} CPU(s) ({format_cpus(cpus)})"]
+        parts.append(f"OMP {info['env']['OMP_NUM_THREADS'] or 'default'}")
+        if "opencv_threads" in info:
+            parts.append(f"OpenCV {info['opencv_threads']}")
+        if "torch_threads" in info:
+            parts.append(f"torch {info['torch_threads']}/{info['torch_interop_threads']}")
+        if "tf_intra_op_threads" in info:
+            parts.append(f"TF {info['tf_intra_op_threads'] or 'all'}/{info['tf_inter_op_threads'] or 'all'}")
+        return f"{self.service}: {'governed' if self.governed else 'library defaults'}, {', '.join(parts)}"
+
+
+def configure_cpu(service, path=None):
+    """Load service's settings and apply the parts that must precede the numeric imports.
+
+    Call apply_frameworks() on the result once cv2/TensorFlow/torch are imported.
+    """
+    return CpuResources.load(service, path).apply_environment()
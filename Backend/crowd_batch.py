@@ -0,0 +1,222 @@
+"""Offline crowd counting over recorded video files.
+
+Each video is split into time-range chunks that a pool of worker processes
+decode independently (seek to the chunk start, keep every --stride-th frame)
+and send to YOLO in batches. Counts are written per frame or per second to
+CSV, JSON or MongoDB.
+
+Usage: python crowd_batch.py VIDEO [VIDEO ...] [--workers N] [--stride 5] [--chunk-seconds 60]
+                             [--batch-size 16] [--per second|frame] [--output counts.csv|counts.json] [--mongo]
+                             [--roi "x1,y1;x2,y2;..."]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+import cv2
+
+from crowd_roi import RegionOfInterest, count_people_batch, load_roi
+
+MONGO_COLLECTION = "crowd_video_counts"
+
+# Per-process state set up once by _init_worker
+_model = None
+_batch_size = 16
+_roi = None
+
+
+def _init_worker(model_path, batch_size, threads, roi=None):
+    global _model, _batch_size, _roi
+    # One process per core already; keep OpenCV/torch from oversubscribing inside each worker
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from ultralytics import YOLO
+    _model = YOLO(model_path)
+    _batch_size = batch_size
+    # Rebuilt in each worker from (points, imgsz); its mask is computed on the first frame
+    _roi = RegionOfInterest(*roi) if roi else None
+
+
+def _count_batch(frames):
+    return count_people_batch(_model, frames, _roi)
+
+
+def process_chunk(task):
+    """Worker: count people on every stride-th frame in [start_frame, end_frame) of one video."""
+    path, fps, start_frame, end_frame, stride = task
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return {"task": task, "error": f"Cannot open {path}", "rows": []}
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    rows = []
+    frames, indices = [], []
+    index = start_frame
+    try:
+        while index < end_frame:
+            if (index - start_frame) % stride:
+                # grab() skips colour conversion and copying for frames we do not count
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+            indices.append(index)
+            index += 1
+            if len(frames) >= _batch_size:
+                rows.extend(zip(indices, _count_batch(frames)))
+                frames, indices = [], []
+        if frames:
+            rows.extend(zip(indices, _count_batch(frames)))
+    finally:
+        cap.release()
+
+    return {
+        "task": task,
+        "rows": [(path, i, round(i / fps, 3), count) for i, count in rows],
+        "frames_decoded": index - start_frame,
+        "seconds": (index - start_frame) / fps,
+        "elapsed_s": time.perf_counter() - started,
+    }
+
+
+def plan_chunks(paths, chunk_seconds, stride):
+    """Split each video into [start, end) frame ranges of about chunk_seconds each."""
+    tasks = []
+    total_seconds = 0.0
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"[Batch] Skipping {path}: cannot open")
+            continue
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if frame_count <= 0:
+            print(f"[Batch] Skipping {path}: unknown frame count")
+            continue
+        # Chunk boundaries on stride multiples keep the sampled frames identical to a single pass
+        chunk_frames = max(stride, int(chunk_seconds * fps) // stride * stride)
+        for start in range(0, frame_count, chunk_frames):
+            tasks.append((path, fps, start, min(start + chunk_frames, frame_count), stride))
+        total_seconds += frame_count / fps
+        print(f"[Batch] {path}: {frame_count} frames at {fps:.1f} fps ({frame_count / fps / 60:.1f} min)")
+    return tasks, total_seconds
+
+
+def per_second(rows):
+    """Collapse per-frame rows into one min/max/mean row per video second."""
+    buckets = {}
+    for path, _, ts, count in rows:
+        key = (path, int(ts))
+        bucket = buckets.setdefault(key, [count, count, 0, 0])
+        bucket[0] = min(bucket[0], count)
+        bucket[1] = max(bucket[1], count)
+        bucket[2] += count
+        bucket[3] += 1
+    return [
+        {"video": path, "second": second, "min": b[0], "max": b[1], "mean": round(b[2] / b[3], 3), "samples": b[3]}
+        for (path, second), b in sorted(buckets.items())
+    ]
+
+
+def per_frame(rows):
+    return [{"video": path, "frame": frame, "offset_s": ts, "count": count} for path, frame, ts, count in sorted(rows)]
+
+
+def write_output(records, output, mongo, camera, job_id):
+    if output:
+        if output.endswith(".json"):
+            with open(output, "w") as f:
+                json.dump(records, f)
+        else:
+            with open(output, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(records[0].keys()) if records else ["video"])
+                writer.writeheader()
+                writer.writerows(records)
+        print(f"[Batch] Wrote {len(records)} rows to {output}")
+    if mongo:
+        from pymongo import MongoClient
+        from env_config import get_required_env
+        client = MongoClient(get_required_env("MONGODB_URI"))
+        collection = client[os.getenv("MONGODB_DB_NAME", "face_recognition")][MONGO_COLLECTION]
+        for start in range(0, len(records), 5000):
+            batch = [{**r, "camera": camera, "job_id": job_id} for r in records[start:start + 5000]]
+            collection.insert_many(batch, ordered=False)
+        print(f"[Batch] Wrote {len(records)} documents to {MONGO_COLLECTION} (job_id={job_id})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline crowd counting over recorded video files")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--stride", type=int, default=5, help="count every Nth frame")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0)
+    parser.add_argument("--batch-size", type=int, default=16, help="frames per YOLO call")
+    parser.add_argument("--model", default="yolov8x.pt")
+    parser.add_argument("--per", choices=["second", "frame"], default="second")
+    parser.add_argument("--output", help="CSV or .json file")
+    parser.add_argument("--mongo", action="store_true", help=f"also write to the {MONGO_COLLECTION} collection")
+    parser.add_argument("--camera", default=os.getenv("CROWD_CAMERA_ID", "default"))
+    parser.add_argument("--roi", help='floor polygon "x1,y1;x2,y2;..." (default: CROWD_ROI / CROWD_ROI_FILE for --camera)')
+    args = parser.parse_args()
+    if not args.output and not args.mongo:
+        parser.error("choose --output and/or --mongo")
+
+    tasks, total_seconds = plan_chunks(args.videos, args.chunk_seconds, max(1, args.stride))
+    if not tasks:
+        print("[Batch] Nothing to process")
+        sys.exit(1)
+    workers = max(1, min(args.workers, len(tasks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"[Batch] {len(tasks)} chunks, {total_seconds / 60:.1f} min of video, {workers} workers x {threads} threads")
+
+    started = time.perf_counter()
+    rows = []
+    done_seconds = 0.0
+    failures = 0
+    # spawn: workers must not inherit a forked copy of torch/OpenCV thread pools
+    ctx = multiprocessing.get_context("spawn")
+    roi = load_roi(args.camera, inline=args.roi)
+    roi_args = (roi.points, roi.imgsz) if roi is not None else None
+    if roi is not None:
+        print(f"[Batch] Counting inside a {len(roi.points)}-point ROI")
+    with ctx.Pool(workers, initializer=_init_worker,
+                  initargs=(args.model, args.batch_size, threads, roi_args)) as pool:
+        for done, result in enumerate(pool.imap_unordered(process_chunk, tasks), 1):
+            if result.get("error"):
+                failures += 1
+                print(f"[Batch] Chunk failed: {result['error']}")
+                continue
+            rows.extend(result["rows"])
+            done_seconds += result["seconds"]
+            elapsed = time.perf_counter() - started
+            speed = done_seconds / elapsed if elapsed else 0.0
+            eta = (total_seconds - done_seconds) / speed if speed else 0.0
+            print(f"[Batch] {done}/{len(tasks)} chunks | {done_seconds / 60:.1f}/{total_seconds / 60:.1f} min "
+                  f"| {speed:.1f}x real time | ETA {eta:.0f}s", flush=True)
+
+    elapsed = time.perf_counter() - started
+    records = per_second(rows) if args.per == "second" else per_frame(rows)
+    job_id = uuid.uuid4().hex
+    write_output(records, args.output, args.mongo, args.camera, job_id)
+    print(f"[Batch] {len(rows)} frames counted from {done_seconds / 60:.1f} min of video in {elapsed:.1f}s "
+          f"({done_seconds / elapsed if elapsed else 0:.1f}x real time, {len(rows) / elapsed if elapsed else 0:.1f} frames/s)"
+          + (f", {failures} chunk(s) failed" if failures else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,9 @@ import base64
 from flask import Flask, Response, jsonify
 from flask_cors import CORS
 import io
+import sys
+
+from frame_source import describe_source, open_frame_source, strip_source_args
 
 # Global variables for controlling the counting process
 counting_active = False
@@ -53,15 +56,15 @@ def count_crowd_continuous():
         yolo_model = YOLO('yolov8x.pt')
         print("YOLO model loaded successfully")
         
-        print("Opening webcam...")
-        cap = cv2.VideoCapture(0)
+        print(f"Opening frame source {describe_source()}...")
+        cap = open_frame_source()
         if not cap.isOpened():
-            print("Failed to open webcam")
-            update_status_file("error", message="Cannot open webcam")
+            print(f"Failed to open {cap.kind} source")
+            update_status_file("error", message=f"Cannot open {cap.kind} source")
             counting_active = False
             return
         
-        print("Webcam opened successfully")
+        print(f"{cap.kind.capitalize()} source opened successfully")
         max_count = 0
         current_count = 0
         update_status_file("running", 0, 0, "Crowd counting started")
@@ -74,6 +77,9 @@ def count_crowd_continuous():
         while not stop_flag.is_set() and counting_active:
             ret, img = cap.read()
             if not ret:
+                if cap.exhausted:
+                    print("Frame source ended")
+                    break
                 print("Failed to read frame")
                 time.sleep(0.1)
                 continue
@@ -289,8 +295,9 @@ def get_status():
     }
 
 if __name__ == "__main__":
+    strip_source_args(sys.argv)
     if len(sys.argv) < 2:
-        print("Usage: python crowd_counting.py <command>")
+        print("Usage: python crowd_counting.py <command> [--source SPEC] [--pace realtime|fast|FPS] [--once]")
         print("Commands: start, stop, status")
         sys.exit(1)
     
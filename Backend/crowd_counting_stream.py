@@ -1,3 +1,5 @@
+from cpu_resources import configure_cpu
+cpu = configure_cpu("crowd_counting")  # before numpy, OpenCV and torch size their thread pools
 import cv2
 import numpy as np
 from ultralytics import YOLO
@@ -5,30 +7,88 @@ import time
 import threading
 import json
 import os
-import base64
-from flask import Flask, Response, jsonify
+import datetime
+import uuid
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 import sys
 import atexit
+import env_config  # noqa: F401  (loads Backend/.env for MONGODB_URI)
+from crowd_roi import detect_people, load_roi
+from crowd_history import CrowdHistoryRecorder, RESOLUTIONS, open_history_db, query_history
+from frame_source import describe_source, open_frame_source, strip_source_args
+from service_metrics import ServiceMetrics
+from frame_tracer import FrameTracer
+from frame_governor import FrameGovernor
+from memory_accounting import MemoryLedger
+from session_perf import CROWD_SESSIONS_COLLECTION, SessionPerf, ensure_performance_indexes, save_crowd_session
+from debug_profiler import register_debug_routes
+from event_bus import EventBus, sse_response
+from frame_buffer import FrameBuffer, conditional_frame, jpeg_response, mjpeg_response, not_modified, push_stream_response, tag_frame_response
+cpu.apply_frameworks()
 
 # Global variables for controlling the counting process
 counting_active = False
 current_count = 0
 max_count = 0
+# Performance summary of the last finished session, reported with its final status
+last_performance = None
 counting_thread = None
 stop_flag = threading.Event()
 cap = None
 yolo_model = None
-current_frame = None
-frame_lock = threading.Lock()
+memory = MemoryLedger()
+tracer = FrameTracer("crowd_counting")
+metrics = ServiceMetrics("crowd_counting", tracer=tracer)
+frame_buffer = FrameBuffer(jpeg_quality=80, on_encode=lambda seconds: metrics.observe("encode", seconds),
+                           lock=metrics.lock("frame_buffer"))
 PID_FILE = os.path.join(os.path.dirname(__file__), 'crowd_counting_stream.pid')
+# Fixed location so the CLI `status` command finds it regardless of the caller's working directory
+STATUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crowd_status.json')
+# "running" snapshots are written at most this often; transitions are always written
+STATUS_WRITE_INTERVAL_S = float(os.getenv("CROWD_STATUS_WRITE_INTERVAL_S", "1.0"))
+events = EventBus()
+# Paces the counting loop (CROWD_TARGET_FPS / _CPU_BUDGET / _ADAPTIVE); 0 fps counts as fast as YOLO allows
+governor = FrameGovernor.from_env("CROWD", 0)
+last_status = {"status": "inactive", "current_count": 0, "max_count": 0, "message": "No active session", "timestamp": None}
+_status_lock = metrics.lock("status")
+_last_status_write = 0.0
+CAMERA_ID = os.getenv("CROWD_CAMERA_ID", "default")
+# Floor polygon for this camera (CROWD_ROI / CROWD_ROI_FILE); None counts the whole frame
+roi = load_roi(CAMERA_ID)
+if roi is not None:
+    print(f"Counting inside a {len(roi.points)}-point ROI for camera {CAMERA_ID}")
+
+# Count history is optional: without MONGODB_URI counting works as before and /history is unavailable
+try:
+    history_db = open_history_db()
+except Exception as e:
+    print(f"Crowd history disabled: {e}")
+    history_db = None
+history_recorder = CrowdHistoryRecorder(history_db, camera=CAMERA_ID,
+                                        on_flush=lambda seconds: metrics.observe("db", seconds))
+memory.component("frame_buffer", frame_buffer.nbytes)
+memory.start()
+sessions_collection = history_db[CROWD_SESSIONS_COLLECTION] if history_db is not None else None
+if sessions_collection is not None:
+    try:
+        sessions_collection.create_index("session_id", unique=True)
+        ensure_performance_indexes(sessions_collection)
+    except Exception as e:
+        print(f"Failed to create crowd session indexes: {e}")
 
 # Flask app for streaming
 app = Flask(__name__)
 CORS(app)
+metrics.register(app)
+register_debug_routes(app, worker=lambda: counting_thread, tracer=tracer)
+metrics.gauge("active_sessions", "Counting sessions in progress", lambda: 1 if counting_active else 0)
+metrics.gauge("crowd_current_count", "People in the latest counted frame", lambda: current_count)
+governor.register(metrics)
 
 def update_status_file(status, current=0, maximum=0, message=""):
-    """Update status file for frontend communication"""
+    """Publish a status snapshot and persist it for the CLI `status` command"""
+    global last_status, _last_status_write
     status_data = {
         "status": status,
         "current_count": current,
@@ -36,39 +96,80 @@ def update_status_file(status, current=0, maximum=0, message=""):
         "message": message,
         "timestamp": time.time()
     }
+    if last_performance is not None and status not in ("starting", "running"):
+        status_data["performance"] = last_performance
+    with _status_lock:
+        transition = status != last_status["status"]
+        last_status = status_data
+        due = transition or status_data["timestamp"] - _last_status_write >= STATUS_WRITE_INTERVAL_S
+        if due:
+            _last_status_write = status_data["timestamp"]
+    if transition:
+        events.publish("status", status_payload())
+    if not due:
+        return
+    tmp_path = f"{STATUS_FILE}.{os.getpid()}.tmp"
     try:
-        with open('crowd_status.json', 'w') as f:
+        # Write-then-rename so readers never see a half-written file
+        with open(tmp_path, 'w') as f:
             json.dump(status_data, f)
+        os.replace(tmp_path, STATUS_FILE)
     except Exception as e:
         print(f"Error updating status file: {e}")
 
+def status_payload():
+    """Status as served by /status and the first event of /events"""
+    return {
+        'status': last_status['status'],
+        'message': last_status['message'],
+        'active': counting_active,
+        'current_count': current_count,
+        'max_count': max_count,
+        'performance': last_performance
+    }
+
 def count_crowd_continuous():
     """Continuous crowd counting in a separate thread"""
-    global current_count, max_count, stop_flag, cap, yolo_model, counting_active, current_frame
+    global current_count, max_count, stop_flag, cap, yolo_model, counting_active, last_performance
     
+    trace_mark = tracer.mark()
+    session_id = uuid.uuid4().hex
+    perf = metrics.start_session(SessionPerf("crowd_counting", detection_label="people",
+                                             camera=CAMERA_ID, source=describe_source()))
     try:
-        print("Loading YOLO model...")
-        yolo_model = YOLO('yolov8x.pt')
-        print("YOLO model loaded successfully")
+        # Loaded once and kept across sessions; reloading it per session grew RSS on long runs
+        if yolo_model is None:
+            print("Loading YOLO model...")
+            with memory.measure("yolo"):
+                yolo_model = YOLO('yolov8x.pt')
+            print("YOLO model loaded successfully")
         
-        print("Opening webcam...")
-        cap = cv2.VideoCapture(0)
+        print(f"Opening frame source {describe_source()}...")
+        cap = open_frame_source()
         if not cap.isOpened():
-            print("Failed to open webcam")
-            update_status_file("error", message="Cannot open webcam")
+            print(f"Failed to open {cap.kind} source")
+            update_status_file("error", message=f"Cannot open {cap.kind} source")
             counting_active = False
             return
         
-        print("Webcam opened successfully")
+        print(f"{cap.kind.capitalize()} source opened successfully")
         max_count = 0
         current_count = 0
         update_status_file("running", 0, 0, "Crowd counting started")
         print("Starting crowd counting. Monitoring for stop signal...")
         
         frame_count = 0
+        published_counts = (0, 0)
+        people = []
+        governor.reset()
         while not stop_flag.is_set() and counting_active:
-            ret, img = cap.read()
+            tracer.next_frame()
+            governor.start_frame()
+            ret, img = metrics.read_frame(cap)
             if not ret:
+                if cap.exhausted:
+                    print("Frame source ended")
+                    break
                 print("Failed to read frame")
                 time.sleep(0.1)
                 continue
@@ -76,39 +177,45 @@ def count_crowd_continuous():
             frame_count += 1
             
             try:
-                # Perform YOLO detection
-                yolo_results = yolo_model(img)
-                current_count = 0
+                # Perform YOLO detection (on the ROI crop when one is configured);
+                # frames the governor skips reuse the previous detections
+                detected = governor.should_detect()
+                if detected:
+                    with metrics.stage("detect"):
+                        people = detect_people(yolo_model, img, roi, governor.scale)
+                current_count = len(people)
                 
                 # Draw bounding boxes for persons detected
-                if yolo_results and len(yolo_results) > 0 and yolo_results[0].boxes is not None:
-                    for result in yolo_results[0].boxes:
-                        class_id = int(result.cls[0])
-                        if class_id == 0:  # Class ID 0 corresponds to 'person' in YOLO
-                            current_count += 1
-                            x1, y1, x2, y2 = map(int, result.xyxy[0])
-                            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                            cv2.putText(img, "Person", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                with tracer.span("draw"):
+                    for x1, y1, x2, y2 in people:
+                        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                        cv2.putText(img, "Person", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    if roi is not None:
+                        roi.draw(img)
+                tracer.annotate(people=current_count)
+                if detected:
+                    perf.frame_processed(current_count)
                 
                 # Update max crowd count
                 if current_count > max_count:
                     max_count = current_count
+                history_recorder.record(current_count)
+                if (current_count, max_count) != published_counts:
+                    published_counts = (current_count, max_count)
+                    events.publish("count", {'current_count': current_count, 'max_count': max_count})
                 
                 # Display count on frame
-                cv2.putText(img, f"Current: {current_count} | Max: {max_count}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-                cv2.putText(img, f"Frame: {frame_count}", 
-                           (10, img.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                with tracer.span("draw"):
+                    cv2.putText(img, f"Current: {current_count} | Max: {max_count}", 
+                               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+                    cv2.putText(img, f"Frame: {frame_count}", 
+                               (10, img.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
                 
-                # Store frame for streaming instead of displaying in OpenCV window
-                with frame_lock:
-                    # Encode frame as JPEG
-                    _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                    current_frame = base64.b64encode(buffer).decode('utf-8')
+                # Store frame for streaming (encoding is skipped when running headless)
+                frame_buffer.publish(img, {'count': current_count, 'max_count': max_count})
                 
-                # Update status file with current counts (every 10 frames to reduce I/O)
-                if frame_count % 10 == 0:
-                    update_status_file("running", current_count, max_count, "Counting in progress")
+                # Status snapshot for the CLI (rate limited inside update_status_file)
+                update_status_file("running", current_count, max_count, "Counting in progress")
                 
                 # Check for stop signal
                 if stop_flag.is_set():
@@ -117,7 +224,7 @@ def count_crowd_continuous():
                     
             except Exception as detection_error:
                 print(f"Detection error: {detection_error}")
-                continue
+            governor.end_frame(sleep=stop_flag.wait)
         
         print("Stopping crowd counting...")
         
@@ -127,23 +234,32 @@ def count_crowd_continuous():
     finally:
         # Always cleanup resources
         print("Cleaning up resources in finally block...")
+        tracer.end_frame()
         cleanup_resources()
         counting_active = False
+        history_recorder.flush(include_open=True)
+        last_performance = metrics.end_session()
+        if sessions_collection is not None:
+            save_crowd_session(sessions_collection, session_id, {
+                "camera": CAMERA_ID,
+                "started_at": last_performance["started_at"],
+                "max_count": max_count,
+            }, last_performance)
         update_status_file("completed", current_count, max_count, 
                           f"Crowd counting completed. Maximum people detected: {max_count}")
         print(f"Crowd counting completed. Maximum people detected: {max_count}")
+        tracer.dump_session(time.strftime("%Y%m%d-%H%M%S"), since=trace_mark)
 
 def cleanup_resources():
     """Clean up camera resources"""
-    global cap, current_frame
+    global cap
     try:
         if cap is not None:
             cap.release()
             cap = None
         
         # Clear current frame
-        with frame_lock:
-            current_frame = None
+        frame_buffer.clear()
         
         print("Resources cleaned up")
     except Exception as e:
@@ -167,40 +283,80 @@ def remove_pid_file():
 @app.route('/stream')
 def video_stream():
     """Video streaming route"""
-    def generate():
-        while counting_active:
-            with frame_lock:
-                if current_frame is not None:
-                    # Convert base64 back to bytes for streaming
-                    frame_bytes = base64.b64decode(current_frame)
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.1)  # Control frame rate
-    
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return mjpeg_response(frame_buffer, lambda: counting_active)
 
 @app.route('/current-frame')
 def get_current_frame():
     """Get current frame as base64"""
-    with frame_lock:
-        if current_frame is not None:
-            return jsonify({
-                'frame': current_frame,
-                'count': current_count,
-                'max_count': max_count,
-                'active': counting_active
-            })
-        else:
-            return jsonify({'frame': None, 'active': counting_active})
+    seq, frame_b64, modified = conditional_frame(frame_buffer, as_base64=True)
+    if not modified:
+        return not_modified(frame_buffer, seq)
+    if frame_b64 is not None:
+        response = jsonify({
+            'frame': frame_b64,
+            'count': current_count,
+            'max_count': max_count,
+            'active': counting_active,
+            'seq': seq
+        })
+    else:
+        response = jsonify({'frame': None, 'active': counting_active, 'seq': seq})
+    return tag_frame_response(response, frame_buffer, seq, len(frame_b64 or ''))
+
+@app.route('/current-frame.jpg')
+def get_current_frame_jpeg():
+    """Get current frame as raw JPEG"""
+    return jpeg_response(frame_buffer)
+
+@app.route('/frames')
+def push_frames():
+    """Persistent binary push stream relayed by server.js"""
+    return push_stream_response(frame_buffer, lambda: counting_active)
+
+@app.route('/frame-stats')
+def get_frame_stats():
+    """Frame encoding and serving counters"""
+    return jsonify(frame_buffer.stats())
 
 @app.route('/status')
 def get_status():
     """Get counting status"""
-    return jsonify({
-        'active': counting_active,
-        'current_count': current_count,
-        'max_count': max_count
-    })
+    return jsonify(status_payload())
+
+@app.route('/events')
+def status_events():
+    """Server-Sent Events: status transitions and count changes"""
+    return sse_response(events, status_payload)
+
+def _parse_time_arg(name, default):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+@app.route('/history')
+def get_history():
+    """Crowd counts over time: ?from=&to= (epoch seconds or ISO 8601), ?resolution=auto|1s|1m|1h"""
+    if history_db is None:
+        return jsonify({'success': False, 'message': 'Crowd history requires MONGODB_URI'}), 503
+    now = time.time()
+    try:
+        start = _parse_time_arg('from', now - 3600)
+        end = _parse_time_arg('to', now)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid from/to parameter'}), 400
+    resolution = request.args.get('resolution', 'auto')
+    if resolution != 'auto' and resolution not in RESOLUTIONS:
+        return jsonify({'success': False, 'message': f'resolution must be auto or one of {list(RESOLUTIONS)}'}), 400
+    camera = request.args.get('camera', CAMERA_ID)
+    try:
+        used, points = query_history(history_db, camera, start, end, resolution, recorder=history_recorder)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'History query failed: {e}'}), 500
+    return jsonify({'success': True, 'camera': camera, 'resolution': used, 'from': start, 'to': end, 'points': points})
 
 @app.route('/start', methods=['POST'])
 def start_route():
@@ -218,11 +374,13 @@ def stop_route():
 
 @app.route('/health')
 def health_route():
-    return jsonify({'ok': True, 'active': counting_active})
+    return jsonify({'ok': True, 'active': counting_active, 'history': history_recorder.stats(), 'memory': memory.report(),
+                    'roi': roi.describe() if roi is not None else None, 'governor': governor.stats(),
+                    'cpu': cpu.effective()})
 
 def start_counting():
     """Start crowd counting in a separate thread"""
-    global counting_active, counting_thread, stop_flag
+    global counting_active, counting_thread, stop_flag, current_count, max_count, last_performance
     
     if counting_active:
         print("Counting is already active")
@@ -234,6 +392,11 @@ def start_counting():
         
         stop_flag.clear()
         counting_active = True
+        current_count = 0
+        max_count = 0
+        last_performance = None
+        # Replace the previous session's final status before the model finishes loading
+        update_status_file("starting", 0, 0, "Loading model and opening camera")
         
         counting_thread = threading.Thread(target=count_crowd_continuous)
         counting_thread.daemon = True
@@ -300,6 +463,8 @@ def stop_counting():
 
 if __name__ == "__main__":
     atexit.register(remove_pid_file)
+    atexit.register(history_recorder.close)
+    strip_source_args(sys.argv)
     if len(sys.argv) > 1:
         command = sys.argv[1]
         if command == "start":
@@ -315,7 +480,7 @@ if __name__ == "__main__":
         elif command == "status":
             # Read status from file and output as JSON
             try:
-                with open('crowd_status.json', 'r') as f:
+                with open(STATUS_FILE, 'r') as f:
                     status_data = json.load(f)
                 print(json.dumps(status_data))
             except FileNotFoundError:
@@ -333,6 +498,6 @@ if __name__ == "__main__":
                     "message": f"Error reading status: {str(e)}"
                 }))
         else:
-            print("Usage: python crowd_counting_stream.py [start|stop|status]")
+            print("Usage: python crowd_counting_stream.py [start|stop|status] [--source SPEC] [--pace realtime|fast|FPS] [--once]")
     else:
-        print("Usage: python crowd_counting_stream.py [start|stop|status]")
+        print("Usage: python crowd_counting_stream.py [start|stop|status] [--source SPEC] [--pace realtime|fast|FPS] [--once]")
@@ -0,0 +1,226 @@
+import datetime
+import os
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+# resolution -> (time-series collection, bucket width in seconds, granularity, retention in seconds or None)
+RESOLUTIONS = {
+    "1s": ("crowd_counts_1s", 1, "seconds", 7 * 24 * 3600),
+    "1m": ("crowd_counts_1m", 60, "minutes", 180 * 24 * 3600),
+    "1h": ("crowd_counts_1h", 3600, "hours", None),
+}
+# Charts never get more points than this; "auto" picks the finest tier that fits
+MAX_POINTS = 3600
+# Buckets kept in memory while MongoDB is unreachable, per resolution
+MAX_PENDING_BUCKETS = 24 * 3600
+
+
+def open_history_db():
+    """Database for crowd history, or None when MONGODB_URI is not configured."""
+    uri = os.getenv("MONGODB_URI")
+    if not uri:
+        return None
+    client = MongoClient(uri, serverSelectionTimeoutMS=3000)
+    return client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
+
+
+def ensure_history_collections(db):
+    existing = set(db.list_collection_names())
+    for name, _, granularity, retention in RESOLUTIONS.values():
+        if name in existing:
+            continue
+        options = {"timeseries": {"timeField": "ts", "metaField": "camera", "granularity": granularity}}
+        if retention:
+            options["expireAfterSeconds"] = retention
+        try:
+            db.create_collection(name, **options)
+        except CollectionInvalid:
+            pass
+
+
+def _to_datetime(epoch_seconds):
+    return datetime.datetime.fromtimestamp(epoch_seconds, datetime.timezone.utc)
+
+
+def _bucket_doc(camera, bucket):
+    return {
+        "ts": _to_datetime(bucket["start"]),
+        "camera": camera,
+        "min": bucket["min"],
+        "max": bucket["max"],
+        "sum": bucket["sum"],
+        "samples": bucket["samples"],
+    }
+
+
+class CrowdHistoryRecorder:
+    """Aggregates per-frame counts into 1s/1m/1h min/max/mean buckets.
+
+    Closed buckets are written with one insert_many per tier every
+    flush_interval seconds from a background thread, so the counting loop
+    only updates three in-memory dicts per frame.
+    """
+
+    def __init__(self, db, camera="default", flush_interval=5.0, on_flush=None):
+        self.db = db
+        # Called with the duration of every insert_many (service metrics)
+        self.on_flush = on_flush
+        self.camera = camera
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._open = {}
+        self._pending = {res: [] for res in RESOLUTIONS}
+        self._stats = {"frames_recorded": 0, "documents_written": 0, "flushes": 0, "write_errors": 0}
+        self._stop = threading.Event()
+        self._collections_ready = False
+        self._thread = None
+        if db is not None:
+            self._thread = threading.Thread(target=self._run, name="crowd-history", daemon=True)
+            self._thread.start()
+
+    def record(self, count, ts=None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._stats["frames_recorded"] += 1
+            for res, (_, width, _, _) in RESOLUTIONS.items():
+                start = int(ts // width) * width
+                bucket = self._open.get(res)
+                if bucket is not None and bucket["start"] != start:
+                    self._close_bucket(res, bucket)
+                    bucket = None
+                if bucket is None:
+                    bucket = {"start": start, "min": count, "max": count, "sum": 0, "samples": 0}
+                    self._open[res] = bucket
+                bucket["min"] = min(bucket["min"], count)
+                bucket["max"] = max(bucket["max"], count)
+                bucket["sum"] += count
+                bucket["samples"] += 1
+
+    def _close_bucket(self, res, bucket):
+        pending = self._pending[res]
+        pending.append(bucket)
+        if len(pending) > MAX_PENDING_BUCKETS:
+            del pending[:len(pending) - MAX_PENDING_BUCKETS]
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self, include_open=False):
+        """Write closed buckets (and optionally the still-open ones) to MongoDB."""
+        with self._lock:
+            if include_open:
+                for res, bucket in self._open.items():
+                    self._close_bucket(res, bucket)
+                self._open = {}
+            batches = {res: pending for res, pending in self._pending.items() if pending}
+            self._pending = {res: [] for res in RESOLUTIONS}
+        if self.db is None or not batches:
+            return
+        if not self._collections_ready:
+            try:
+                ensure_history_collections(self.db)
+                self._collections_ready = True
+            except PyMongoError as e:
+                print(f"[CrowdHistory] Cannot prepare collections, will retry: {e}")
+                with self._lock:
+                    self._stats["write_errors"] += 1
+                    for res, buckets in batches.items():
+                        self._pending[res] = buckets + self._pending[res]
+                return
+        for res, buckets in batches.items():
+            collection = self.db[RESOLUTIONS[res][0]]
+            started = time.perf_counter()
+            try:
+                collection.insert_many([_bucket_doc(self.camera, b) for b in buckets], ordered=False)
+            except PyMongoError as e:
+                print(f"[CrowdHistory] Failed to write {len(buckets)} {res} buckets, will retry: {e}")
+                with self._lock:
+                    self._stats["write_errors"] += 1
+                    self._pending[res] = buckets + self._pending[res]
+                continue
+            if self.on_flush:
+                self.on_flush(time.perf_counter() - started)
+            with self._lock:
+                self._stats["documents_written"] += len(buckets)
+        with self._lock:
+            self._stats["flushes"] += 1
+
+    def buffered_buckets(self, res, start, end):
+        """Unflushed buckets for res within [start, end), so live charts are not a flush behind."""
+        with self._lock:
+            buckets = list(self._pending[res])
+            if res in self._open:
+                buckets.append(dict(self._open[res]))
+        return [b for b in buckets if start <= b["start"] < end]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_buckets"] = sum(len(p) for p in self._pending.values())
+        frames = stats["frames_recorded"]
+        stats["frames_per_write"] = round(frames / stats["documents_written"], 1) if stats["documents_written"] else None
+        return stats
+
+    def close(self):
+        self._stop.set()
+        self.flush(include_open=True)
+
+
+def pick_resolution(start, end, requested="auto"):
+    if requested in RESOLUTIONS:
+        return requested
+    span = max(0.0, end - start)
+    for res, (_, width, _, _) in RESOLUTIONS.items():
+        if span / width <= MAX_POINTS:
+            return res
+    return "1h"
+
+
+def query_history(db, camera, start, end, resolution="auto", recorder=None):
+    """Return (resolution, points) for [start, end) in epoch seconds, merging duplicate buckets."""
+    res = pick_resolution(start, end, resolution)
+    merged = {}
+
+    def merge(ts, bmin, bmax, bsum, samples):
+        point = merged.get(ts)
+        if point is None:
+            merged[ts] = {"min": bmin, "max": bmax, "sum": bsum, "samples": samples}
+            return
+        point["min"] = min(point["min"], bmin)
+        point["max"] = max(point["max"], bmax)
+        point["sum"] += bsum
+        point["samples"] += samples
+
+    if db is not None:
+        pipeline = [
+            {"$match": {"camera": camera, "ts": {"$gte": _to_datetime(start), "$lt": _to_datetime(end)}}},
+            {"$group": {
+                "_id": "$ts",
+                "min": {"$min": "$min"},
+                "max": {"$max": "$max"},
+                "sum": {"$sum": "$sum"},
+                "samples": {"$sum": "$samples"},
+            }},
+        ]
+        for doc in db[RESOLUTIONS[res][0]].aggregate(pipeline):
+            ts = doc["_id"].replace(tzinfo=datetime.timezone.utc).timestamp()
+            merge(ts, doc["min"], doc["max"], doc["sum"], doc["samples"])
+    if recorder is not None and recorder.camera == camera:
+        for b in recorder.buffered_buckets(res, start, end):
+            merge(float(b["start"]), b["min"], b["max"], b["sum"], b["samples"])
+
+    points = [
+        {
+            "ts": ts,
+            "min": p["min"],
+            "max": p["max"],
+            "mean": round(p["sum"] / p["samples"], 3) if p["samples"] else None,
+            "samples": p["samples"],
+        }
+        for ts, p in sorted(merged.items())
+    ]
+    return res, points
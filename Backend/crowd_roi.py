@@ -0,0 +1,156 @@
+import json
+import math
+import os
+
+import cv2
+import numpy as np
+
+import env_config  # noqa: F401  (loads Backend/.env for CROWD_ROI*)
+
+# Per-camera regions of interest: a JSON file {"<camera id>": {"polygon": [[x, y], ...], "imgsz": 480}, ...}.
+# Coordinates are fractions of the frame when all of them are <= 1, otherwise pixels.
+CROWD_ROI_FILE = os.getenv("CROWD_ROI_FILE", "")
+# Inline polygon "x1,y1;x2,y2;..." for this process's camera; takes precedence over the file
+CROWD_ROI = os.getenv("CROWD_ROI", "")
+# Upper bound for the YOLO input size on the ROI crop; smaller crops are not upscaled past their own size
+CROWD_ROI_IMGSZ = int(os.getenv("CROWD_ROI_IMGSZ", "640"))
+PERSON_CLASS_ID = 0
+# YOLO input sizes must be multiples of its largest stride
+YOLO_STRIDE = 32
+# Ultralytics' default input size, used on the full frame
+DEFAULT_IMGSZ = 640
+
+
+def parse_polygon(text):
+    """"x1,y1;x2,y2;..." -> [(x, y), ...]"""
+    points = []
+    for pair in text.replace(" ", "").split(";"):
+        if pair:
+            x, y = pair.split(",")
+            points.append((float(x), float(y)))
+    return points
+
+
+class RegionOfInterest:
+    """A floor polygon: YOLO runs on its bounding crop, and a person counts when their feet are inside it.
+
+    The pixel polygon, crop rectangle and containment mask are computed once
+    per frame size and reused for every frame.
+    """
+
+    def __init__(self, points, imgsz=CROWD_ROI_IMGSZ):
+        if len(points) < 3:
+            raise ValueError("An ROI polygon needs at least 3 points")
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.normalized = all(0.0 <= v <= 1.0 for point in self.points for v in point)
+        self.imgsz = imgsz
+        self._shape = None
+        self._polygon = None
+        self._rect = None
+        self._mask = None
+        self._input_size = None
+
+    def _prepare(self, shape):
+        if shape[:2] == self._shape:
+            return
+        height, width = shape[:2]
+        scale = (width, height) if self.normalized else (1, 1)
+        polygon = np.array([[round(x * scale[0]), round(y * scale[1])] for x, y in self.points], dtype=np.int32)
+        x, y, w, h = cv2.boundingRect(polygon)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"ROI {self.points} lies outside the {width}x{height} frame")
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(mask, [polygon], 255)
+        self._shape = shape[:2]
+        self._polygon = polygon
+        self._rect = (x0, y0, x1, y1)
+        self._mask = mask
+        long_side = max(x1 - x0, y1 - y0)
+        self._input_size = min(self.imgsz, math.ceil(long_side / YOLO_STRIDE) * YOLO_STRIDE)
+
+    def crop(self, frame):
+        """(view of the ROI's bounding rectangle, (x offset, y offset))."""
+        self._prepare(frame.shape)
+        x0, y0, x1, y1 = self._rect
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def input_size(self, frame):
+        self._prepare(frame.shape)
+        return self._input_size
+
+    def contains(self, x, y):
+        """Whether a full-frame point lies inside the polygon (a mask lookup)."""
+        height, width = self._mask.shape
+        return bool(self._mask[min(max(int(y), 0), height - 1), min(max(int(x), 0), width - 1)])
+
+    def keep(self, boxes):
+        """Boxes whose bottom-centre (where the person stands) is inside the polygon."""
+        return [box for box in boxes if self.contains((box[0] + box[2]) / 2, box[3] - 1)]
+
+    def draw(self, frame, color=(255, 200, 0)):
+        self._prepare(frame.shape)
+        cv2.polylines(frame, [self._polygon], True, color, 2)
+
+    def describe(self):
+        info = {"points": len(self.points), "normalized": self.normalized, "max_imgsz": self.imgsz}
+        if self._rect is not None:
+            x0, y0, x1, y1 = self._rect
+            frame_pixels = self._shape[0] * self._shape[1]
+            info.update(crop=[x0, y0, x1 - x0, y1 - y0], imgsz=self._input_size,
+                        crop_fraction=round((x1 - x0) * (y1 - y0) / frame_pixels, 3))
+        return info
+
+
+def load_roi(camera, path=None, inline=None):
+    """The RegionOfInterest configured for camera, or None to count the whole frame."""
+    inline = CROWD_ROI if inline is None else inline
+    path = CROWD_ROI_FILE if path is None else path
+    if inline:
+        return RegionOfInterest(parse_polygon(inline))
+    if not path:
+        return None
+    with open(path) as f:
+        config = json.load(f).get(camera)
+    if not config:
+        return None
+    return RegionOfInterest(config["polygon"], int(config.get("imgsz", CROWD_ROI_IMGSZ)))
+
+
+def _scaled(imgsz, scale):
+    return max(YOLO_STRIDE, math.ceil(imgsz * scale / YOLO_STRIDE) * YOLO_STRIDE)
+
+
+def _person_boxes(result, offset=(0, 0)):
+    if result.boxes is None:
+        return []
+    dx, dy = offset
+    return [
+        (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+        for x1, y1, x2, y2 in (map(int, box) for box in result.boxes.xyxy.tolist())
+    ]
+
+
+def detect_people(model, frame, roi=None, scale=1.0):
+    """Person boxes (x1, y1, x2, y2) in full-frame pixels, limited to the ROI when one is set.
+
+    scale < 1 shrinks YOLO's input size (the frame governor's degraded levels).
+    """
+    if roi is None:
+        results = model(frame, classes=[PERSON_CLASS_ID], imgsz=_scaled(DEFAULT_IMGSZ, scale), verbose=False)
+        return _person_boxes(results[0]) if results else []
+    crop, offset = roi.crop(frame)
+    results = model(crop, classes=[PERSON_CLASS_ID], imgsz=_scaled(roi.input_size(frame), scale), verbose=False)
+    return roi.keep(_person_boxes(results[0], offset)) if results else []
+
+
+def count_people_batch(model, frames, roi=None):
+    """People per frame for a batch of same-sized frames (offline jobs)."""
+    if roi is None:
+        results = model(frames, classes=[PERSON_CLASS_ID], verbose=False)
+        return [len(_person_boxes(r)) for r in results]
+    crops = [roi.crop(frame) for frame in frames]
+    results = model([crop for crop, _ in crops], classes=[PERSON_CLASS_ID], imgsz=roi.input_size(frames[0]),
+                    verbose=False)
+    return [len(roi.keep(_person_boxes(r, offset))) for r, (_, offset) in zip(results, crops)]
@@ -0,0 +1,201 @@
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from flask import Response, jsonify, request
+
+# The /debug routes answer 404 unless this is set; requests must send it as X-Debug-Token (or ?token=)
+DEBUG_TOKEN = os.getenv("DEBUG_ENDPOINTS_TOKEN", "")
+MAX_PROFILE_S = 60.0
+DEFAULT_INTERVAL_MS = 5.0
+MAX_STACK_DEPTH = 64
+
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_memory_baseline = None
+
+
+def _authorized():
+    if not DEBUG_TOKEN:
+        return False
+    supplied = request.headers.get("X-Debug-Token") or request.args.get("token") or ""
+    return hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode())
+
+
+def _float_arg(name, default, low, high):
+    try:
+        value = float(request.args.get(name, default))
+    except ValueError:
+        value = default
+    return min(max(value, low), high)
+
+
+def _text(body):
+    return Response(body, content_type="text/plain; charset=utf-8", headers={"Cache-Control": "no-store"})
+
+
+# --- Sampling profiler ---
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(thread_ids, seconds, interval):
+    """Sample the given threads' stacks every interval seconds; returns (Counter of root-first stacks, samples taken)."""
+    stacks = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frames = sys._current_frames()
+        for ident in thread_ids:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[tuple(reversed(stack))] += 1
+        samples += 1
+        del frames
+        time.sleep(interval)
+    return stacks, samples
+
+
+def collapsed(stacks):
+    """Brendan Gregg's collapsed format, for flamegraph.pl or speedscope."""
+    return "\n".join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def stats_table(stacks, samples, interval, limit=40):
+    """pstats-like table of self and cumulative samples per function."""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for label in set(stack):
+            total[label] += count
+    hits = sum(stacks.values()) or 1
+    lines = [
+        f"{samples} samples every {interval * 1000:.1f} ms, {hits} stack hits",
+        "",
+        f"{'self %':>7} {'self s':>8} {'cum %':>7} {'cum s':>8}  function",
+    ]
+    for label, count in total.most_common(limit):
+        lines.append(f"{own[label] / hits:>7.1%} {own[label] * interval:>8.2f} "
+                     f"{count / hits:>7.1%} {count * interval:>8.2f}  {label}")
+    return "\n".join(lines) + "\n"
+
+
+def profile_route(worker):
+    if not _authorized():
+        return jsonify({"message": "Not found"}), 404
+    seconds = _float_arg("seconds", 10.0, 0.1, MAX_PROFILE_S)
+    interval = _float_arg("interval_ms", DEFAULT_INTERVAL_MS, 1.0, 1000.0) / 1000
+    if request.args.get("thread") == "all":
+        skip = {threading.get_ident()}
+        thread_ids = [t.ident for t in threading.enumerate() if t.ident not in skip]
+    else:
+        thread = worker()
+        if thread is None or not thread.is_alive():
+            return jsonify({"message": "No worker thread running; start a session or pass thread=all"}), 409
+        thread_ids = [thread.ident]
+    if not _profile_lock.acquire(blocking=False):
+        return jsonify({"message": "A profile is already running"}), 409
+    try:
+        stacks, samples = sample_stacks(thread_ids, seconds, interval)
+    finally:
+        _profile_lock.release()
+    if request.args.get("format", "collapsed") == "pstats":
+        return _text(stats_table(stacks, samples, interval))
+    return _text(collapsed(stacks))
+
+
+# --- tracemalloc ---
+def _top_stats(snapshot, baseline, group, limit):
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    if baseline is None:
+        stats = snapshot.statistics(group)
+        lines = [f"Top {limit} allocations by {group}:"]
+    else:
+        stats = snapshot.compare_to(baseline, group)
+        lines = [f"Top {limit} allocation changes by {group}:"]
+    lines.extend(str(stat) for stat in stats[:limit])
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append("")
+    lines.append(f"Traced: {current / 1024 ** 2:.1f} MiB current, {peak / 1024 ** 2:.1f} MiB peak")
+    return "\n".join(lines) + "\n"
+
+
+def memory_route():
+    """One-shot diff over ?seconds=N, or action=start|snapshot|stop for longer leak hunts."""
+    global _memory_baseline
+    if not _authorized():
+        return jsonify({"message": "Not found"}), 404
+    group = request.args.get("group", "lineno")
+    if group not in ("lineno", "filename", "traceback"):
+        group = "lineno"
+    limit = int(_float_arg("top", 25, 1, 500))
+    action = request.args.get("action")
+
+    with _memory_lock:
+        if action == "start":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(int(_float_arg("frames", 10, 1, 100)))
+            _memory_baseline = tracemalloc.take_snapshot()
+            return jsonify({"tracing": True, "message": "Baseline taken; call action=snapshot to diff, action=stop to end"})
+        if action == "stop":
+            tracemalloc.stop()
+            _memory_baseline = None
+            return jsonify({"tracing": False})
+        if action == "snapshot":
+            if not tracemalloc.is_tracing():
+                return jsonify({"message": "Not tracing; call action=start first"}), 409
+            return _text(_top_stats(tracemalloc.take_snapshot(), _memory_baseline, group, limit))
+
+        # One-shot: trace for N seconds and report what grew, then stop (unless a long trace is running)
+        seconds = _float_arg("seconds", 10.0, 0.1, MAX_PROFILE_S)
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(int(_float_arg("frames", 10, 1, 100)))
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            return _text(_top_stats(tracemalloc.take_snapshot(), before, group, limit))
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+
+# --- Frame tracing ---
+def trace_route(tracer):
+    """?enable=1|0 switches tracing, ?clear=1 empties the buffer; otherwise returns the spans as Chrome trace JSON."""
+    if not _authorized():
+        return jsonify({"message": "Not found"}), 404
+    if tracer is None:
+        return jsonify({"message": "This service has no frame tracer"}), 404
+    enable = request.args.get("enable")
+    if enable is not None or request.args.get("clear") == "1":
+        if request.args.get("clear") == "1":
+            tracer.clear()
+        if enable is not None:
+            tracer.set_enabled(enable == "1")
+        return jsonify(tracer.stats())
+    response = jsonify(tracer.chrome_trace())
+    response.headers["Content-Disposition"] = f'attachment; filename="{tracer.service}-trace.json"'
+    return response
+
+
+def register_debug_routes(app, worker, tracer=None):
+    """Mount /debug/profile, /debug/memory and /debug/trace; worker() returns the thread to profile by default.
+
+    Nothing runs until a route is called: the sampler is a loop inside the
+    request, tracemalloc is only started on demand and the tracer stays off
+    unless FRAME_TRACE=1 or /debug/trace?enable=1.
+    """
+    app.add_url_rule("/debug/profile", "debug_profile", lambda: profile_route(worker))
+    app.add_url_rule("/debug/memory", "debug_memory", memory_route)
+    app.add_url_rule("/debug/trace", "debug_trace", lambda: trace_route(tracer))
@@ -0,0 +1,105 @@
+import datetime
+import os
+
+import cv2
+import numpy as np
+from bson.binary import Binary
+
+# Tag stored next to every embedding list. Bump it whenever the embedder changes (weights,
+# runtime conversion, alignment) so old and new vectors are never compared with each other.
+DEFAULT_EMBEDDING_MODEL = "facenet-keras-160"
+EMBEDDING_MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", DEFAULT_EMBEDDING_MODEL)
+
+# Face crops retained at registration so embeddings can be regenerated without re-enrolling.
+# Kept out of `users` so gallery and login reads never carry them.
+CROPS_COLLECTION = "face_crops"
+CROP_MARGIN = 0.2
+CROP_MAX_SIDE = 224
+CROP_JPEG_QUALITY = 90
+FACE_SIZE = (160, 160)
+
+
+class EmbeddingVersionMismatch(ValueError):
+    """Raised when vectors from different embedding models would be compared."""
+
+
+def load_embedder():
+    """The embedder matching EMBEDDING_MODEL_VERSION; change both together."""
+    from keras_facenet import FaceNet
+    return FaceNet()
+
+
+def embedding_update(embeddings, model_version=EMBEDDING_MODEL_VERSION):
+    """Update document that replaces a user's embeddings and drops any re-embedding in flight."""
+    return {
+        "$set": {
+            "embeddings": [np.asarray(e).tolist() for e in embeddings],
+            "embedding_model": model_version,
+            "faceRegistered": True,
+            "face_updated_at": datetime.datetime.now(),
+        },
+        "$unset": {"pending_embeddings": "", "pending_embedding_model": ""},
+    }
+
+
+def stored_model(doc):
+    """Model version of a user's live embeddings (untagged documents predate versioning)."""
+    return doc.get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+
+
+def select_embeddings(doc, model_version=EMBEDDING_MODEL_VERSION):
+    """The user's embeddings produced by model_version, live or pending re-embedding, else None."""
+    if doc.get("embeddings") and stored_model(doc) == model_version:
+        return doc["embeddings"]
+    if doc.get("pending_embeddings") and doc.get("pending_embedding_model") == model_version:
+        return doc["pending_embeddings"]
+    return None
+
+
+# --- Retained crops ---
+def extract_crop(frame, box):
+    """BGR face crop with CROP_MARGIN context, downscaled to CROP_MAX_SIDE, and the face box inside it."""
+    x, y, width, height = box
+    x, y = max(0, x), max(0, y)
+    mx, my = int(width * CROP_MARGIN), int(height * CROP_MARGIN)
+    left, top = max(0, x - mx), max(0, y - my)
+    right, bottom = min(frame.shape[1], x + width + mx), min(frame.shape[0], y + height + my)
+    crop = frame[top:bottom, left:right]
+    inner = [x - left, y - top, min(width, right - x), min(height, bottom - y)]
+    scale = min(1.0, CROP_MAX_SIDE / max(crop.shape[:2]))
+    if scale < 1.0:
+        crop = cv2.resize(crop, (int(crop.shape[1] * scale), int(crop.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        inner = [int(v * scale) for v in inner]
+    return crop, inner
+
+
+def align_crop(crop, box):
+    """Current alignment: the face box, RGB, resized to FACE_SIZE (same as the live registration path)."""
+    x, y, width, height = box
+    face = crop[y:y + height, x:x + width]
+    return cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2RGB), FACE_SIZE)
+
+
+def encode_crop(crop, box):
+    ok, jpeg = cv2.imencode(".jpg", crop, [cv2.IMWRITE_JPEG_QUALITY, CROP_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Failed to encode face crop")
+    return {"jpeg": Binary(jpeg.tobytes()), "box": [int(v) for v in box]}
+
+
+def decode_crop(entry):
+    crop = cv2.imdecode(np.frombuffer(entry["jpeg"], dtype=np.uint8), cv2.IMREAD_COLOR)
+    return crop, entry["box"]
+
+
+def crops_update(encoded_crops):
+    return {"$set": {"crops": encoded_crops, "updated_at": datetime.datetime.now()}}
+
+
+def save_face_crops(crops_collection, email, crops):
+    """Store (crop, box) pairs for a user, replacing earlier ones."""
+    crops_collection.update_one(
+        {"email": email},
+        crops_update([encode_crop(crop, box) for crop, box in crops]),
+        upsert=True,
+    )
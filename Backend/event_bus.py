@@ -0,0 +1,84 @@
+import collections
+import json
+import threading
+
+from flask import Response
+
+# Comment line sent on idle SSE streams so proxies keep the connection open
+SSE_HEARTBEAT_S = 15.0
+
+
+class EventBus:
+    """In-process pub/sub for status transitions and count/recognition deltas.
+
+    Each subscriber gets a bounded queue; a slow subscriber loses its oldest
+    events rather than holding up the publisher (the worker loop).
+    """
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._subscribers = {}
+        self._seq = 0
+
+    def publish(self, event, data):
+        with self._cond:
+            self._seq += 1
+            for queue in self._subscribers.values():
+                queue.append((self._seq, event, data))
+            self._cond.notify_all()
+
+    def subscribe(self):
+        queue = collections.deque(maxlen=self.max_queue)
+        with self._cond:
+            self._subscribers[id(queue)] = queue
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._cond:
+            self._subscribers.pop(id(queue), None)
+
+    def wait(self, queue, timeout):
+        """Drain and return pending events for a subscriber, waiting up to timeout for one."""
+        with self._cond:
+            if not queue:
+                self._cond.wait(timeout)
+            events = list(queue)
+            queue.clear()
+            return events
+
+    @property
+    def subscriber_count(self):
+        with self._cond:
+            return len(self._subscribers)
+
+
+def format_sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_response(bus, snapshot):
+    """Server-Sent Events stream: the current status first, then every published event."""
+    def generate():
+        queue = bus.subscribe()
+        try:
+            yield format_sse("status", snapshot())
+            while True:
+                events = bus.wait(queue, SSE_HEARTBEAT_S)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                for seq, event, data in events:
+                    yield format_sse(event, data, seq)
+        finally:
+            bus.unsubscribe(queue)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,164 @@
+import os
+import time
+
+import numpy as np
+from pymongo import ASCENDING
+
+from embedding_store import DEFAULT_EMBEDDING_MODEL, EMBEDDING_MODEL_VERSION, EmbeddingVersionMismatch, select_embeddings
+
+# Only the fields matching needs; never pull password hashes or profile data into the service
+GALLERY_PROJECTION = {
+    "_id": 0, "email": 1, "name": 1, "embeddings": 1, "embedding_model": 1,
+    "pending_embeddings": 1, "pending_embedding_model": 1,
+}
+GALLERY_FILTER = {"embeddings": {"$exists": True}}
+GALLERY_INDEX = "registered_gallery"
+# Each user document carries ~10 x 512 embedding values (~45 KB of BSON), so a few hundred per batch
+# keeps every getMore well under the 16 MB reply limit while amortizing round trips
+GALLERY_BATCH_SIZE = int(os.getenv("GALLERY_BATCH_SIZE", "256"))
+
+
+def ensure_gallery_index(users_collection):
+    """Partial index over users that have embeddings; the gallery scan walks it instead of the whole collection."""
+    users_collection.create_index(
+        [("email", ASCENDING)],
+        name=GALLERY_INDEX,
+        partialFilterExpression=GALLERY_FILTER,
+    )
+
+
+class FaceGallery:
+    """All registered embeddings of one model version as an L2-normalized float32 matrix.
+
+    Row i belongs to users[owners[i]]; matching a face is a single
+    matrix-vector product instead of one cosine_similarity call per
+    stored embedding.
+    """
+
+    def __init__(self, users, matrix, owners, load_stats=None, model_version=EMBEDDING_MODEL_VERSION):
+        self.users = users
+        self.matrix = matrix
+        self.owners = owners
+        self.load_stats = load_stats or {}
+        self.model_version = model_version
+
+    def __len__(self):
+        return len(self.users)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the embedding matrix and row owners."""
+        return self.matrix.nbytes + self.owners.nbytes
+
+    def best_match(self, embedding, threshold=0.5, model_version=EMBEDDING_MODEL_VERSION):
+        """Best user whose closest stored embedding has cosine similarity >= threshold, else None."""
+        if model_version != self.model_version:
+            raise EmbeddingVersionMismatch(
+                f"Query from {model_version} cannot be matched against a {self.model_version} gallery")
+        if not len(self.owners):
+            return None
+        query = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        similarities = self.matrix @ (query / norm)
+        row = int(np.argmax(similarities))
+        similarity = float(similarities[row])
+        if similarity < threshold:
+            return None
+        email, name = self.users[self.owners[row]]
+        return {"email": email, "name": name, "similarity": similarity}
+
+
+def _count_rows(users_collection, model_version):
+    """(users, rows) with embeddings from model_version, live or pending."""
+    live = {"$eq": [{"$ifNull": ["$embedding_model", DEFAULT_EMBEDDING_MODEL]}, model_version]}
+    pending = {"$eq": ["$pending_embedding_model", model_version]}
+    pending_rows = {"$cond": [pending, {"$size": {"$ifNull": ["$pending_embeddings", []]}}, 0]}
+    rows = {"$cond": [live, {"$size": {"$ifNull": ["$embeddings", []]}}, pending_rows]}
+    pipeline = [
+        {"$match": GALLERY_FILTER},
+        {"$group": {"_id": None, "users": {"$sum": 1}, "rows": {"$sum": rows}}},
+    ]
+    result = list(users_collection.aggregate(pipeline))
+    return (result[0]["users"], result[0]["rows"]) if result else (0, 0)
+
+
+def _gallery_cursor(users_collection, batch_size):
+    cursor = users_collection.find(GALLERY_FILTER, GALLERY_PROJECTION, batch_size=batch_size)
+    # Walk the partial index when it exists; otherwise this is a collection scan as before
+    if GALLERY_INDEX in users_collection.index_information():
+        cursor = cursor.hint(GALLERY_INDEX)
+    return cursor
+
+
+def load_gallery(users_collection, batch_size=GALLERY_BATCH_SIZE, model_version=EMBEDDING_MODEL_VERSION):
+    """Stream registered users into a preallocated matrix.
+
+    The row count is taken up front so the matrix is allocated once; only
+    one cursor batch of documents is alive at a time, so peak memory is
+    the matrix rather than the documents. Rows registered while loading
+    grow the matrix; rows removed while loading are trimmed.
+
+    Only vectors produced by model_version are loaded (pending re-embeddings
+    included); users embedded by another model are counted, never mixed in.
+    """
+    started = time.perf_counter()
+    expected_users, expected_rows = _count_rows(users_collection, model_version)
+    users = []
+    matrix = None
+    owners = None
+    filled = 0
+    skipped = 0
+    other_model = 0
+
+    for doc in _gallery_cursor(users_collection, batch_size):
+        if "email" not in doc:
+            skipped += 1
+            continue
+        embeddings = select_embeddings(doc, model_version)
+        if not embeddings:
+            other_model += 1
+            continue
+        block = np.asarray(embeddings, dtype=np.float32)
+        if block.ndim != 2 or (matrix is not None and block.shape[1] != matrix.shape[1]):
+            print(f"[Gallery] Skipping {doc['email']}: unexpected embedding shape {block.shape}")
+            skipped += 1
+            continue
+        if matrix is None:
+            matrix = np.empty((max(expected_rows, len(block)), block.shape[1]), dtype=np.float32)
+            owners = np.empty(len(matrix), dtype=np.int32)
+        end = filled + len(block)
+        if end > len(matrix):
+            # Users registered after the count: grow geometrically rather than per document
+            capacity = max(end, int(len(matrix) * 1.25))
+            matrix = np.resize(matrix, (capacity, matrix.shape[1]))
+            owners = np.resize(owners, capacity)
+        # Normalize per document so the full matrix never needs a temporary copy
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        np.maximum(norms, 1e-12, out=norms)
+        matrix[filled:end] = block / norms
+        owners[filled:end] = len(users)
+        users.append((doc["email"], doc.get("name", "Unknown")))
+        filled = end
+
+    if matrix is None:
+        matrix = np.empty((0, 0), dtype=np.float32)
+        owners = np.empty(0, dtype=np.int32)
+    elif filled < len(matrix):
+        matrix = matrix[:filled].copy()
+        owners = owners[:filled].copy()
+
+    stats = {
+        "users": len(users),
+        "embeddings": filled,
+        "expected_users": expected_users,
+        "skipped": skipped,
+        "model_version": model_version,
+        "other_model_users": other_model,
+        "matrix_mb": round(matrix.nbytes / (1024 * 1024), 1),
+        "load_s": round(time.perf_counter() - started, 3),
+    }
+    if other_model:
+        print(f"[Gallery] {other_model} user(s) have no {model_version} embeddings and cannot be matched until re-embedded")
+    return FaceGallery(users, matrix, owners, stats, model_version)
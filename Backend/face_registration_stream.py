@@ -1,55 +1,83 @@
+from cpu_resources import configure_cpu
+cpu = configure_cpu("face_registration")  # before numpy, OpenCV and TensorFlow size their thread pools
 import cv2
 import numpy as np
 import os
 from mtcnn import MTCNN
-from keras_facenet import FaceNet
 from pymongo import MongoClient
 import time
 import threading
 import json
-import base64
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import sys
-import datetime
 from env_config import get_required_env
+from embedding_store import CROPS_COLLECTION, align_crop, embedding_update, extract_crop, load_embedder, save_face_crops
+from frame_source import describe_source, open_frame_source, strip_source_args
+from service_metrics import ServiceMetrics
+from frame_tracer import FrameTracer
+from frame_governor import FrameGovernor, detect_faces_scaled
+from memory_accounting import MemoryLedger
+from debug_profiler import register_debug_routes
+from event_bus import EventBus, sse_response
+from frame_buffer import FrameBuffer, conditional_frame, jpeg_response, mjpeg_response, not_modified, push_stream_response, tag_frame_response
+cpu.apply_frameworks()
 
 # --- Global State ---
 registration_active = False
 registration_thread = None
 stop_flag = threading.Event()
 cap = None
-current_frame = None
-frame_lock = threading.Lock()
+memory = MemoryLedger()
+tracer = FrameTracer("face_registration")
+metrics = ServiceMetrics("face_registration", tracer=tracer)
+frame_buffer = FrameBuffer(on_encode=lambda seconds: metrics.observe("encode", seconds),
+                           lock=metrics.lock("frame_buffer"))
+frame_lock = metrics.lock("frame")
 registration_status = {"status": "idle", "message": "Registration has not started."}
+events = EventBus()
+# Paces the registration loop (REGISTRATION_TARGET_FPS / _CPU_BUDGET / _ADAPTIVE)
+governor = FrameGovernor.from_env("REGISTRATION", 20)
 
 # --- Database & Models ---
 DB_URI = get_required_env("MONGODB_URI")
 client = MongoClient(DB_URI)
 db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
 users_collection = db['users']
+crops_collection = db[CROPS_COLLECTION]
 
-embedder = FaceNet()
-detector = MTCNN()
+with memory.measure("facenet"):
+    embedder = load_embedder()
+with memory.measure("mtcnn"):
+    detector = MTCNN()
+memory.component("frame_buffer", frame_buffer.nbytes)
+memory.start()
 
 # --- Flask App ---
 app = Flask(__name__)
 CORS(app)
+metrics.register(app)
+register_debug_routes(app, worker=lambda: registration_thread, tracer=tracer)
+metrics.gauge("active_sessions", "Registration sessions in progress", lambda: 1 if registration_active else 0)
+governor.register(metrics)
 
 # --- Core Functions ---
-def align_face(face, output_size=(160, 160)):
-    return cv2.resize(face, output_size)
+def set_registration_status(status):
+    """Replace the registration status and push it to /events subscribers."""
+    global registration_status
+    registration_status = status
+    events.publish("status", status)
 
-def save_embeddings_to_db(email, embeddings):
+def save_embeddings_to_db(email, embeddings, crops=None):
     try:
-        users_collection.update_one(
-            {"email": email},
-            {"$set": {
-                "embeddings": [e.tolist() for e in embeddings],
-                "faceRegistered": True,
-                "face_updated_at": datetime.datetime.now()
-            }}
-        )
+        with metrics.stage("db"):
+            users_collection.update_one({"email": email}, embedding_update(embeddings))
+            if crops:
+                # Retained so embeddings can be regenerated when the model changes (see reembed.py)
+                try:
+                    save_face_crops(crops_collection, email, crops)
+                except Exception as crop_err:
+                    print(f"Warning: Could not store face crops for {email}: {crop_err}")
         # Notify backend to mark as registered
         import requests
         try:
@@ -61,29 +89,41 @@ def save_embeddings_to_db(email, embeddings):
         return False, f"DB Error: {str(e)}"
 
 def registration_process(email, name, max_samples=10):
-    global registration_active, stop_flag, cap, current_frame, registration_status
+    global registration_active, stop_flag, cap
 
+    trace_mark = tracer.mark()
     try:
-        registration_status = {"status": "initializing", "message": "Starting camera..."}
-        cap = cv2.VideoCapture(0)
+        set_registration_status({"status": "initializing", "message": "Starting camera..."})
+        cap = open_frame_source()
         if not cap.isOpened():
-            raise IOError("Cannot open webcam")
+            raise IOError(f"Cannot open {cap.kind} source")
 
         face_embeddings = []
+        face_crops = []
         last_capture_time = time.time()
 
         last_face_box = None
 
+        governor.reset()
         while registration_active and not stop_flag.is_set() and len(face_embeddings) < max_samples:
-            ret, frame = cap.read()
+            tracer.next_frame()
+            governor.start_frame()
+            ret, frame = metrics.read_frame(cap)
             if not ret:
+                if cap.exhausted:
+                    break
                 time.sleep(0.1)
                 continue
 
             # --- Face Detection and Sample Capture ---
-            faces = detector.detect_faces(frame)
+            # On frames the governor skips, the last box is redrawn and no sample is taken
+            detected = governor.should_detect()
+            if detected:
+                with metrics.stage("detect"):
+                    faces = detect_faces_scaled(detector, frame, governor.scale)
+                tracer.annotate(faces=len(faces or []))
             
-            if faces:
+            if detected and faces:
                 face = faces[0]
                 x1, y1, width, height = face['box']
                 x1, y1 = max(0, x1), max(0, y1)
@@ -92,59 +132,69 @@ def registration_process(email, name, max_samples=10):
 
                 # Capture a sample periodically
                 if time.time() - last_capture_time > 1:
-                    face_pixels = frame[y1:y2, x1:x2]
-                    if face_pixels.size > 0:
-                        face_pixels_rgb = cv2.cvtColor(face_pixels, cv2.COLOR_BGR2RGB)
-                        aligned_face = align_face(face_pixels_rgb)
-                        embedding = embedder.embeddings(np.expand_dims(aligned_face, axis=0)).flatten()
+                    with tracer.span("crop"):
+                        crop, crop_box = extract_crop(frame, face['box'])
+                        usable = crop.size > 0 and crop_box[2] > 0 and crop_box[3] > 0
+                        if usable:
+                            aligned_face = align_crop(crop, crop_box)
+                    if usable:
+                        with metrics.stage("embed"):
+                            embedding = embedder.embeddings(np.expand_dims(aligned_face, axis=0)).flatten()
                         face_embeddings.append(embedding)
+                        face_crops.append((crop.copy(), crop_box))
                         last_capture_time = time.time()
                         
-                        registration_status = {
+                        set_registration_status({
                             "status": "capturing", 
                             "message": f"Captured {len(face_embeddings)} of {max_samples} samples.",
                             "progress": len(face_embeddings) / max_samples
-                        }
+                        })
                 
                 # --- Visual Feedback ---
-                # Draw rectangle around the face
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                # Display sample count near the box
-                feedback_text = f"Sample {len(face_embeddings)}/{max_samples}"
-                cv2.putText(frame, feedback_text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                with tracer.span("draw"):
+                    # Draw rectangle around the face
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    # Display sample count near the box
+                    feedback_text = f"Sample {len(face_embeddings)}/{max_samples}"
+                    cv2.putText(frame, feedback_text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
+            elif last_face_box and not detected:
+                with tracer.span("draw"):
+                    cv2.rectangle(frame, (last_face_box[0], last_face_box[1]), (last_face_box[2], last_face_box[3]), (0, 255, 0), 2)
             elif last_face_box: # If face was lost, draw the last known box for a moment
-                cv2.rectangle(frame, (last_face_box[0], last_face_box[1]), (last_face_box[2], last_face_box[3]), (0, 0, 255), 2)
-                cv2.putText(frame, "Face not detected", (last_face_box[0], last_face_box[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                with tracer.span("draw"):
+                    cv2.rectangle(frame, (last_face_box[0], last_face_box[1]), (last_face_box[2], last_face_box[3]), (0, 0, 255), 2)
+                    cv2.putText(frame, "Face not detected", (last_face_box[0], last_face_box[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-            # --- Encode and Send Frame for UI ---
-            with frame_lock:
-                _, buffer = cv2.imencode('.jpg', frame)
-                current_frame = base64.b64encode(buffer).decode('utf-8')
+            # --- Encode and Send Frame for UI (skipped while nobody is watching) ---
+            frame_buffer.publish(frame, {'samples': len(face_embeddings)})
 
-            time.sleep(0.05)
+            governor.end_frame(sleep=stop_flag.wait)
+        tracer.end_frame()
 
         # --- Finalization ---
         if len(face_embeddings) >= max_samples:
-            success, message = save_embeddings_to_db(email, face_embeddings)
+            success, message = save_embeddings_to_db(email, face_embeddings, face_crops)
             if success:
-                registration_status = {"status": "completed", "message": "Registration successful!"}
+                set_registration_status({"status": "completed", "message": "Registration successful!"})
             else:
-                registration_status = {"status": "error", "message": message}
+                set_registration_status({"status": "error", "message": message})
         elif stop_flag.is_set():
-            registration_status = {"status": "stopped", "message": "Registration was stopped manually."}
+            set_registration_status({"status": "stopped", "message": "Registration was stopped manually."})
         else:
-            registration_status = {"status": "error", "message": "Failed to capture enough samples."}
+            set_registration_status({"status": "error", "message": "Failed to capture enough samples."})
 
     except Exception as e:
-        registration_status = {"status": "error", "message": f"An error occurred: {str(e)}"}
+        set_registration_status({"status": "error", "message": f"An error occurred: {str(e)}"})
     finally:
+        tracer.end_frame()
         cleanup_resources(reset_status=False)
         registration_active = False
+        tracer.dump_session(time.strftime("%Y%m%d-%H%M%S"), since=trace_mark)
 
 def cleanup_resources(reset_status=True):
     """Fully reset the global state to idle."""
-    global registration_active, registration_thread, stop_flag, cap, current_frame, registration_status
+    global registration_active, registration_thread, stop_flag, cap
     
     stop_flag.set() # Signal thread to stop
 
@@ -152,7 +202,7 @@ def cleanup_resources(reset_status=True):
         if cap:
             cap.release()
             cap = None
-        current_frame = None
+    frame_buffer.clear()
 
     # Wait briefly for the worker to exit if we're not currently on that worker thread
     if (
@@ -167,12 +217,12 @@ def cleanup_resources(reset_status=True):
     registration_thread = None
     stop_flag.clear()
     if reset_status:
-        registration_status = {"status": "idle", "message": "Registration has not started."}
+        set_registration_status({"status": "idle", "message": "Registration has not started."})
 
 # --- Flask Routes ---
 @app.route('/start', methods=['POST'])
 def start_route():
-    global registration_active, registration_thread, stop_flag, registration_status
+    global registration_active, registration_thread, stop_flag
     
     # Force-clean the state before starting a new session.
     # This is a more aggressive approach to prevent stale states
@@ -190,7 +240,7 @@ def start_route():
 
     registration_active = True
     stop_flag.clear()
-    registration_status = {"status": "starting", "message": "Registration process is starting."}
+    set_registration_status({"status": "starting", "message": "Registration process is starting."})
     
     registration_thread = threading.Thread(target=registration_process, args=(email, name))
     registration_thread.daemon = True
@@ -205,11 +255,11 @@ def stop_route():
     
     if not registration_active:
         # Still perform cleanup to handle any orphaned processes or states
-        registration_status.update({"status": "stopped", "message": "No active registration to stop."})
+        set_registration_status({**registration_status, "status": "stopped", "message": "No active registration to stop."})
         cleanup_resources(reset_status=False)
         return jsonify({"success": True, "message": "No active registration, but state cleaned up just in case."})
 
-    registration_status.update({"status": "stopped", "message": "Registration process stopped and resources released."})
+    set_registration_status({**registration_status, "status": "stopped", "message": "Registration process stopped and resources released."})
     cleanup_resources(reset_status=False)
     
     return jsonify({"success": True, "message": "Registration process stopped and resources released."})
@@ -218,15 +268,39 @@ def stop_route():
 def status_route():
     return jsonify(registration_status)
 
+@app.route('/events')
+def events_route():
+    """Server-Sent Events: every status change, including capture progress."""
+    return sse_response(events, lambda: registration_status)
+
 @app.route('/current-frame')
 def frame_route():
-    with frame_lock:
-        frame_to_send = current_frame if registration_active else None
-    return jsonify({'frame': frame_to_send, 'active': registration_active})
+    seq, frame_to_send, modified = conditional_frame(frame_buffer, registration_active, as_base64=True)
+    if not modified:
+        return not_modified(frame_buffer, seq)
+    response = jsonify({'frame': frame_to_send, 'active': registration_active, 'seq': seq})
+    return tag_frame_response(response, frame_buffer, seq, len(frame_to_send or ''))
+
+@app.route('/current-frame.jpg')
+def frame_jpeg_route():
+    return jpeg_response(frame_buffer, registration_active)
+
+@app.route('/stream')
+def stream_route():
+    return mjpeg_response(frame_buffer, lambda: registration_active)
+
+@app.route('/frames')
+def push_frames_route():
+    return push_stream_response(frame_buffer, lambda: registration_active)
+
+@app.route('/frame-stats')
+def frame_stats_route():
+    return jsonify(frame_buffer.stats())
 
 @app.route('/health')
 def health_route():
-    return jsonify({'ok': True, 'status': 'running' if registration_active else 'idle'})
+    return jsonify({'ok': True, 'status': 'running' if registration_active else 'idle', 'memory': memory.report(),
+                    'governor': governor.stats(), 'cpu': cpu.effective()})
 
 @app.route('/reset', methods=['POST'])
 def reset_route():
@@ -235,4 +309,6 @@ def reset_route():
     return jsonify({"success": True, "message": "Service has been reset to idle state."})
 
 if __name__ == '__main__':
+    strip_source_args(sys.argv)
+    print(f"[Registration] Frame source: {describe_source()}")
     app.run(host='0.0.0.0', port=5001, debug=False)
@@ -0,0 +1,281 @@
+import base64
+import json
+import os
+import struct
+import threading
+import time
+
+import cv2
+from flask import Response, request
+
+MJPEG_BOUNDARY = "frame"
+# A viewer counts as present for this long after its last frame request.
+VIEWER_WINDOW_S = float(os.getenv("FRAME_VIEWER_WINDOW_S", "3.0"))
+# Upper bound for ?wait= long-polls so request threads are not parked forever.
+MAX_WAIT_S = 15.0
+# Idle interval between keepalive records on the /frames push stream.
+PUSH_KEEPALIVE_S = 1.0
+
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-store, no-cache, must-revalidate, max-age=0',
+    'Pragma': 'no-cache',
+    'Expires': '0',
+}
+
+
+class FrameBuffer:
+    """Latest annotated frame of a stream service, kept as raw JPEG bytes.
+
+    Every published frame gets a monotonically increasing sequence number,
+    used as its ETag. It is kept across sessions but starts again from 0 when
+    the service restarts, so a client sequence ahead of it is stale. Frames
+    are only encoded while a viewer has asked for one within VIEWER_WINDOW_S.
+    """
+
+    def __init__(self, jpeg_quality=None, viewer_window=VIEWER_WINDOW_S, on_encode=None, lock=None):
+        # lock: optional instrumented lock (ServiceMetrics.lock) to measure viewer/loop contention
+        self._cond = threading.Condition(lock)
+        self._jpeg = None
+        self._b64 = None
+        self._seq = 0
+        self._ts = None
+        self._meta = None
+        self._encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if jpeg_quality else []
+        self.viewer_window = viewer_window
+        # Called with the wall-clock seconds of every encode (service metrics)
+        self.on_encode = on_encode
+        self._last_viewer = float('-inf')
+        self._frames_encoded = 0
+        self._frames_skipped = 0
+        self._encode_cpu_s = 0.0
+        self._bytes_served = 0
+        self._responses = 0
+        self._not_modified = 0
+
+    @property
+    def seq(self):
+        with self._cond:
+            return self._seq
+
+    def touch(self):
+        """Record that a viewer asked for a frame."""
+        self._last_viewer = time.monotonic()
+
+    def has_viewers(self):
+        return time.monotonic() - self._last_viewer < self.viewer_window
+
+    def publish(self, image, meta=None):
+        """JPEG-encode a BGR frame and make it the current frame, unless nobody is watching.
+
+        meta is an optional small dict (counts etc.) pushed alongside the frame.
+        """
+        if not self.has_viewers():
+            with self._cond:
+                self._frames_skipped += 1
+            return False
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        ok, buffer = cv2.imencode('.jpg', image, self._encode_params)
+        cpu_used = time.thread_time() - cpu_start
+        if self.on_encode:
+            self.on_encode(time.perf_counter() - wall_start)
+        if not ok:
+            return False
+        with self._cond:
+            self._frames_encoded += 1
+            self._encode_cpu_s += cpu_used
+        self.publish_jpeg(buffer.tobytes(), meta)
+        return True
+
+    def publish_jpeg(self, jpeg_bytes, meta=None):
+        with self._cond:
+            self._jpeg = jpeg_bytes
+            self._b64 = None
+            self._ts = time.time()
+            self._meta = meta
+            self._seq += 1
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._jpeg = None
+            self._b64 = None
+            self._meta = None
+            self._cond.notify_all()
+
+    def jpeg(self):
+        with self._cond:
+            return self._jpeg
+
+    def nbytes(self):
+        """Bytes held for the current frame (JPEG plus its cached base64 form)."""
+        with self._cond:
+            return len(self._jpeg or b'') + len(self._b64 or '')
+
+    def snapshot(self, as_base64=False):
+        """Return (seq, frame) for the current frame; base64 is built at most once per frame."""
+        with self._cond:
+            if not as_base64 or self._jpeg is None:
+                return self._seq, self._jpeg
+            if self._b64 is None:
+                self._b64 = base64.b64encode(self._jpeg).decode('utf-8')
+            return self._seq, self._b64
+
+    def base64(self):
+        return self.snapshot(as_base64=True)[1]
+
+    def record(self):
+        """Return (seq, capture timestamp, meta, jpeg) for the current frame."""
+        with self._cond:
+            return self._seq, self._ts, self._meta, self._jpeg
+
+    def wait_newer(self, after_seq, timeout):
+        """Block up to timeout seconds for a frame newer than after_seq; True if one exists."""
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while self._seq <= after_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+                if self._jpeg is None:
+                    # Buffer was cleared (session stopped) - let the caller answer now.
+                    return self._seq > after_seq
+            return True
+
+    def record_served(self, nbytes=0, not_modified=False):
+        with self._cond:
+            self._responses += 1
+            self._bytes_served += nbytes
+            if not_modified:
+                self._not_modified += 1
+
+    def stats(self):
+        with self._cond:
+            encoded = self._frames_encoded
+            avg_cpu = self._encode_cpu_s / encoded if encoded else 0.0
+            return {
+                'seq': self._seq,
+                'frames_encoded': encoded,
+                'frames_skipped': self._frames_skipped,
+                'encode_cpu_s': round(self._encode_cpu_s, 4),
+                'avg_encode_ms': round(avg_cpu * 1000, 3),
+                'est_encode_cpu_saved_s': round(avg_cpu * self._frames_skipped, 4),
+                'responses': self._responses,
+                'not_modified': self._not_modified,
+                'bytes_served': self._bytes_served,
+                'viewer_active': self.has_viewers(),
+            }
+
+
+def _client_seq():
+    """Sequence the client already has, from ?after= or If-None-Match."""
+    after = request.args.get('after', type=int)
+    if after is not None:
+        return after
+    etag = request.headers.get('If-None-Match', '').strip()
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    try:
+        return int(etag.strip('"'))
+    except ValueError:
+        return None
+
+
+def conditional_frame(frame_buffer, active=True, as_base64=False):
+    """Resolve a frame request, honouring ?after=, If-None-Match and ?wait= long-polls.
+
+    Returns (seq, frame, modified). When modified is False the client already
+    holds the newest frame and the route should answer with not_modified().
+    """
+    frame_buffer.touch()
+    if not active:
+        return frame_buffer.seq, None, True
+    known = _client_seq()
+    # A sequence ahead of ours was issued before a restart: answer with the current frame
+    if known is not None and known <= frame_buffer.seq:
+        wait = min(max(request.args.get('wait', 0.0, type=float), 0.0), MAX_WAIT_S)
+        if not frame_buffer.wait_newer(known, wait):
+            return known, None, False
+    seq, frame = frame_buffer.snapshot(as_base64=as_base64)
+    return seq, frame, True
+
+
+def frame_etag(seq):
+    return f'"{seq}"'
+
+
+def not_modified(frame_buffer, seq):
+    frame_buffer.record_served(not_modified=True)
+    return Response(status=304, headers={**NO_CACHE_HEADERS, 'ETag': frame_etag(seq), 'X-Frame-Seq': str(seq)})
+
+
+def tag_frame_response(response, frame_buffer, seq, nbytes):
+    """Attach sequence headers to a frame response and count it."""
+    frame_buffer.record_served(nbytes)
+    response.headers.update(NO_CACHE_HEADERS)
+    response.headers['ETag'] = frame_etag(seq)
+    response.headers['X-Frame-Seq'] = str(seq)
+    return response
+
+
+def jpeg_response(frame_buffer, active=True):
+    """Serve the current frame as image/jpeg, 304 if unchanged, or 204 when there is nothing to show."""
+    seq, jpeg, modified = conditional_frame(frame_buffer, active)
+    if not modified:
+        return not_modified(frame_buffer, seq)
+    if jpeg is None:
+        return Response(status=204, headers=NO_CACHE_HEADERS)
+    return tag_frame_response(Response(jpeg, mimetype='image/jpeg'), frame_buffer, seq, len(jpeg))
+
+
+def mjpeg_response(frame_buffer, is_active):
+    """Serve each new frame once as multipart/x-mixed-replace while is_active() holds."""
+    def generate():
+        last_seq = 0
+        while is_active():
+            frame_buffer.touch()
+            if not frame_buffer.wait_newer(last_seq, 1.0):
+                continue
+            last_seq, jpeg = frame_buffer.snapshot()
+            if jpeg is None:
+                continue
+            part = (b'--' + MJPEG_BOUNDARY.encode() + b'\r\n'
+                    b'Content-Type: image/jpeg\r\n'
+                    b'X-Frame-Seq: ' + str(last_seq).encode() + b'\r\n'
+                    b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+            frame_buffer.record_served(len(part))
+            yield part
+
+    return Response(generate(), mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}',
+                    headers=NO_CACHE_HEADERS)
+
+
+def pack_frame_record(header, jpeg=b''):
+    """Binary push record: 4-byte big-endian header length, JSON header, JPEG bytes."""
+    header = dict(header, size=len(jpeg))
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return struct.pack('>I', len(header_bytes)) + header_bytes + jpeg
+
+
+def push_stream_response(frame_buffer, is_active):
+    """Push every new frame once over a persistent chunked binary stream.
+
+    Consumed by server.js, which fans the records out to browsers. Keepalive
+    records (size 0) carry the active flag while no frames are flowing.
+    """
+    def generate():
+        last_seq = 0
+        while True:
+            frame_buffer.touch()
+            if frame_buffer.wait_newer(last_seq, PUSH_KEEPALIVE_S):
+                seq, ts, meta, jpeg = frame_buffer.record()
+                last_seq = seq
+                if jpeg is not None:
+                    record = pack_frame_record({**(meta or {}), 'seq': seq, 'ts': ts, 'active': is_active()}, jpeg)
+                    frame_buffer.record_served(len(record))
+                    yield record
+                    continue
+            yield pack_frame_record({'seq': last_seq, 'active': is_active(), 'keepalive': True})
+
+    return Response(generate(), mimetype='application/octet-stream', headers=NO_CACHE_HEADERS)
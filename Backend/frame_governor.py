@@ -0,0 +1,205 @@
+import os
+import time
+
+import cv2
+
+# Degradation ladder, lightest first: (run detection on every Nth frame, detection input scale)
+LEVELS = ((1, 1.0), (2, 1.0), (2, 0.75), (3, 0.75), (4, 0.5))
+# Consecutive frames behind (or comfortably ahead) before the level changes, so one slow frame does not flip it
+HYSTERESIS_FRAMES = 15
+# Ahead means the loop needs less than this share of its frame budget at the current level
+RECOVER_BELOW = 0.6
+BEHIND_ABOVE = 0.95
+EWMA_ALPHA = 0.1
+
+
+class FrameGovernor:
+    """Paces a processing loop to a target FPS and/or CPU budget instead of a fixed sleep.
+
+    Each frame's work (wall and process CPU time) is measured and only the
+    rest of the frame budget is slept. When the work no longer fits, the
+    governor steps down LEVELS: detection on fewer frames, then on smaller
+    inputs; it steps back up once there is headroom again.
+
+    Configured per service from <PREFIX>_TARGET_FPS (0 = as fast as possible),
+    <PREFIX>_CPU_BUDGET (cores, 0 = unlimited) and <PREFIX>_ADAPTIVE (0 keeps
+    full detection even when behind).
+    """
+
+    def __init__(self, target_fps, cpu_budget=0.0, adaptive=True):
+        self.target_fps = target_fps
+        self.cpu_budget = cpu_budget
+        self.adaptive = adaptive
+        self.frames = 0
+        self.sleep_s = 0.0
+        self.degraded_frames = 0
+        self.reset()
+
+    @classmethod
+    def from_env(cls, prefix, default_fps):
+        return cls(
+            float(os.getenv(f"{prefix}_TARGET_FPS", default_fps)),
+            float(os.getenv(f"{prefix}_CPU_BUDGET", "0")),
+            os.getenv(f"{prefix}_ADAPTIVE", "1") != "0",
+        )
+
+    # --- Loop hooks ---
+    def reset(self):
+        """Forget the previous session's timing and level; call when a loop starts (totals are kept)."""
+        self.level = 0
+        self._frame = 0
+        self._started = None
+        self._cpu_started = None
+        self._last_start = None
+        self._work = None
+        self._cpu = None
+        self._period = None
+        self._due = None
+        self._behind = 0
+        self._ahead = 0
+
+    def start_frame(self):
+        now = time.perf_counter()
+        if self._last_start is not None:
+            self._period = _ewma(self._period, now - self._last_start)
+        self._last_start = self._started = now
+        self._cpu_started = time.process_time()
+        self._frame += 1
+
+    def should_detect(self):
+        """False on the frames the current level skips; reuse the previous detections on those."""
+        return (self._frame - 1) % LEVELS[self.level][0] == 0
+
+    @property
+    def scale(self):
+        """Factor to shrink the detector's input by at the current level."""
+        return LEVELS[self.level][1]
+
+    def end_frame(self, sleep=time.sleep):
+        """Sleep until this frame's slot ends; pass stop_flag.wait to stay responsive to stops.
+
+        Slots follow a fixed schedule, so a slow detection frame is made up
+        on the cheap frames after it instead of lowering the achieved rate.
+        """
+        if self._started is None:
+            return
+        started, self._started = self._started, None
+        now = time.perf_counter()
+        work = now - started
+        cpu = time.process_time() - self._cpu_started
+        self._work = _ewma(self._work, work)
+        self._cpu = _ewma(self._cpu, cpu)
+        self.frames += 1
+        if self.level:
+            self.degraded_frames += 1
+        self._adapt()
+        budget = self.frame_budget()
+        remaining = 0.0
+        if budget:
+            self._due = (self._due or started) + budget
+            if now - self._due > budget:
+                # More than a frame behind: restart the schedule rather than bursting to catch up
+                self._due = now
+            remaining = self._due - now
+        if self.cpu_budget:
+            # Stretch the frame so the process averages at most cpu_budget cores
+            remaining = max(remaining, cpu / self.cpu_budget - work)
+            if budget:
+                self._due = now + remaining
+        if remaining > 0:
+            self.sleep_s += remaining
+            sleep(remaining)
+
+    # --- Control ---
+    def frame_budget(self):
+        return 1.0 / self.target_fps if self.target_fps > 0 else 0.0
+
+    def required(self):
+        """Seconds per frame the loop needs at the current level (wall time, or CPU time over the budget)."""
+        if self._work is None:
+            return None
+        needed = self._work
+        if self.cpu_budget:
+            needed = max(needed, self._cpu / self.cpu_budget)
+        return needed
+
+    def utilization(self):
+        budget = self.frame_budget()
+        needed = self.required()
+        if not budget or needed is None:
+            return None
+        return needed / budget
+
+    def _adapt(self):
+        utilization = self.utilization()
+        if not self.adaptive or utilization is None:
+            return
+        if utilization > BEHIND_ABOVE:
+            self._behind += 1
+            self._ahead = 0
+            if self._behind >= HYSTERESIS_FRAMES and self.level < len(LEVELS) - 1:
+                self._set_level(self.level + 1)
+        elif utilization < RECOVER_BELOW:
+            self._ahead += 1
+            self._behind = 0
+            if self._ahead >= 2 * HYSTERESIS_FRAMES and self.level > 0:
+                self._set_level(self.level - 1)
+        else:
+            self._behind = self._ahead = 0
+
+    def _set_level(self, level):
+        every, scale = LEVELS[level]
+        print(f"[Governor] {'Degrading' if level > self.level else 'Recovering'} to level {level}: "
+              f"detect every {every} frame(s) at {scale:.0%} resolution "
+              f"(needs {self.required() * 1000:.0f} ms of a {self.frame_budget() * 1000:.0f} ms frame)")
+        self.level = level
+        self._behind = self._ahead = 0
+
+    # --- Reporting ---
+    def achieved_fps(self):
+        return 1.0 / self._period if self._period else None
+
+    def stats(self):
+        utilization = self.utilization()
+        achieved = self.achieved_fps()
+        return {
+            "target_fps": self.target_fps,
+            "achieved_fps": round(achieved, 2) if achieved else None,
+            "cpu_budget_cores": self.cpu_budget or None,
+            "utilization": round(utilization, 3) if utilization is not None else None,
+            "work_ms": round(self._work * 1000, 2) if self._work is not None else None,
+            "cpu_ms": round(self._cpu * 1000, 2) if self._cpu is not None else None,
+            "level": self.level,
+            "detect_every": LEVELS[self.level][0],
+            "scale": self.scale,
+            "frames": self.frames,
+            "degraded_frames": self.degraded_frames,
+            "sleep_s": round(self.sleep_s, 2),
+        }
+
+    def register(self, metrics):
+        """Expose the governor as gauges on a ServiceMetrics."""
+        metrics.gauge("governor_target_fps", "Loop frame rate the governor aims for (0 = unpaced)",
+                      lambda: self.target_fps)
+        metrics.gauge("governor_achieved_fps", "Loop frame rate actually reached", self.achieved_fps)
+        metrics.gauge("governor_budget_utilization", "Share of the frame budget the loop's work needs",
+                      self.utilization)
+        metrics.gauge("governor_level", "Degradation level (0 = full detection on every frame)",
+                      lambda: self.level)
+
+
+def _ewma(previous, value):
+    return value if previous is None else previous + EWMA_ALPHA * (value - previous)
+
+
+def detect_faces_scaled(detector, frame, scale):
+    """MTCNN detect_faces on a frame shrunk by scale, with boxes and keypoints mapped back to full size."""
+    if scale >= 1.0:
+        return detector.detect_faces(frame)
+    small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    faces = detector.detect_faces(small)
+    for face in faces:
+        face['box'] = [int(round(v / scale)) for v in face['box']]
+        if 'keypoints' in face:
+            face['keypoints'] = {k: (int(round(x / scale)), int(round(y / scale))) for k, (x, y) in face['keypoints'].items()}
+    return faces
@@ -0,0 +1,383 @@
+import os
+import sys
+import time
+from urllib.parse import parse_qsl
+
+import cv2
+import numpy as np
+
+import env_config  # noqa: F401  (loads Backend/.env for FRAME_SOURCE)
+
+# Where the services and scripts read frames from. Spec forms:
+#   webcam[:N] or N            camera N (default 0)
+#   video:PATH or a file path   recorded video
+#   images:DIR or a directory   sorted .jpg/.png files, one per frame
+#   synthetic[:WxH]             generated frames, reproducible from ?seed=
+# Options go in a query string, e.g. video:lecture.mp4?loop=0&pace=fast or synthetic:1280x720?frames=600.
+FRAME_SOURCE = os.getenv("FRAME_SOURCE", "webcam:0")
+# realtime: locked to the wall clock at the source's fps, dropping frames a slow reader misses (like a camera)
+# fast: every frame, as fast as the reader takes them; a number: that many frames/s, never dropping
+FRAME_SOURCE_PACE = os.getenv("FRAME_SOURCE_PACE", "realtime")
+FRAME_SOURCE_LOOP = os.getenv("FRAME_SOURCE_LOOP", "1") != "0"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+DEFAULT_FPS = 30.0
+SOURCE_KINDS = ("webcam", "video", "images", "synthetic")
+
+# CLI overrides applied by strip_source_args / source_from_args
+_defaults = {"spec": FRAME_SOURCE, "pace": FRAME_SOURCE_PACE, "loop": FRAME_SOURCE_LOOP}
+
+
+class FrameSource:
+    """cv2.VideoCapture-compatible reader (isOpened/read/grab/set/get/release) over a replayable source."""
+
+    kind = "base"
+
+    def __init__(self, spec, fps, pace="realtime", loop=True):
+        self.spec = spec
+        self.fps = fps or DEFAULT_FPS
+        self.pace = pace
+        self.loop = loop
+        self.exhausted = False
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.loops = 0
+        self._cursor = 0
+        self._started = None
+
+    # --- Subclass hooks ---
+    def _next(self):
+        """(ok, frame) for the next frame in order."""
+        raise NotImplementedError
+
+    def _skip(self):
+        ok, _ = self._next()
+        return ok
+
+    def _rewind(self):
+        return False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+    # --- Reading ---
+    def _advance(self, read=True):
+        ok, frame = self._next() if read else (self._skip(), None)
+        if not ok and self.loop and self._cursor > 0 and self._rewind():
+            self.loops += 1
+            ok, frame = self._next() if read else (self._skip(), None)
+        if not ok:
+            self.exhausted = True
+            return False, None
+        self._cursor += 1
+        return True, frame
+
+    def _wait_turn(self):
+        if self.pace == "fast":
+            return
+        now = time.perf_counter()
+        if self._started is None:
+            self._started = now
+            return
+        if self.pace == "realtime":
+            # Skip whatever the reader was too slow for, then wait for the next frame's slot
+            due = int((now - self._started) * self.fps)
+            while self._cursor < due and not self.exhausted:
+                if self._advance(read=False)[0]:
+                    self.frames_dropped += 1
+            delay = self._started + self._cursor / self.fps - now
+        else:
+            delay = self._started + self.frames_read / float(self.pace) - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def read(self):
+        if self.exhausted:
+            return False, None
+        self._wait_turn()
+        if self.exhausted:
+            return False, None
+        ok, frame = self._advance()
+        if ok:
+            self.frames_read += 1
+        return ok, frame
+
+    def grab(self):
+        return False if self.exhausted else self._advance(read=False)[0]
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+    def stats(self):
+        return {
+            "source": self.spec,
+            "kind": self.kind,
+            "pace": self.pace,
+            "fps": self.fps,
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "loops": self.loops,
+            "exhausted": self.exhausted,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class WebcamSource(FrameSource):
+    kind = "webcam"
+
+    def __init__(self, spec, index=0):
+        # DirectShow opens much faster than MSMF on Windows
+        backend = cv2.CAP_DSHOW if sys.platform == "win32" else cv2.CAP_ANY
+        self.cap = cv2.VideoCapture(index, backend)
+        # The camera is its own clock; pacing or looping it would only add latency
+        super().__init__(spec, self.cap.get(cv2.CAP_PROP_FPS), pace="fast", loop=False)
+
+    def _next(self):
+        return self.cap.read()
+
+    def _skip(self):
+        return self.cap.grab()
+
+    def read(self):
+        # A camera read failing is transient, never the end of the source
+        ok, frame = self.cap.read()
+        if ok:
+            self.frames_read += 1
+        return ok, frame
+
+    def grab(self):
+        return self.cap.grab()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    kind = "video"
+
+    def __init__(self, spec, path, fps=None, pace="realtime", loop=True):
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(spec, fps or self.cap.get(cv2.CAP_PROP_FPS), pace, loop)
+
+    def _next(self):
+        return self.cap.read()
+
+    def _skip(self):
+        # grab() skips colour conversion and the copy for frames nobody will see
+        return self.cap.grab()
+
+    def _rewind(self):
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.fps if prop == cv2.CAP_PROP_FPS else self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    kind = "images"
+
+    def __init__(self, spec, directory, fps=None, pace="realtime", loop=True):
+        self.paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        ) if os.path.isdir(directory) else []
+        self._index = 0
+        super().__init__(spec, fps, pace, loop)
+
+    def _next(self):
+        # Unreadable files are skipped rather than ending the sequence
+        while self._index < len(self.paths):
+            frame = cv2.imread(self.paths[self._index])
+            self._index += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def _skip(self):
+        if self._index >= len(self.paths):
+            return False
+        self._index += 1
+        return True
+
+    def _rewind(self):
+        self._index = 0
+        return bool(self.paths)
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.paths))
+        return super().get(prop)
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic frames: a fixed noisy background with moving blobs, frame i depends only on (seed, i)."""
+
+    kind = "synthetic"
+
+    def __init__(self, spec, width=640, height=480, frames=0, seed=0, blobs=8, fps=None, pace="realtime", loop=True):
+        rng = np.random.default_rng(seed)
+        self.width, self.height = width, height
+        self.total = frames
+        self._index = 0
+        self._background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 5)
+        self._blobs = [
+            (rng.uniform(0, width), rng.uniform(0, height), rng.uniform(-4, 4), rng.uniform(-4, 4),
+             int(rng.integers(10, max(11, min(width, height) // 6))), tuple(int(c) for c in rng.integers(0, 256, 3)))
+            for _ in range(blobs)
+        ]
+        super().__init__(spec, fps, pace, loop)
+
+    def render(self, i):
+        frame = self._background.copy()
+        for x, y, dx, dy, radius, color in self._blobs:
+            # Bounce inside the frame: reflect the unbounded position into [0, size)
+            px = abs((x + dx * i) % (2 * self.width) - self.width)
+            py = abs((y + dy * i) % (2 * self.height) - self.height)
+            cv2.circle(frame, (int(px), int(py)), radius, color, -1)
+        cv2.putText(frame, str(i), (10, self.height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        return frame
+
+    def _next(self):
+        if self.total and self._index >= self.total:
+            return False, None
+        frame = self.render(self._index)
+        self._index += 1
+        return True, frame
+
+    def _skip(self):
+        if self.total and self._index >= self.total:
+            return False
+        self._index += 1
+        return True
+
+    def _rewind(self):
+        self._index = 0
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.total)
+        return super().get(prop)
+
+
+def _parse_pace(value):
+    value = str(value).strip().lower()
+    if value in ("realtime", "fast"):
+        return value
+    try:
+        fps = float(value)
+    except ValueError:
+        raise ValueError(f"Invalid frame source pace {value!r}: use realtime, fast or a frame rate")
+    return "fast" if fps <= 0 else fps
+
+
+def open_frame_source(spec=None, pace=None, loop=None):
+    """Open a FrameSource from a spec (default: FRAME_SOURCE or the CLI override)."""
+    spec = spec or _defaults["spec"]
+    target, _, query = spec.partition("?")
+    options = dict(parse_qsl(query))
+    pace = _parse_pace(options.get("pace", pace if pace is not None else _defaults["pace"]))
+    loop = options["loop"] != "0" if "loop" in options else (_defaults["loop"] if loop is None else loop)
+    fps = float(options["fps"]) if "fps" in options else None
+
+    kind, sep, value = target.partition(":")
+    if kind not in SOURCE_KINDS:
+        # Bare index or path (a Windows drive letter is not a kind)
+        kind, value = None, target
+        if target.isdigit():
+            kind, value = "webcam", target
+        elif os.path.isdir(target):
+            kind, value = "images", target
+        elif os.path.isfile(target):
+            kind, value = "video", target
+
+    if kind == "webcam":
+        return WebcamSource(spec, int(value or 0))
+    if kind == "video":
+        return VideoFileSource(spec, value, fps, pace, loop)
+    if kind == "images":
+        return ImageDirSource(spec, value, fps, pace, loop)
+    if kind == "synthetic":
+        width, height = (int(v) for v in (value or "640x480").lower().split("x"))
+        return SyntheticSource(
+            spec, width, height, frames=int(options.get("frames", 0)), seed=int(options.get("seed", 0)),
+            blobs=int(options.get("blobs", 8)), fps=fps, pace=pace, loop=loop,
+        )
+    raise ValueError(f"Unknown frame source {spec!r}")
+
+
+def describe_source():
+    """Current default source settings, for startup logs."""
+    return f"{_defaults['spec']} (pace={_defaults['pace']}, loop={'on' if _defaults['loop'] else 'off'})"
+
+
+def add_source_arguments(parser):
+    parser.add_argument("--source", default=None, help=f"frame source spec (default: FRAME_SOURCE={FRAME_SOURCE})")
+    parser.add_argument("--pace", default=None, help="realtime, fast or frames per second")
+    parser.add_argument("--once", action="store_true", help="stop at the end of a video/image source instead of looping")
+
+
+def source_from_args(args):
+    """Apply --source/--pace/--once from an argparse namespace as the process-wide defaults."""
+    if args.source:
+        _defaults["spec"] = args.source
+    if args.pace:
+        _defaults["pace"] = args.pace
+    if args.once:
+        _defaults["loop"] = False
+
+
+def strip_source_args(argv):
+    """Remove --source/--pace/--once from a sys.argv-style list, applying them; for scripts without argparse."""
+    remaining = []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        name, eq, inline = arg.partition("=")
+        if name in ("--source", "--pace"):
+            value = inline if eq else (argv[i + 1] if i + 1 < len(argv) else "")
+            _defaults[name[2:] if name == "--pace" else "spec"] = value
+            i += 1 if eq else 2
+            continue
+        if arg == "--once":
+            _defaults["loop"] = False
+        else:
+            remaining.append(arg)
+        i += 1
+    argv[:] = remaining
+    return argv
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Off by default; /debug/trace?enable=1 switches it on at runtime
+FRAME_TRACE = os.getenv("FRAME_TRACE", "0") == "1"
+# Complete spans kept; a traced frame is ~5-10 spans, so the default holds the last few thousand frames
+FRAME_TRACE_CAPACITY = int(os.getenv("FRAME_TRACE_CAPACITY", "50000"))
+# When set, each session's spans are written here as <service>-<session>.json when the session stops
+FRAME_TRACE_DIR = os.getenv("FRAME_TRACE_DIR", "")
+
+
+class _NoopSpan:
+    __slots__ = ()
+    args = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.start, time.perf_counter() - self.start, self.args)
+
+
+class FrameTracer:
+    """Bounded ring buffer of timed spans from a stream loop, exported as Chrome trace_event JSON.
+
+    While disabled, span() returns a shared no-op context manager, so the
+    instrumented loop pays one attribute check per span.
+    """
+
+    def __init__(self, service, capacity=FRAME_TRACE_CAPACITY, enabled=FRAME_TRACE):
+        self.service = service
+        self.enabled = enabled
+        self._events = deque(maxlen=capacity)
+        self._thread_names = {}
+        self._frame = 0
+        self._open = None
+        self._origin = time.perf_counter()
+
+    def span(self, name, **args):
+        """`with tracer.span("detect"): ...`; fill span.args inside the block to annotate it."""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, args)
+
+    def next_frame(self, **args):
+        """Close the previous loop iteration's span and open the next; call at the top of the loop."""
+        if not self.enabled:
+            self._open = None
+            return
+        now = time.perf_counter()
+        if self._open is not None:
+            self.add("frame", self._open[0], now - self._open[0], self._open[1])
+        self._frame += 1
+        self._open = (now, {"frame": self._frame, **args})
+
+    def annotate(self, **args):
+        """Attach values (face count, people count) to the open frame span."""
+        if self._open is not None:
+            self._open[1].update(args)
+
+    def end_frame(self):
+        """Close the last frame span when the loop exits."""
+        if self._open is not None:
+            start, args = self._open
+            self._open = None
+            if self.enabled:
+                self.add("frame", start, time.perf_counter() - start, args)
+
+    def add(self, name, start, seconds, args=None):
+        ident = threading.get_ident()
+        if ident not in self._thread_names:
+            self._thread_names[ident] = threading.current_thread().name
+        # deque.append is atomic, so producers on several threads need no lock
+        self._events.append((name, start, seconds, ident, args))
+
+    def record(self, name, seconds, **args):
+        """Add a span that ended just now (for callbacks that only report a duration)."""
+        if self.enabled:
+            self.add(name, time.perf_counter() - seconds, seconds, args)
+
+    def clear(self):
+        self._events.clear()
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+
+    def stats(self):
+        return {"enabled": self.enabled, "spans": len(self._events), "capacity": self._events.maxlen,
+                "frames": self._frame}
+
+    def chrome_trace(self, since=None):
+        """trace_event JSON object (load in chrome://tracing or ui.perfetto.dev)."""
+        pid = os.getpid()
+        events = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.service}},
+        ]
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": ident, "args": {"name": name}}
+            for ident, name in list(self._thread_names.items())
+        )
+        for name, start, seconds, ident, args in list(self._events):
+            if since is not None and start < since:
+                continue
+            event = {
+                "name": name,
+                "cat": self.service,
+                "ph": "X",
+                "ts": round((start - self._origin) * 1e6, 1),
+                "dur": round(seconds * 1e6, 1),
+                "pid": pid,
+                "tid": ident,
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def mark(self):
+        """Opaque position to pass to chrome_trace(since=...) or dump_session() later."""
+        return time.perf_counter()
+
+    def dump_session(self, label, since=None):
+        """Write the spans since `since` to FRAME_TRACE_DIR; returns the path, or None when not configured."""
+        if not (self.enabled and FRAME_TRACE_DIR):
+            return None
+        os.makedirs(FRAME_TRACE_DIR, exist_ok=True)
+        path = os.path.join(FRAME_TRACE_DIR, f"{self.service}-{label}.json")
+        try:
+            with open(path, "w") as f:
+                json.dump(self.chrome_trace(since), f)
+        except OSError as e:
+            print(f"[Trace] Failed to write {path}: {e}")
+            return None
+        print(f"[Trace] Wrote {path}")
+        return path
@@ -0,0 +1,303 @@
+"""Audit the face gallery for duplicate registrations and inconsistent enrollments.
+
+Loads the gallery the way the multi-face service does and reports:
+
+- duplicate pairs: two users whose closest stored samples have cosine similarity
+  >= --threshold, so either one can be matched as the other (typically one
+  person registered under two emails);
+- inconsistent users: enrollments whose samples barely agree (mean pairwise
+  similarity under --min-consistency) or that hold a sample too far from the
+  rest of them to match its own owner (under --min-sample).
+
+Duplicates are searched on one L2-normalized centroid per user. All pairs of
+centroids are compared in --block x --block tiles, one matrix product per tile,
+so memory stays at the gallery plus one tile whatever the gallery size. When
+faiss is installed, an HNSW index over the centroids (--neighbors per user)
+replaces the tiles. Centroid pairs within --margin of the threshold are then
+confirmed sample by sample. --exact tiles over every stored sample instead of
+centroids; it finds every pair but costs ~samples^2 more, so keep it for small
+galleries or spot checks.
+
+Usage: python gallery_audit.py [--threshold 0.5] [--margin 0.15] [--min-consistency 0.6]
+                               [--min-sample 0.5] [--block 4096] [--exact] [--no-ann]
+                               [--output gallery_audit.json]
+       python gallery_audit.py --synthetic 100000 [--duplicates 50]   # timing run without MongoDB
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # the tiled exact search is used instead
+    faiss = None
+
+from pymongo import MongoClient
+
+from env_config import get_required_env
+from face_gallery import FaceGallery, load_gallery
+
+# Centroid tile edge: a 4096 x 4096 float32 tile is 64 MB
+DEFAULT_BLOCK = 4096
+HNSW_LINKS = 32
+# Users per sample-statistics chunk, so the per-row centroid lookup never copies the whole matrix
+STATS_CHUNK_USERS = 8192
+# Findings printed to the console; the JSON report has all of them
+PRINT_LIMIT = 20
+
+
+def user_bounds(gallery):
+    """Row offsets per user: rows bounds[u]:bounds[u + 1] belong to gallery.users[u] (rows are stored per user)."""
+    return np.searchsorted(gallery.owners, np.arange(len(gallery.users) + 1)).astype(np.int64)
+
+
+def sample_statistics(gallery, bounds):
+    """(centroids, mean pairwise similarity, worst leave-one-out similarity) per user.
+
+    For unit vectors with sum s, the mean pairwise similarity is
+    (|s|^2 - n) / (n(n - 1)), and a sample x's similarity to the mean of the
+    others is (s.x - 1) / |s - x|, so neither needs an n x n product per user.
+    """
+    users = len(gallery.users)
+    counts = np.diff(bounds)
+    dims = gallery.matrix.shape[1]
+    centroids = np.empty((users, dims), dtype=np.float32)
+    consistency = np.ones(users, dtype=np.float32)
+    worst = np.ones(users, dtype=np.float32)
+    for start in range(0, users, STATS_CHUNK_USERS):
+        end = min(users, start + STATS_CHUNK_USERS)
+        rows = gallery.matrix[bounds[start]:bounds[end]]
+        sums = np.add.reduceat(rows, bounds[start:end] - bounds[start], axis=0)
+        n = counts[start:end].astype(np.float32)
+        squared = np.einsum("ij,ij->i", sums, sums)
+        multi = n > 1
+        consistency[start:end][multi] = (squared[multi] - n[multi]) / (n[multi] * (n[multi] - 1))
+        norms = np.sqrt(squared)
+        centroids[start:end] = sums / np.maximum(norms, 1e-12)[:, None]
+
+        owner = np.repeat(np.arange(end - start), counts[start:end])
+        dots = np.einsum("ij,ij->i", rows, sums[owner])
+        rest = np.sqrt(np.maximum(squared[owner] - 2 * dots + 1, 1e-12))
+        leave_one_out = np.where(n[owner] > 1, (dots - 1) / rest, 1.0).astype(np.float32)
+        worst[start:end] = np.minimum.reduceat(leave_one_out, bounds[start:end] - bounds[start])
+    return centroids, consistency, worst
+
+
+def _tile_pairs(vectors, cutoff, block):
+    """(i, j, similarity) with i < j and similarity >= cutoff, from block x block tiles of vectors @ vectors.T."""
+    found_i, found_j, found_s = [], [], []
+    tiles = 0
+    total = len(vectors)
+    for i in range(0, total, block):
+        left = vectors[i:i + block]
+        for j in range(i, total, block):
+            sims = left @ vectors[j:j + block].T
+            tiles += 1
+            if i == j:
+                # Lower triangle and the diagonal are self pairs or already covered
+                sims[np.tril_indices(len(sims), 0, sims.shape[1])] = -np.inf
+            rows, cols = np.nonzero(sims >= cutoff)
+            if len(rows):
+                found_i.append(rows + i)
+                found_j.append(cols + j)
+                found_s.append(sims[rows, cols])
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32), tiles
+    return np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_s), tiles
+
+
+def _neighbour_hits(sims, ids, start, cutoff):
+    """(i, j, similarity) from one block of k-NN results for rows start.., minus self hits and padding (-1)."""
+    own = np.arange(start, start + len(ids))[:, None]
+    rows, cols = np.nonzero((sims >= cutoff) & (ids != own) & (ids >= 0))
+    return rows + start, ids[rows, cols], sims[rows, cols]
+
+
+def _unique_pairs(pairs_i, pairs_j, sims, total):
+    """Pairs normalised to i < j with duplicates removed (a pair may be found from both sides)."""
+    pairs_i, pairs_j = np.minimum(pairs_i, pairs_j), np.maximum(pairs_i, pairs_j)
+    _, first = np.unique(pairs_i.astype(np.int64) * total + pairs_j, return_index=True)
+    return pairs_i[first], pairs_j[first], sims[first]
+
+
+def _hnsw_pairs(vectors, cutoff, neighbors, block):
+    """Like _tile_pairs but from each vector's approximate nearest neighbours in an HNSW index."""
+    index = faiss.IndexHNSWFlat(vectors.shape[1], HNSW_LINKS, faiss.METRIC_INNER_PRODUCT)
+    index.add(vectors)
+    found_i, found_j, found_s = [], [], []
+    for start in range(0, len(vectors), block):
+        sims, ids = index.search(vectors[start:start + block], neighbors + 1)
+        # HNSW neighbour lists are not symmetric: keep a pair found from either side
+        hits_i, hits_j, hits_s = _neighbour_hits(sims, ids, start, cutoff)
+        found_i.append(hits_i)
+        found_j.append(hits_j)
+        found_s.append(hits_s)
+    return _unique_pairs(np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_s), len(vectors))
+
+
+def confirm_pair(gallery, bounds, u, v):
+    """(best sample similarity, sample pairs) between users u and v."""
+    sims = gallery.matrix[bounds[u]:bounds[u + 1]] @ gallery.matrix[bounds[v]:bounds[v + 1]].T
+    return float(sims.max()), sims
+
+
+def find_duplicates(gallery, bounds, centroids, args, stats):
+    """{(u, v): (best sample similarity, centroid similarity or None, sample pairs >= threshold)} for u < v."""
+    found = {}
+    started = time.perf_counter()
+    if args.exact:
+        rows_i, rows_j, sims, tiles = _tile_pairs(gallery.matrix, args.threshold, args.block)
+        owners_i, owners_j = gallery.owners[rows_i], gallery.owners[rows_j]
+        cross = owners_i != owners_j
+        for u, v, similarity in zip(owners_i[cross], owners_j[cross], sims[cross]):
+            key = (int(min(u, v)), int(max(u, v)))
+            best, _, pairs = found.get(key, (-1.0, None, 0))
+            found[key] = (max(best, float(similarity)), None, pairs + 1)
+        stats.update(method="exact", tiles=tiles, candidate_pairs=int(cross.sum()))
+    else:
+        cutoff = args.threshold - args.margin
+        if faiss is not None and not args.no_ann:
+            pairs_i, pairs_j, sims = _hnsw_pairs(centroids, cutoff, args.neighbors, args.block)
+            stats.update(method="hnsw", neighbors=args.neighbors)
+        else:
+            pairs_i, pairs_j, sims, tiles = _tile_pairs(centroids, cutoff, args.block)
+            stats.update(method="tiled", tiles=tiles)
+        stats["candidate_pairs"] = len(pairs_i)
+        stats["search_s"] = round(time.perf_counter() - started, 2)
+        for u, v, centroid_similarity in zip(pairs_i, pairs_j, sims):
+            best, sample_sims = confirm_pair(gallery, bounds, u, v)
+            if best >= args.threshold:
+                found[(int(u), int(v))] = (best, float(centroid_similarity), int((sample_sims >= args.threshold).sum()))
+    stats["duplicates_s"] = round(time.perf_counter() - started, 2)
+    return found
+
+
+def _user(gallery, u):
+    email, name = gallery.users[u]
+    return {"email": email, "name": name}
+
+
+def audit(gallery, args):
+    stats = {"users": len(gallery.users), "embeddings": int(len(gallery.matrix))}
+    started = time.perf_counter()
+    bounds = user_bounds(gallery)
+    centroids, consistency, worst = sample_statistics(gallery, bounds)
+    stats["statistics_s"] = round(time.perf_counter() - started, 2)
+    print(f"[Audit] Sample statistics for {len(gallery.users)} users in {stats['statistics_s']}s")
+
+    found = find_duplicates(gallery, bounds, centroids, args, stats)
+    print(f"[Audit] {stats['method']} duplicate search: {stats['candidate_pairs']} candidate pair(s), "
+          f"{len(found)} above {args.threshold} in {stats['duplicates_s']}s")
+
+    duplicates = [
+        {
+            "users": [_user(gallery, u), _user(gallery, v)],
+            "similarity": round(best, 4),
+            "centroid_similarity": round(centroid, 4) if centroid is not None else None,
+            "sample_pairs_above": pairs,
+        }
+        for (u, v), (best, centroid, pairs) in sorted(found.items(), key=lambda item: -item[1][0])
+    ]
+    counts = np.diff(bounds)
+    flagged = np.flatnonzero((counts > 1) & ((consistency < args.min_consistency) | (worst < args.min_sample)))
+    inconsistent = [
+        {
+            **_user(gallery, u),
+            "samples": int(counts[u]),
+            "mean_similarity": round(float(consistency[u]), 4),
+            "worst_sample_similarity": round(float(worst[u]), 4),
+        }
+        for u in flagged[np.argsort(consistency[flagged])]
+    ]
+    stats["total_s"] = round(time.perf_counter() - started, 2)
+    return stats, duplicates, inconsistent
+
+
+def synthetic_gallery(users, per_user, dims, duplicates, seed=0):
+    """Clustered random users with 1% noisy enrollments; the last `duplicates` users re-register the first ones' faces."""
+    rng = np.random.default_rng(seed)
+    matrix = np.empty((users * per_user, dims), dtype=np.float32)
+    first = None
+    for start in range(0, users, STATS_CHUNK_USERS):
+        end = min(users, start + STATS_CHUNK_USERS)
+        identities = rng.standard_normal((end - start, dims), dtype=np.float32)
+        identities /= np.linalg.norm(identities, axis=1, keepdims=True)
+        if first is None:
+            first = identities[:duplicates].copy()
+        for u in range(max(start, users - duplicates), end):
+            identities[u - start] = first[u - (users - duplicates)]
+        # Noise of norm ~0.6 around the identity puts same-person similarity near 0.75 (FaceNet-like), other people near 0
+        samples = np.repeat(identities, per_user, axis=0)
+        samples += rng.standard_normal(samples.shape, dtype=np.float32) * np.float32(0.6 / np.sqrt(dims))
+        noisy = np.flatnonzero(rng.random(end - start) < 0.01)
+        for u in noisy:
+            samples[u * per_user:(u + 1) * per_user] = rng.standard_normal((per_user, dims), dtype=np.float32)
+        samples /= np.linalg.norm(samples, axis=1, keepdims=True)
+        matrix[start * per_user:end * per_user] = samples
+    owners = np.repeat(np.arange(users, dtype=np.int32), per_user)
+    names = [(f"user{u}@example.com", f"User {u}") for u in range(users)]
+    return FaceGallery(names, matrix, owners, {"synthetic": True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=0.5, help="the services' match threshold")
+    parser.add_argument("--margin", type=float, default=0.15,
+                        help="centroid pairs this far under the threshold are still checked sample by sample")
+    parser.add_argument("--min-consistency", type=float, default=0.6, help="flag users whose samples agree less on average")
+    parser.add_argument("--min-sample", type=float, default=0.5,
+                        help="flag users with a sample less similar than this to the rest of their samples")
+    parser.add_argument("--block", type=int, default=DEFAULT_BLOCK, help="tile edge in vectors (memory ~ block^2 x 4 bytes)")
+    parser.add_argument("--exact", action="store_true", help="compare every stored sample instead of user centroids")
+    parser.add_argument("--no-ann", action="store_true", help="use the tiled search even when faiss is installed")
+    parser.add_argument("--neighbors", type=int, default=20, help="HNSW neighbours checked per user")
+    parser.add_argument("--synthetic", type=int, metavar="USERS", help="audit a generated gallery instead of MongoDB")
+    parser.add_argument("--duplicates", type=int, default=50, help="duplicate users planted in a synthetic gallery")
+    parser.add_argument("--per-user", type=int, default=10, help="samples per synthetic user")
+    parser.add_argument("--output", default="gallery_audit.json")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.synthetic:
+        duplicates = min(args.duplicates, args.synthetic // 2, STATS_CHUNK_USERS)
+        gallery = synthetic_gallery(args.synthetic, args.per_user, 512, duplicates)
+        print(f"[Audit] Generated {len(gallery)} synthetic users in {time.perf_counter() - started:.1f}s")
+    else:
+        client = MongoClient(get_required_env("MONGODB_URI"))
+        users_collection = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]["users"]
+        gallery = load_gallery(users_collection)
+        print(f"[Audit] Loaded {len(gallery)} users ({gallery.load_stats['embeddings']} embeddings, "
+              f"{gallery.load_stats['matrix_mb']} MB) in {gallery.load_stats['load_s']}s")
+    if not len(gallery):
+        print("[Audit] The gallery is empty")
+        return 0
+
+    stats, duplicates, inconsistent = audit(gallery, args)
+    for finding in duplicates[:PRINT_LIMIT]:
+        first, second = finding["users"]
+        print(f"  duplicate {finding['similarity']:.3f}: {first['email']} <-> {second['email']}")
+    for finding in inconsistent[:PRINT_LIMIT]:
+        print(f"  inconsistent {finding['email']}: mean {finding['mean_similarity']:.3f}, "
+              f"worst sample {finding['worst_sample_similarity']:.3f}")
+    with open(args.output, "w") as f:
+        json.dump({
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "model_version": gallery.model_version,
+            "config": vars(args),
+            "stats": stats,
+            "duplicates": duplicates,
+            "inconsistent": inconsistent,
+        }, f, indent=2)
+    print(f"[Audit] {len(duplicates)} duplicate pair(s), {len(inconsistent)} inconsistent user(s) in "
+          f"{stats['total_s']}s. Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
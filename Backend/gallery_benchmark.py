@@ -0,0 +1,159 @@
+"""Gallery load benchmark: legacy full-document loader vs the projected, streamed FaceGallery loader.
+
+Seeds synthetic users (embeddings plus a password hash and profile fields, like real
+documents) into a scratch database, then loads them with each loader in a fresh
+subprocess so peak RSS is measured per run.
+
+Usage: python gallery_benchmark.py [--sizes 10000,100000,1000000] [--embeddings-per-user 10]
+                                   [--legacy-max 100000] [--output results.json] [--keep]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from pymongo import MongoClient
+
+from env_config import get_required_env
+from face_gallery import GALLERY_BATCH_SIZE, ensure_gallery_index, load_gallery
+
+BENCH_COLLECTION = "users_gallery_bench"
+SEED_CHUNK = 1000
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+
+def _bench_db(args):
+    client = MongoClient(get_required_env("MONGODB_URI"))
+    return client[args.db]
+
+
+def legacy_load(users_collection):
+    """The pre-FaceGallery get_all_user_embeddings, kept as the baseline."""
+    users = list(users_collection.find({"embeddings": {"$exists": True}}))
+    user_data = {}
+    for user in users:
+        if "embeddings" in user:
+            user_data[user["email"]] = {
+                "name": user.get("name", "Unknown"),
+                "embeddings": [np.array(embedding) for embedding in user["embeddings"]]
+            }
+    return user_data
+
+
+def seed_users(collection, total, per_user, dim):
+    """Top the bench collection up to `total` users (sizes are run smallest first, so seeding is incremental)."""
+    existing = collection.estimated_document_count()
+    rng = np.random.default_rng(existing)
+    started = time.perf_counter()
+    for offset in range(existing, total, SEED_CHUNK):
+        count = min(SEED_CHUNK, total - offset)
+        embeddings = rng.standard_normal((count, per_user, dim)).tolist()
+        collection.insert_many([
+            {
+                "name": f"Bench User {offset + i}",
+                "email": f"bench{offset + i}@example.com",
+                "password": "$2b$10$" + "x" * 53,
+                "faceRegistered": True,
+                "createdAt": time.time(),
+                "embeddings": embeddings[i],
+            }
+            for i in range(count)
+        ], ordered=False)
+    if total > existing:
+        print(f"[Bench] Seeded {total - existing} users in {time.perf_counter() - started:.1f}s")
+
+
+def measure(args):
+    """Child process: run one loader and print its timings as JSON."""
+    collection = _bench_db(args)[BENCH_COLLECTION]
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if args.measure == "legacy":
+        loaded = legacy_load(collection)
+        users = len(loaded)
+        embeddings = sum(len(u["embeddings"]) for u in loaded.values())
+    else:
+        gallery = load_gallery(collection, batch_size=args.batch_size)
+        users = len(gallery)
+        embeddings = len(gallery.owners)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "loader": args.measure,
+        "users": users,
+        "embeddings": embeddings,
+        "load_s": round(elapsed, 3),
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": _peak_rss_mb(),
+    }))
+
+
+def run_child(args, loader):
+    cmd = [sys.executable, os.path.abspath(__file__), "--measure", loader, "--db", args.db,
+           "--batch-size", str(args.batch_size)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"loader": loader, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--embeddings-per-user", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=GALLERY_BATCH_SIZE)
+    parser.add_argument("--legacy-max", type=int, default=100000,
+                        help="skip the legacy loader above this many users (it holds every document in memory)")
+    parser.add_argument("--db", default=os.getenv("MONGODB_DB_NAME", "face_recognition") + "_bench")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded collection afterwards")
+    parser.add_argument("--measure", choices=["legacy", "streamed"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args)
+        return
+
+    collection = _bench_db(args)[BENCH_COLLECTION]
+    ensure_gallery_index(collection)
+    results = []
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        seed_users(collection, size, args.embeddings_per_user, args.dim)
+        loaders = ["streamed"] if size > args.legacy_max else ["legacy", "streamed"]
+        for loader in loaders:
+            result = {"size": size, **run_child(args, loader)}
+            results.append(result)
+            print(json.dumps(result))
+
+    print(f"\n{'users':>9} {'loader':>9} {'load s':>9} {'peak RSS MB':>12} {'over baseline MB':>17}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['size']:>9} {r['loader']:>9}  error: {r['error']}")
+            continue
+        print(f"{r['size']:>9} {r['loader']:>9} {r['load_s']:>9.2f} {r['peak_rss_mb']:>12.1f} "
+              f"{r['peak_rss_mb'] - r['baseline_rss_mb']:>17.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"embeddings_per_user": args.embeddings_per_user, "dim": args.dim,
+                       "batch_size": args.batch_size, "results": results}, f, indent=2)
+    if not args.keep:
+        collection.drop()
+
+
+if __name__ == "__main__":
+    main()
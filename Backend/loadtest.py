@@ -0,0 +1,361 @@
+"""Load generator for the stream services and the server.js relay.
+
+Simulates N dashboard viewers against one service and steps N up. Each step reports
+request latency percentiles, the service's loop FPS relative to the first step, and the
+time threads spent waiting on its shared locks (from the service's /metrics). Start the
+service with a replayed source so every step processes the same frames, e.g.
+FRAME_SOURCE=video:samples/lobby.mp4 python multi_face_stream.py.
+
+Viewers either poll like the old pages (GET /current-frame every 200 ms, /status every 2 s)
+or hold a push stream (GET /frames); --via proxy sends them through server.js instead.
+
+Usage: python loadtest.py --service multi-face [--viewers 0,1,5,10,25,50] [--duration 20] [--mode poll|push]
+                          [--via direct|proxy] [--start] [--json results.json]
+"""
+import argparse
+import datetime
+import http.client
+import json
+import re
+import struct
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+# service -> (stream service port, server.js status route or None)
+SERVICES = {
+    "registration": (5001, "/register-face/status"),
+    "single-face": (5002, None),
+    "multi-face": (5003, None),
+    "crowd": (5004, "/crowd-counting/status"),
+}
+PROXY_PORT = 3001
+REQUEST_TIMEOUT_S = 10.0
+METRIC_LINE = re.compile(r'^(\w+)(?:\{([^}]*)\})?\s+(\S+)$')
+SERVICE_LABEL = re.compile(r'service="[^"]*",?')
+
+
+def percentiles(times):
+    if not times:
+        return {"count": 0}
+    ordered = sorted(times)
+
+    def at(q):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+# --- Simulated viewers ---
+class Recorder:
+    """Latencies and errors per endpoint, shared by all viewers of a step."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latencies = {}
+            self.errors = {}
+            self.bytes = 0
+
+    def add(self, endpoint, seconds, nbytes=0):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            self.bytes += nbytes
+
+    def error(self, endpoint):
+        with self._lock:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: list(values) for name, values in self.latencies.items()}, dict(self.errors), self.bytes
+
+
+class Viewer(threading.Thread):
+    def __init__(self, base_url, recorder, stop, args):
+        super().__init__(daemon=True)
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port
+        self.recorder = recorder
+        self.stop = stop
+        self.args = args
+        self._conn = None
+
+    def _get(self, path, endpoint):
+        """GET on the viewer's keep-alive connection; (status, body) or None after recording an error."""
+        started = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT_S)
+            self._conn.request("GET", path)
+            response = self._conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.recorder.error(endpoint)
+            self._conn = None
+            return None
+        self.recorder.add(endpoint, time.perf_counter() - started, len(body))
+        if response.status >= 500:
+            self.recorder.error(endpoint)
+        return response.status, body
+
+
+class PollingViewer(Viewer):
+    """The pre-push dashboards: frame polls every --frame-interval, status polls every --status-interval."""
+
+    def __init__(self, base_url, recorder, stop, args, frame_path, status_path):
+        super().__init__(base_url, recorder, stop, args)
+        self.frame_path = frame_path
+        self.status_path = status_path
+
+    def run(self):
+        seq = None
+        inf = float("inf")
+        now = time.monotonic()
+        next_frame = now if self.frame_path else inf
+        next_status = now if self.status_path else inf
+        while not self.stop.is_set():
+            now = time.monotonic()
+            if now >= next_frame:
+                next_frame = now + self.args.frame_interval
+                path = self.frame_path if seq is None or not self.args.conditional else f"{self.frame_path}?after={seq}"
+                result = self._get(path, "current-frame")
+                if result and result[0] == 200:
+                    try:
+                        seq = json.loads(result[1]).get("seq", seq)
+                    except ValueError:
+                        pass
+            if now >= next_status:
+                next_status = now + self.args.status_interval
+                self._get(self.status_path, "status")
+            self.stop.wait(max(0.0, min(next_frame, next_status) - time.monotonic()))
+
+
+class PushViewer(Viewer):
+    """The current dashboards: one persistent binary frame stream, plus status polls when a route exists."""
+
+    def __init__(self, base_url, recorder, stop, args, frames_path, status_path):
+        super().__init__(base_url, recorder, stop, args)
+        self.frames_path = frames_path
+        self.status_path = status_path
+
+    def run(self):
+        if self.status_path:
+            base_url = f"http://{self.host}:{self.port}"
+            PollingViewer(base_url, self.recorder, self.stop, self.args, None, self.status_path).start()
+        while not self.stop.is_set():
+            try:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT_S)
+                conn.request("GET", self.frames_path)
+                response = conn.getresponse()
+                if response.status != 200:
+                    self.recorder.error("frames")
+                    self.stop.wait(1.0)
+                    continue
+                self._read_records(response)
+            except (OSError, http.client.HTTPException, struct.error, ValueError):
+                self.recorder.error("frames")
+                self.stop.wait(0.5)
+
+    def _read_records(self, response):
+        while not self.stop.is_set():
+            header_length = struct.unpack(">I", response.read(4))[0]
+            header = json.loads(response.read(header_length))
+            size = header.get("size", 0)
+            if size:
+                response.read(size)
+                if header.get("ts"):
+                    # Capture-to-delivery age of the frame (viewer and service share a clock on one host)
+                    self.recorder.add("frame-age", max(0.0, time.time() - header["ts"]), size)
+
+
+# --- Service metrics ---
+def scrape(base_url):
+    """Parse the service's Prometheus text into {(name, labels): value}; {} when unreachable."""
+    parts = urlsplit(base_url)
+    try:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=REQUEST_TIMEOUT_S)
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        text = response.read().decode("utf-8", "replace")
+    except (OSError, http.client.HTTPException):
+        return {}
+    if response.status != 200:
+        return {}
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            try:
+                # Every series carries the service label; drop it so lookups only name the interesting labels
+                labels = SERVICE_LABEL.sub("", match.group(2) or "")
+                samples[(match.group(1), labels)] = float(match.group(3))
+            except ValueError:
+                pass
+    return samples
+
+
+def _labels(labels):
+    return dict(re.findall(r'(\w+)="([^"]*)"', labels))
+
+
+def metrics_delta(before, after, seconds):
+    """Loop FPS, mean stage latency, lock wait and CPU over a step, from two /metrics scrapes."""
+    def delta(name, labels=""):
+        return after.get((name, labels), 0.0) - before.get((name, labels), 0.0)
+
+    if not after:
+        return None
+    result = {"loop_fps": round(delta("mlfrs_frames_captured_total") / seconds, 2)}
+    cpu = delta("mlfrs_process_cpu_seconds_total")
+    if ("mlfrs_process_cpu_seconds_total", "") in after:
+        result["service_cpu_pct"] = round(cpu / seconds * 100, 1)
+    stages = {}
+    for (name, labels) in after:
+        if name == "mlfrs_stage_latency_seconds_count":
+            count = delta(name, labels)
+            if count:
+                stage = _labels(labels)["stage"]
+                stages[stage] = round(delta("mlfrs_stage_latency_seconds_sum", labels) / count * 1000, 3)
+    result["stage_mean_ms"] = stages
+    locks = {}
+    for (name, labels) in after:
+        if name == "mlfrs_lock_wait_seconds_total":
+            lock = _labels(labels)["lock"]
+            acquisitions = delta("mlfrs_lock_acquisitions_total", labels)
+            locks[lock] = {
+                "wait_ms_per_s": round(delta(name, labels) / seconds * 1000, 3),
+                "contended_pct": round(delta("mlfrs_lock_contended_total", labels) / acquisitions * 100, 2)
+                if acquisitions else 0.0,
+                "acquisitions_per_s": round(acquisitions / seconds, 1),
+            }
+    result["locks"] = locks
+    return result
+
+
+# --- Steps ---
+def start_session(service_url, body):
+    parts = urlsplit(service_url)
+    try:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=REQUEST_TIMEOUT_S)
+        conn.request("POST", "/start", body=json.dumps(body), headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status < 400
+    except (OSError, http.client.HTTPException) as e:
+        print(f"[LoadTest] Could not start a session: {e}")
+        return False
+
+
+def make_viewer(args, recorder, stop):
+    port, proxy_status = SERVICES[args.service]
+    if args.via == "proxy":
+        return PushViewer(args.proxy_url, recorder, stop, args, f"/frames/{args.service}", proxy_status)
+    if args.mode == "push":
+        return PushViewer(args.service_url, recorder, stop, args, "/frames", "/status")
+    return PollingViewer(args.service_url, recorder, stop, args, "/current-frame", "/status")
+
+
+def run_step(args, viewers):
+    if args.start:
+        start_session(args.service_url, json.loads(args.start_body))
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [make_viewer(args, recorder, stop) for _ in range(viewers)]
+    for thread in threads:
+        thread.start()
+    stop.wait(args.warmup)
+    recorder.reset()
+    before = scrape(args.service_url)
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    elapsed = time.perf_counter() - started
+    after = scrape(args.service_url)
+    latencies, errors, nbytes = recorder.snapshot()
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=REQUEST_TIMEOUT_S)
+    requests = sum(len(v) for name, v in latencies.items() if name != "frame-age")
+    return {
+        "viewers": viewers,
+        "seconds": round(elapsed, 2),
+        "requests_per_s": round(requests / elapsed, 1),
+        "mbytes_per_s": round(nbytes / elapsed / 1e6, 2),
+        "latency": {name: percentiles(values) for name, values in sorted(latencies.items())},
+        "errors": errors,
+        "service": metrics_delta(before, after, elapsed),
+    }
+
+
+def print_step(step, baseline_fps):
+    service = step["service"] or {}
+    fps = service.get("loop_fps")
+    relative = f" ({fps / baseline_fps:.0%} of baseline)" if fps is not None and baseline_fps else ""
+    print(f"\n{step['viewers']} viewers: {step['requests_per_s']} req/s, {step['mbytes_per_s']} MB/s, "
+          f"loop {fps if fps is not None else '?'} fps{relative}, CPU {service.get('service_cpu_pct', '?')}%")
+    for name, stats in step["latency"].items():
+        if stats["count"]:
+            print(f"  {name:<14} n={stats['count']:<6} p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  "
+                  f"p99 {stats['p99_ms']:>8.2f}  max {stats['max_ms']:>8.2f} ms")
+    for name, count in step["errors"].items():
+        print(f"  {name:<14} {count} errors")
+    for name, lock in service.get("locks", {}).items():
+        print(f"  lock {name:<9} wait {lock['wait_ms_per_s']:>8.3f} ms/s  contended {lock['contended_pct']:>5.2f}%  "
+              f"{lock['acquisitions_per_s']} acquisitions/s")
+    if service.get("stage_mean_ms"):
+        print("  stages (mean ms): " + ", ".join(f"{k} {v}" for k, v in sorted(service["stage_mean_ms"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--service", choices=sorted(SERVICES), required=True)
+    parser.add_argument("--viewers", default="0,1,5,10,25,50", help="comma-separated viewer counts, one step each")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds after viewers connect")
+    parser.add_argument("--mode", choices=("poll", "push"), default="poll", help="viewer behaviour against the service")
+    parser.add_argument("--via", choices=("direct", "proxy"), default="direct",
+                        help="proxy: viewers use server.js push streams (frames are relayed, not re-requested)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--proxy-url", default=f"http://127.0.0.1:{PROXY_PORT}")
+    parser.add_argument("--frame-interval", type=float, default=0.2, help="seconds between frame polls")
+    parser.add_argument("--status-interval", type=float, default=2.0, help="seconds between status polls")
+    parser.add_argument("--no-conditional", dest="conditional", action="store_false",
+                        help="poll without ?after=, fetching the full frame every time")
+    parser.add_argument("--start", action="store_true", help="POST /start to the service before each step")
+    parser.add_argument("--start-body", default="{}", help='JSON for --start, e.g. {"email": "a@b.c"} for single-face')
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+    args.service_url = f"http://{args.host}:{SERVICES[args.service][0]}"
+    viewer_counts = [int(v) for v in args.viewers.split(",") if v.strip()]
+
+    if not scrape(args.service_url):
+        print(f"[LoadTest] No /metrics at {args.service_url}; loop FPS and lock contention will be missing")
+    print(f"[LoadTest] {args.service} via {args.via} ({args.mode}), steps {viewer_counts}, {args.duration:g}s each")
+
+    steps = []
+    baseline_fps = None
+    for viewers in viewer_counts:
+        step = run_step(args, viewers)
+        steps.append(step)
+        if baseline_fps is None and step["service"]:
+            baseline_fps = step["service"]["loop_fps"] or None
+        print_step(step, baseline_fps)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "config": {k: v for k, v in vars(args).items() if k != "json"},
+                "steps": steps,
+            }, f, indent=2)
+        print(f"\n[LoadTest] Wrote {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
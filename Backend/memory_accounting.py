@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # falls back to /proc/self/statm (Linux) or no RSS at all
+    psutil = None
+
+# RSS is sampled this often for the /health history and growth slope
+MEMORY_SAMPLE_INTERVAL_S = float(os.getenv("MEMORY_SAMPLE_INTERVAL_S", "60"))
+# Samples kept; the default covers a day at one sample a minute
+MEMORY_HISTORY_SAMPLES = int(os.getenv("MEMORY_HISTORY_SAMPLES", "1440"))
+# Points of RSS history returned by /health
+HEALTH_HISTORY_POINTS = 60
+MIB = 1024 * 1024
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None when it cannot be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def rss_slope(samples):
+    """Least-squares growth of (unix time, bytes) samples in bytes per hour; None with fewer than 3 samples."""
+    if len(samples) < 3:
+        return None
+    t0 = samples[0][0]
+    xs = [(t - t0) / 3600 for t, _ in samples]
+    ys = [value for _, value in samples]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+class MemoryLedger:
+    """Where a service's memory goes: RSS added by each model load, live component sizes and RSS over time.
+
+    Model sizes are RSS deltas around the load, so the first model also
+    carries the framework it pulls in (TensorFlow for FaceNet, torch for YOLO).
+    """
+
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL_S, history=MEMORY_HISTORY_SAMPLES):
+        self.interval = interval
+        self.models = {}
+        self._components = {}
+        self._samples = deque(maxlen=history)
+        self._thread = None
+        self._started = time.time()
+        self._baseline = rss_bytes()
+
+    @contextmanager
+    def measure(self, name):
+        """`with memory.measure("facenet"): embedder = load_embedder()` records the RSS the load added."""
+        before = rss_bytes()
+        started = time.perf_counter()
+        yield
+        after = rss_bytes()
+        added = after - before if before is not None and after is not None else None
+        self.models[name] = {"rss_bytes": added, "load_s": round(time.perf_counter() - started, 2)}
+        if added is not None:
+            print(f"[Memory] {name}: +{added / MIB:.0f} MiB resident, loaded in {self.models[name]['load_s']}s")
+
+    def component(self, name, fn):
+        """Register fn() -> bytes, read whenever the report is built (frame buffers, caches)."""
+        self._components[name] = fn
+
+    def set_bytes(self, name, nbytes):
+        """Record the size of something replaced wholesale (a loaded gallery)."""
+        self._components[name] = lambda: nbytes
+
+    # --- RSS history ---
+    def start(self):
+        """Sample RSS every interval seconds on a daemon thread (idempotent)."""
+        if self._thread is None:
+            self.sample()
+            self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        rss = rss_bytes()
+        if rss is not None:
+            self._samples.append((time.time(), rss))
+        return rss
+
+    def report(self, history_points=HEALTH_HISTORY_POINTS):
+        components = {}
+        for name, fn in list(self._components.items()):
+            try:
+                components[name] = int(fn() or 0)
+            except Exception:
+                components[name] = None
+        samples = list(self._samples)
+        slope = rss_slope(samples)
+        step = max(1, len(samples) // history_points)
+        return {
+            "rss_bytes": rss_bytes(),
+            "baseline_rss_bytes": self._baseline,
+            "models": self.models,
+            "components": components,
+            "rss_slope_mb_per_hour": round(slope / MIB, 3) if slope is not None else None,
+            "sample_interval_s": self.interval,
+            "rss_history_mb": [[round(t), round(rss / MIB, 1)] for t, rss in samples[::step][-history_points:]],
+        }
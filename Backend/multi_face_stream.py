@@ -1,26 +1,46 @@
 print("=== multi_face_stream.py STARTED ===")
+from cpu_resources import configure_cpu
+cpu = configure_cpu("multi_face")  # before numpy, OpenCV and TensorFlow size their thread pools
 import cv2
 import numpy as np
 import os
 from mtcnn import MTCNN
-from keras_facenet import FaceNet
 from pymongo import MongoClient
-from sklearn.metrics.pairwise import cosine_similarity
+import sys
 import time
 import threading
-import base64
 from flask import Flask, jsonify
 from flask_cors import CORS
 from env_config import get_required_env
+from attendance_rollups import ROLLUP_COLLECTION, ensure_attendance_indexes, record_daily_rollup
+from attendance_writer import AttendanceWriter
+from frame_source import describe_source, open_frame_source, strip_source_args
+from service_metrics import ServiceMetrics
+from frame_tracer import FrameTracer
+from frame_governor import FrameGovernor, detect_faces_scaled
+from memory_accounting import MemoryLedger
+from session_perf import SessionPerf, ensure_performance_indexes
+from debug_profiler import register_debug_routes
+from event_bus import EventBus, sse_response
+from embedding_store import load_embedder
+from face_gallery import ensure_gallery_index, load_gallery
+from frame_buffer import FrameBuffer, NO_CACHE_HEADERS, conditional_frame, jpeg_response, mjpeg_response, not_modified, push_stream_response, tag_frame_response
+cpu.apply_frameworks()
 
 # Global variables
 auth_active = False
 auth_thread = None
 stop_flag = threading.Event()
 cap = None
-current_frame = None
-frame_lock = threading.Lock()
-state_lock = threading.Lock()
+memory = MemoryLedger()
+tracer = FrameTracer("multi_face")
+metrics = ServiceMetrics("multi_face", tracer=tracer)
+frame_buffer = FrameBuffer(on_encode=lambda seconds: metrics.observe("encode", seconds),
+                           lock=metrics.lock("frame_buffer"))
+state_lock = metrics.lock("state")
+# Paces the attendance loop (MULTI_FACE_TARGET_FPS / _CPU_BUDGET / _ADAPTIVE)
+governor = FrameGovernor.from_env("MULTI_FACE", 10)
+events = EventBus()
 auth_result = None
 recognized_users = []
 session_id = None  # stays fixed per session
@@ -30,20 +50,45 @@ client = MongoClient(get_required_env("MONGODB_URI"))
 db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
 users_collection = db['users']
 attendance_collection = db['attendances']
+attendance_daily_collection = db[ROLLUP_COLLECTION]
 
-# Ensure unique session documents
+# Ensure unique session documents plus the indexes behind the attendance query API
 try:
-    attendance_collection.create_index([("session_id", 1)], unique=True)
+    ensure_attendance_indexes(attendance_collection, attendance_daily_collection)
+    ensure_performance_indexes(attendance_collection)
 except Exception as e:
     print(f"[Attendance] Failed to create index: {e}")
 
+try:
+    ensure_gallery_index(users_collection)
+except Exception as e:
+    print(f"[Gallery] Failed to create index: {e}")
+
+# Attendance writes go through a write-behind queue so the inference loop never waits on MongoDB;
+# closed sessions are folded into the daily rollups once written
+attendance_writer = AttendanceWriter(
+    attendance_collection,
+    on_session_closed=lambda sid, fields: record_daily_rollup(attendance_daily_collection, sid, fields),
+    on_flush=lambda seconds: metrics.observe("db", seconds)
+)
+
 # Initialize models
-embedder = FaceNet()
-detector = MTCNN()
+with memory.measure("facenet"):
+    embedder = load_embedder()
+with memory.measure("mtcnn"):
+    detector = MTCNN()
+memory.component("frame_buffer", frame_buffer.nbytes)
+memory.start()
 
 # Flask app
 app = Flask(__name__)
 CORS(app)
+metrics.register(app)
+register_debug_routes(app, worker=lambda: auth_thread, tracer=tracer)
+metrics.gauge("active_sessions", "Attendance sessions in progress", lambda: 1 if auth_active else 0)
+governor.register(metrics)
+metrics.gauge("attendance_queue_sessions", "Attendance sessions waiting to be written",
+              lambda: attendance_writer.stats()["queue_depth"])
 
 
 def align_face(face, output_size=(160, 160)):
@@ -61,20 +106,18 @@ def _state_snapshot():
 
 
 def get_all_user_embeddings():
-    """Get all registered users and their embeddings"""
-    users = list(users_collection.find({"embeddings": {"$exists": True}}))
-    user_data = {}
-    for user in users:
-        if "embeddings" in user:
-            user_data[user["email"]] = {
-                "name": user.get("name", "Unknown"),
-                "embeddings": [np.array(embedding) for embedding in user["embeddings"]]
-            }
-    return user_data
-
-
-def save_attendance_record():
-    """Save/update the attendance document for the current session"""
+    """Load all registered users' embeddings as a FaceGallery (projected, streamed into one matrix)"""
+    with metrics.stage("db"):
+        gallery = load_gallery(users_collection)
+    print(f"[Gallery] Loaded {gallery.load_stats}")
+    metrics.set_gauge("gallery_size", len(gallery), "Registered users in the loaded gallery")
+    metrics.set_gauge("gallery_embeddings", len(gallery.owners), "Embedding rows in the loaded gallery")
+    memory.set_bytes("gallery", gallery.nbytes)
+    return gallery
+
+
+def save_attendance_record(performance=None):
+    """Queue a save/update of the attendance document for the current session (with its performance summary)"""
     snapshot = _state_snapshot()
     current_session_id = snapshot["session_id"]
     current_result = snapshot["auth_result"]
@@ -86,28 +129,19 @@ def save_attendance_record():
         print("[Attendance] No active session_id, skipping save.")
         return
 
-    try:
-        attendance_collection.update_one(
-            {"session_id": current_session_id},
-            {
-                "$set": {
-                    "session_id": current_session_id,
-                    "timestamp": time.time(),
-                    "recognized_users": current_users,
-                    "total_recognized": len(current_users),
-                    "status": "success" if success else "failed",
-                    "message": message
-                }
-            },
-            upsert=True
-        )
-        print(f"[Attendance] Document saved/updated for session {current_session_id}")
-    except Exception as e:
-        print(f"[Attendance] Failed to store: {e}")
+    attendance_writer.close_session(current_session_id, {
+        "timestamp": time.time(),
+        "recognized_users": current_users,
+        "total_recognized": len(current_users),
+        "status": "success" if success else "failed",
+        "message": message,
+        **({"performance": performance} if performance else {})
+    })
+    print(f"[Attendance] Document queued for session {current_session_id}")
 
 
 def add_user_to_session(user):
-    """Add user to in-memory and MongoDB document if not already present"""
+    """Add user to in-memory state and queue it for the MongoDB document if not already present"""
     global recognized_users, session_id
     should_add = False
     current_session_id = None
@@ -117,26 +151,28 @@ def add_user_to_session(user):
             should_add = True
         current_session_id = session_id
     if should_add:
-        try:
-            attendance_collection.update_one(
-                {"session_id": current_session_id},
-                {"$addToSet": {"recognized_users": user}},
-                upsert=True
-            )
-        except Exception as e:
-            print(f"[Attendance] Failed to add user: {e}")
+        attendance_writer.add_user(current_session_id, user)
+        snapshot = _state_snapshot()
+        events.publish("recognition", {
+            "user": user,
+            "recognized_users": snapshot["recognized_users"],
+            "total_recognized": len(snapshot["recognized_users"]),
+            "session_id": current_session_id
+        })
 
 
 def authenticate_multiple_faces(threshold=0.5):
-    global auth_active, stop_flag, cap, current_frame, auth_result, recognized_users, session_id
+    global auth_active, stop_flag, cap, auth_result, recognized_users, session_id
     with state_lock:
         recognized_users.clear()
         auth_result = None
 
+    trace_mark = tracer.mark()
+    perf = metrics.start_session(SessionPerf("multi_face", source=describe_source()))
     try:
-        user_data = get_all_user_embeddings()
-        print(f"[Auth] Found {len(user_data)} registered users in DB")
-        if len(user_data) == 0:
+        gallery = get_all_user_embeddings()
+        print(f"[Auth] Found {len(gallery)} registered users in DB")
+        if len(gallery) == 0:
             with state_lock:
                 auth_result = {
                     "success": False,
@@ -147,13 +183,10 @@ def authenticate_multiple_faces(threshold=0.5):
                 }
             return
 
-        try:
-            cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        except Exception:
-            cap = cv2.VideoCapture(0)
+        cap = open_frame_source()
         if not cap.isOpened():
             with state_lock:
-                auth_result = {"success": False, "message": "Cannot open webcam", "session_id": session_id}
+                auth_result = {"success": False, "message": f"Cannot open {cap.kind} source", "session_id": session_id}
             return
 
         try:
@@ -168,14 +201,19 @@ def authenticate_multiple_faces(threshold=0.5):
         start_time = time.time()
         timeout = 30
 
+        governor.reset()
         while auth_active and not stop_flag.is_set():
-            ret, frame = cap.read()
+            tracer.next_frame()
+            governor.start_frame()
+            ret, frame = metrics.read_frame(cap)
             if not ret:
+                if cap.exhausted:
+                    break
                 continue
 
-            with frame_lock:
-                _, buffer = cv2.imencode('.jpg', frame)
-                current_frame = base64.b64encode(buffer).decode('utf-8')
+            with state_lock:
+                frame_meta = {'recognized_count': len(recognized_users), 'session_id': session_id}
+            frame_buffer.publish(frame, frame_meta)
 
             current_time = time.time() - start_time
 
@@ -191,7 +229,14 @@ def authenticate_multiple_faces(threshold=0.5):
                     }
                 break
 
-            faces = detector.detect_faces(frame)
+            if not governor.should_detect():
+                governor.end_frame(sleep=stop_flag.wait)
+                continue
+
+            with metrics.stage("detect"):
+                faces = detect_faces_scaled(detector, frame, governor.scale)
+            tracer.annotate(faces=len(faces or []))
+            perf.frame_processed(len(faces or []))
             if faces:
                 for face in faces:
                     x1, y1, width, height = face['box']
@@ -201,29 +246,19 @@ def authenticate_multiple_faces(threshold=0.5):
                     if face_pixels.size == 0:
                         continue
 
-                    face_pixels = cv2.cvtColor(face_pixels, cv2.COLOR_BGR2RGB)
-                    face_pixels = align_face(face_pixels)
-                    face_pixels = np.expand_dims(face_pixels, axis=0)
-                    face_embedding = embedder.embeddings(face_pixels).flatten()
-
-                    best_match = None
-                    best_similarity = 0
-                    for email, user_info in user_data.items():
-                        similarities = [cosine_similarity([face_embedding], [stored])[0][0]
-                                        for stored in user_info["embeddings"]]
-                        max_similarity = max(similarities) if similarities else 0
-                        if max_similarity >= threshold and max_similarity > best_similarity:
-                            best_similarity = max_similarity
-                            best_match = {
-                                "email": email,
-                                "name": user_info["name"],
-                                "similarity": max_similarity
-                            }
+                    with tracer.span("crop"):
+                        face_pixels = cv2.cvtColor(face_pixels, cv2.COLOR_BGR2RGB)
+                        face_pixels = align_face(face_pixels)
+                        face_pixels = np.expand_dims(face_pixels, axis=0)
+                    with metrics.stage("embed"):
+                        face_embedding = embedder.embeddings(face_pixels).flatten()
 
+                    with metrics.stage("match"):
+                        best_match = gallery.best_match(face_embedding, threshold)
                     if best_match:
                         add_user_to_session(best_match)
 
-            time.sleep(0.1)
+            governor.end_frame(sleep=stop_flag.wait)
 
         with state_lock:
             if not auth_result:
@@ -249,50 +284,75 @@ def authenticate_multiple_faces(threshold=0.5):
         with state_lock:
             auth_result = {"success": False, "message": f"Error: {str(e)}", "session_id": session_id}
     finally:
-        save_attendance_record()
+        tracer.end_frame()
+        save_attendance_record(performance=metrics.end_session())
         with state_lock:
             auth_active = False
         cleanup_resources()
+        tracer.dump_session(str(session_id), since=trace_mark)
+        events.publish("status", _status_payload())
 
 
 def cleanup_resources():
-    global cap, current_frame
+    global cap
     if cap:
         cap.release()
         cap = None
-    with frame_lock:
-        current_frame = None
+    frame_buffer.clear()
 
 
 def _no_cache_json(payload):
     response = jsonify(payload)
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    response.headers.update(NO_CACHE_HEADERS)
     return response
 
 
+def _is_active():
+    with state_lock:
+        return auth_active
+
+
 @app.route('/current-frame')
 def get_current_frame():
-    global current_frame, auth_active
-    with frame_lock:
-        local_frame = current_frame
+    global auth_active
     with state_lock:
         active = auth_active
         recognized_count = len(recognized_users)
         current_session_id = session_id
-    frame_to_send = local_frame if active else None
-    return _no_cache_json({
+    seq, frame_to_send, modified = conditional_frame(frame_buffer, active, as_base64=True)
+    if not modified:
+        return not_modified(frame_buffer, seq)
+    response = jsonify({
         'frame': frame_to_send,
         'active': active,
         'recognized_count': recognized_count,
-        'session_id': current_session_id
+        'session_id': current_session_id,
+        'seq': seq
     })
+    return tag_frame_response(response, frame_buffer, seq, len(frame_to_send or ''))
 
 
-@app.route('/status')
-def get_status():
-    global auth_result, auth_active, recognized_users
+@app.route('/current-frame.jpg')
+def get_current_frame_jpeg():
+    return jpeg_response(frame_buffer, _is_active())
+
+
+@app.route('/stream')
+def video_stream():
+    return mjpeg_response(frame_buffer, _is_active)
+
+
+@app.route('/frames')
+def push_frames():
+    return push_stream_response(frame_buffer, _is_active)
+
+
+@app.route('/frame-stats')
+def get_frame_stats():
+    return _no_cache_json(frame_buffer.stats())
+
+
+def _status_payload():
     snapshot = _state_snapshot()
     current_result = snapshot["auth_result"]
     current_session_id = snapshot["session_id"]
@@ -302,13 +362,24 @@ def get_status():
         result_with_status = dict(current_result)
         result_with_status.setdefault('status', 'completed' if current_result.get('success') else 'failed')
         result_with_status.setdefault('session_id', current_session_id)
-        return _no_cache_json(result_with_status)
-    return _no_cache_json({
+        return result_with_status
+    return {
         "status": "running" if active else "idle",
         "recognized_users": current_users,
         "total_recognized": len(current_users),
         "session_id": current_session_id
-    })
+    }
+
+
+@app.route('/status')
+def get_status():
+    return _no_cache_json(_status_payload())
+
+
+@app.route('/events')
+def status_events():
+    """Server-Sent Events: status transitions and newly recognized users"""
+    return sse_response(events, _status_payload)
 
 
 @app.route('/stop', methods=['POST'])
@@ -327,11 +398,12 @@ def start_route():
 def health_route():
     with state_lock:
         status = 'running' if auth_active else 'idle'
-    return _no_cache_json({'ok': True, 'status': status})
+    return _no_cache_json({'ok': True, 'status': status, 'attendance_writer': attendance_writer.stats(),
+                           'memory': memory.report(), 'governor': governor.stats(), 'cpu': cpu.effective()})
 
 
 def start_authentication():
-    global auth_active, auth_thread, stop_flag, recognized_users, auth_result, current_frame, session_id
+    global auth_active, auth_thread, stop_flag, recognized_users, auth_result, session_id
 
     with state_lock:
         if auth_active:
@@ -344,18 +416,18 @@ def start_authentication():
 
         # Generate session_id only once per session
         session_id = int(time.time() * 1000)
-    with frame_lock:
-        current_frame = None
+    frame_buffer.clear()
 
     auth_thread = threading.Thread(target=authenticate_multiple_faces)
     auth_thread.daemon = True
     auth_thread.start()
+    events.publish("status", _status_payload())
 
     return {"success": True, "message": "Started", "session_id": session_id}
 
 
 def stop_authentication():
-    global auth_active, stop_flag, current_frame, auth_thread, session_id, recognized_users, auth_result
+    global auth_active, stop_flag, auth_thread, session_id, recognized_users, auth_result
     with state_lock:
         auth_active = False
     stop_flag.set()
@@ -375,9 +447,14 @@ def stop_authentication():
                 "total_recognized": recognized_count,
                 "session_id": session_id
             }
+    events.publish("status", _status_payload())
     save_attendance_record()
+    if not attendance_writer.flush(timeout=3.0):
+        print("[Attendance] Session still queued after stop; will keep retrying in background")
     return {"success": True, "message": "Stopped", "session_id": session_id}
 
 
 if __name__ == "__main__":
+    strip_source_args(sys.argv)
+    print(f"[MultiAuth] Frame source: {describe_source()}")
     app.run(host='0.0.0.0', port=5003, debug=False)
@@ -0,0 +1,111 @@
+// proxy_loadtest.js
+// Compares proxy overhead of the old per-request fetch + AbortController calls
+// against the keep-alive service client, with and without /status coalescing.
+// Runs against an in-process stub upstream, so no Python service is needed.
+//
+// Usage: node proxy_loadtest.js [--requests 5000] [--concurrency 32]
+const http = require('http');
+const { createServiceClient } = require('./service_proxy');
+
+function argValue(name, fallback) {
+  const idx = process.argv.indexOf(`--${name}`);
+  return idx > 0 ? Number(process.argv[idx + 1]) : fallback;
+}
+
+const TOTAL_REQUESTS = argValue('requests', 5000);
+const CONCURRENCY = argValue('concurrency', 32);
+const FRAME_PAYLOAD = JSON.stringify({ frame: 'A'.repeat(60000), active: true, seq: 1 });
+
+function startStubUpstream() {
+  let upstreamHits = 0;
+  const server = http.createServer((req, res) => {
+    upstreamHits += 1;
+    res.setHeader('Content-Type', 'application/json');
+    if (req.url.startsWith('/current-frame')) {
+      res.end(FRAME_PAYLOAD);
+    } else {
+      res.end(JSON.stringify({ active: true, current_count: 3, max_count: 5 }));
+    }
+  });
+  return new Promise((resolve) => {
+    server.listen(0, '127.0.0.1', () => resolve({
+      server,
+      port: server.address().port,
+      hits: () => upstreamHits
+    }));
+  });
+}
+
+// The pre-pooling implementation from server.js, kept here as the baseline
+async function legacyCall(port, path, timeoutMs = 2000) {
+  try {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), timeoutMs);
+    const resp = await fetch(`http://127.0.0.1:${port}${path}`, {
+      method: 'GET',
+      headers: { 'Content-Type': 'application/json' },
+      signal: controller.signal
+    });
+    clearTimeout(timer);
+    const json = await resp.json().catch(() => ({}));
+    return { ok: resp.ok, status: resp.status, json };
+  } catch (error) {
+    return { ok: false, status: 0, json: { error: error.message } };
+  }
+}
+
+function percentile(sorted, p) {
+  if (sorted.length === 0) return 0;
+  return sorted[Math.min(sorted.length - 1, Math.floor((p / 100) * sorted.length))];
+}
+
+async function runScenario(name, upstream, callFn) {
+  const latencies = [];
+  const hitsBefore = upstream.hits();
+  let issued = 0;
+  let failures = 0;
+  const started = process.hrtime.bigint();
+  async function worker() {
+    while (issued < TOTAL_REQUESTS) {
+      issued += 1;
+      const t0 = process.hrtime.bigint();
+      const result = await callFn();
+      latencies.push(Number(process.hrtime.bigint() - t0) / 1e6);
+      if (!result.ok) failures += 1;
+    }
+  }
+  await Promise.all(Array.from({ length: CONCURRENCY }, worker));
+  const elapsedS = Number(process.hrtime.bigint() - started) / 1e9;
+  latencies.sort((a, b) => a - b);
+  return {
+    scenario: name,
+    reqPerSec: Math.round(TOTAL_REQUESTS / elapsedS),
+    p50Ms: percentile(latencies, 50).toFixed(2),
+    p95Ms: percentile(latencies, 95).toFixed(2),
+    p99Ms: percentile(latencies, 99).toFixed(2),
+    upstreamCalls: upstream.hits() - hitsBefore,
+    failures
+  };
+}
+
+async function main() {
+  const upstream = await startStubUpstream();
+  const client = createServiceClient(upstream.port, { host: '127.0.0.1' });
+  const results = [];
+
+  results.push(await runScenario('legacy fetch /status', upstream, () => legacyCall(upstream.port, '/status')));
+  results.push(await runScenario('pooled /status (no coalescing)', upstream, () => client.call('/status', { fresh: true })));
+  results.push(await runScenario('pooled /status (coalesced)', upstream, () => client.call('/status')));
+  results.push(await runScenario('legacy fetch /current-frame', upstream, () => legacyCall(upstream.port, '/current-frame')));
+  results.push(await runScenario('pooled /current-frame', upstream, () => client.call('/current-frame')));
+
+  console.log(`requests=${TOTAL_REQUESTS} concurrency=${CONCURRENCY}`);
+  console.table(results);
+  client.agent.destroy();
+  upstream.server.close();
+}
+
+main().catch((err) => {
+  console.error(err);
+  process.exit(1);
+});
@@ -0,0 +1,262 @@
+"""Re-embed every user from their retained face crops after an embedder change.
+
+`run` streams `face_crops` in _id order, decodes crops in a bounded thread pool,
+embeds them in large batches with the current embedder and writes the vectors to
+`users` as `pending_embeddings` tagged with the new model version. Live
+`embeddings` are left alone, so services on the old version keep working. A
+checkpoint is saved after every batch; an interrupted run resumes from it. A final
+sweep picks up users who re-registered while the job was running.
+
+Cutover: `run` with EMBEDDING_MODEL_VERSION set to the new tag, restart the
+services with the same tag (they match against the pending vectors), then
+`promote` to make the pending vectors live.
+
+Usage: python reembed.py run [--batch-users 128] [--embed-batch 256] [--decode-threads 8]
+                             [--checkpoint reembed_checkpoint.json] [--restart]
+       python reembed.py promote
+       python reembed.py status
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+
+from embedding_store import (
+    CROPS_COLLECTION, DEFAULT_EMBEDDING_MODEL, EMBEDDING_MODEL_VERSION, align_crop, decode_crop, load_embedder,
+)
+from env_config import get_required_env
+
+DEFAULT_CHECKPOINT = "reembed_checkpoint.json"
+
+
+def load_checkpoint(path, model_version):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    # A checkpoint from a different target model says nothing about this run
+    return checkpoint if checkpoint.get("model") == model_version else None
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+class Reembedder:
+    def __init__(self, users_collection, crops_collection, model_version, embed_batch=256, decode_threads=8):
+        self.users = users_collection
+        self.crops = crops_collection
+        self.model_version = model_version
+        self.embed_batch = embed_batch
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_threads)
+        self.embedder = load_embedder()
+        self.stats = {"users": 0, "crops": 0, "unreadable": 0, "empty": 0}
+
+    def _decode(self, entry):
+        crop, box = decode_crop(entry)
+        if crop is None:
+            return None
+        return align_crop(crop, box)
+
+    def decode_batch(self, docs):
+        """Submit decoding of every crop in docs; returns [(email, [futures])]."""
+        return [(doc["email"], [self.decode_pool.submit(self._decode, entry) for entry in doc.get("crops", [])])
+                for doc in docs]
+
+    def embed_batch_docs(self, pending):
+        """Embed one decoded batch and write the vectors as pending embeddings."""
+        faces, owners = [], []
+        for email, futures in pending:
+            for future in futures:
+                face = future.result()
+                if face is None:
+                    self.stats["unreadable"] += 1
+                    continue
+                faces.append(face)
+                owners.append(email)
+
+        embeddings_by_user = {}
+        for start in range(0, len(faces), self.embed_batch):
+            vectors = self.embedder.embeddings(np.stack(faces[start:start + self.embed_batch]))
+            for email, vector in zip(owners[start:start + self.embed_batch], vectors):
+                embeddings_by_user.setdefault(email, []).append(vector.tolist())
+        self.stats["crops"] += len(faces)
+
+        operations = []
+        for email, _ in pending:
+            embeddings = embeddings_by_user.get(email)
+            if not embeddings:
+                self.stats["empty"] += 1
+                continue
+            operations.append(UpdateOne(
+                # Users already registered with the target model have nothing to regenerate
+                {"email": email, "embedding_model": {"$ne": self.model_version}},
+                {"$set": {"pending_embeddings": embeddings, "pending_embedding_model": self.model_version}},
+            ))
+        if operations:
+            self.users.bulk_write(operations, ordered=False)
+        self.stats["users"] += len(pending)
+
+    def _finish(self, pending, on_batch):
+        last_id, submitted = pending
+        self.embed_batch_docs(submitted)
+        if on_batch:
+            on_batch(last_id)
+
+    def process(self, cursor, batch_users, on_batch=None):
+        """Embed every crop document from cursor, decoding the next batch while the current one embeds."""
+        pending = None
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) < batch_users:
+                continue
+            submitted = (batch[-1]["_id"], self.decode_batch(batch))
+            if pending is not None:
+                self._finish(pending, on_batch)
+            pending, batch = submitted, []
+        if batch:
+            submitted = (batch[-1]["_id"], self.decode_batch(batch))
+            if pending is not None:
+                self._finish(pending, on_batch)
+            pending = submitted
+        if pending is not None:
+            self._finish(pending, on_batch)
+
+    def missing_emails(self):
+        """Registered users with no vectors from the target model, live or pending."""
+        cursor = self.users.find(
+            {
+                "embeddings": {"$exists": True},
+                "embedding_model": {"$ne": self.model_version},
+                "pending_embedding_model": {"$ne": self.model_version},
+            },
+            {"_id": 0, "email": 1},
+        )
+        return [doc["email"] for doc in cursor]
+
+
+def _db():
+    client = MongoClient(get_required_env("MONGODB_URI"))
+    return client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
+
+
+def run(args):
+    model_version = EMBEDDING_MODEL_VERSION
+    if model_version == DEFAULT_EMBEDDING_MODEL:
+        print(f"[Reembed] EMBEDDING_MODEL_VERSION is the default ({DEFAULT_EMBEDDING_MODEL}); "
+              "set it to the new model's tag first")
+        sys.exit(1)
+
+    db = _db()
+    crops = db[CROPS_COLLECTION]
+    checkpoint = None if args.restart else load_checkpoint(args.checkpoint, model_version)
+    if checkpoint is None:
+        checkpoint = {"model": model_version, "last_id": None, "users": 0, "crops": 0}
+    query = {"_id": {"$gt": ObjectId(checkpoint["last_id"])}} if checkpoint["last_id"] else {}
+    total = crops.count_documents({})
+    remaining = crops.count_documents(query)
+    print(f"[Reembed] Target {model_version}: {remaining}/{total} crop documents left"
+          + (f" (resuming after {checkpoint['last_id']})" if checkpoint["last_id"] else ""))
+
+    reembedder = Reembedder(db["users"], crops, model_version, args.embed_batch, args.decode_threads)
+    started = time.perf_counter()
+    users_before, crops_before = checkpoint["users"], checkpoint["crops"]
+
+    def on_batch(last_id):
+        checkpoint.update(last_id=str(last_id), users=users_before + reembedder.stats["users"],
+                          crops=crops_before + reembedder.stats["crops"])
+        save_checkpoint(args.checkpoint, checkpoint)
+        elapsed = time.perf_counter() - started
+        print(f"[Reembed] {checkpoint['users']}/{total} users | {reembedder.stats['crops']} crops this run "
+              f"| {reembedder.stats['crops'] / elapsed if elapsed else 0:.1f} crops/s", flush=True)
+
+    try:
+        cursor = crops.find(query, {"email": 1, "crops": 1}, batch_size=args.batch_users).sort("_id", 1)
+        reembedder.process(cursor, args.batch_users, on_batch)
+
+        # Users who re-registered mid-run kept their crop document's _id, which may be behind the checkpoint
+        missing = reembedder.missing_emails()
+        if missing:
+            print(f"[Reembed] Sweeping {len(missing)} user(s) without {model_version} vectors")
+            for start in range(0, len(missing), args.batch_users):
+                chunk = missing[start:start + args.batch_users]
+                reembedder.process(crops.find({"email": {"$in": chunk}}, {"email": 1, "crops": 1}), args.batch_users)
+    except KeyboardInterrupt:
+        print("[Reembed] Interrupted; re-run to resume from the checkpoint")
+        sys.exit(1)
+    finally:
+        reembedder.decode_pool.shutdown(wait=False)
+
+    elapsed = time.perf_counter() - started
+    still_missing = len(reembedder.missing_emails())
+    print(f"[Reembed] Done in {elapsed:.1f}s: {reembedder.stats['users']} users, {reembedder.stats['crops']} crops, "
+          f"{reembedder.stats['unreadable']} unreadable crops, {reembedder.stats['empty']} users without a usable crop; "
+          f"{still_missing} registered user(s) still lack {model_version} vectors")
+    if still_missing == 0:
+        print(f"[Reembed] Restart the services with EMBEDDING_MODEL_VERSION={model_version}, then run `promote`")
+
+
+def promote(args):
+    """Make pending vectors live. Run once every service is on the new EMBEDDING_MODEL_VERSION."""
+    model_version = EMBEDDING_MODEL_VERSION
+    result = _db()["users"].update_many(
+        {"pending_embedding_model": model_version},
+        [
+            {"$set": {
+                "embeddings": "$pending_embeddings",
+                "embedding_model": "$pending_embedding_model",
+                "face_updated_at": "$$NOW",
+            }},
+            {"$unset": ["pending_embeddings", "pending_embedding_model"]},
+        ],
+    )
+    print(f"[Reembed] Promoted {result.modified_count} user(s) to {model_version}")
+
+
+def status(args):
+    db = _db()
+    pipeline = [
+        {"$match": {"embeddings": {"$exists": True}}},
+        {"$group": {
+            "_id": {
+                "live": {"$ifNull": ["$embedding_model", DEFAULT_EMBEDDING_MODEL]},
+                "pending": {"$ifNull": ["$pending_embedding_model", None]},
+            },
+            "users": {"$sum": 1},
+        }},
+        {"$sort": {"users": -1}},
+    ]
+    print(f"[Reembed] Services use {EMBEDDING_MODEL_VERSION}")
+    for row in db["users"].aggregate(pipeline):
+        pending = row["_id"]["pending"]
+        print(f"  {row['users']:>8} user(s) live {row['_id']['live']}" + (f", pending {pending}" if pending else ""))
+    print(f"  {db[CROPS_COLLECTION].estimated_document_count():>8} crop document(s)")
+    if os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as f:
+            print(f"[Reembed] Checkpoint: {f.read().strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed users from retained face crops")
+    parser.add_argument("command", choices=["run", "promote", "status"])
+    parser.add_argument("--batch-users", type=int, default=128, help="crop documents per checkpointed batch")
+    parser.add_argument("--embed-batch", type=int, default=256, help="faces per embedder call")
+    parser.add_argument("--decode-threads", type=int, default=min(16, (os.cpu_count() or 4) * 2))
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first crop")
+    args = parser.parse_args()
+    {"run": run, "promote": promote, "status": status}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,20 @@ const bcrypt = require('bcrypt');
 const { MongoClient } = require('mongodb');
 const path = require('path');
 const fs = require('fs');
+const http = require('http');
+const { createServiceClient } = require('./service_proxy');
 
 const app = express();
 app.use(cors());
 app.use(bodyParser.json());
-// Polyfill fetch for Node.js if not available
-if (typeof fetch !== 'function') {
-  global.fetch = (...args) => import('node-fetch').then(({default: fetch}) => fetch(...args));
-}
+
+// Per-route request counters, reported by /frame-channel/stats to compare polling vs push traffic
+const requestCounts = {};
+app.use((req, res, next) => {
+  const key = `${req.method} ${req.path}`;
+  requestCounts[key] = (requestCounts[key] || 0) + 1;
+  next();
+});
 
 function loadEnvFile(envPath) {
   if (!fs.existsSync(envPath)) return;
@@ -38,71 +44,19 @@ function loadEnvFile(envPath) {
 
 loadEnvFile(path.join(__dirname, '.env'));
 
+// Keep-alive clients for the Python stream services (see service_proxy.js)
+const registrationService = createServiceClient(5001);
+const multiFaceService = createServiceClient(5003);
+const crowdService = createServiceClient(5004);
+
 // Best-effort request to stop the multi-face stream server if it's already running
 async function stopMultiFaceServerIfRunning() {
-  const stopUrl = 'http://localhost:5003/stop';
-  try {
-    // Prefer global fetch if available (Node 18+)
-    if (typeof fetch === 'function') {
-      const controller = new AbortController();
-      const timeout = setTimeout(() => controller.abort(), 1500);
-      try {
-        await fetch(stopUrl, { method: 'POST', signal: controller.signal });
-      } finally {
-        clearTimeout(timeout);
-      }
-    } else {
-      // Fallback: fire-and-forget using http.request
-      const http = require('http');
-      const req = http.request(
-        stopUrl,
-        { method: 'POST', timeout: 1500 },
-        () => {}
-      );
-      req.on('error', () => {});
-      req.end();
-    }
-  } catch (_) {
-    // Ignore errors – server may not be running
-  }
+  // Errors are normalized by the client - server may not be running
+  await multiFaceService.call('/stop', { method: 'POST', timeoutMs: 1500 });
 }
 
 async function callMultiFace(path, options = {}) {
-  const url = `http://localhost:5003${path}`;
-  const timeoutMs = options.timeoutMs ?? 1500;
-  const method = options.method ?? 'GET';
-  const body = options.body ? JSON.stringify(options.body) : undefined;
-  const headers = { 'Content-Type': 'application/json', ...(options.headers || {}) };
-  if (typeof fetch === 'function') {
-    const controller = new AbortController();
-    const timer = setTimeout(() => controller.abort(), timeoutMs);
-    try {
-      const resp = await fetch(url, { method, body, headers, signal: controller.signal });
-      const json = await resp.json().catch(() => ({}));
-      return { ok: resp.ok, status: resp.status, json };
-    } catch (err) {
-      // Normalize network/timeout errors into a non-throwing response
-      return { ok: false, status: 0, json: { error: err?.message || 'fetch_failed' } };
-    } finally {
-      clearTimeout(timer);
-    }
-  } else {
-    // Fallback: very simple http(s) request without JSON parsing robustness
-    return new Promise((resolve) => {
-      const http = require('http');
-      const req = http.request(url, { method, timeout: timeoutMs, headers }, (res) => {
-        let data = '';
-        res.on('data', (chunk) => (data += chunk.toString()));
-        res.on('end', () => {
-          try { resolve({ ok: res.statusCode >= 200 && res.statusCode < 300, status: res.statusCode, json: JSON.parse(data || '{}') }); }
-          catch { resolve({ ok: res.statusCode >= 200 && res.statusCode < 300, status: res.statusCode, json: {} }); }
-        });
-      });
-      req.on('error', () => resolve({ ok: false, status: 0, json: {} }));
-      if (body) req.write(body);
-      req.end();
-    });
-  }
+  return multiFaceService.call(path, { timeoutMs: 1500, ...options });
 }
 
 function sleep(ms) { return new Promise((r) => setTimeout(r, ms)); }
@@ -252,42 +206,297 @@ const REGISTRATION_PORT = 5001;
 
 // Utility to communicate with the registration stream service
 async function callRegistrationStream(path, options = {}) {
-  const url = `http://localhost:${REGISTRATION_PORT}${path}`;
-  try {
-    const controller = new AbortController();
-    const timeout = setTimeout(() => controller.abort(), options.timeoutMs || 2000);
-    const response = await fetch(url, {
-      method: options.method || 'GET',
-      headers: { 'Content-Type': 'application/json', ...(options.headers || {}) },
-      body: options.body ? JSON.stringify(options.body) : undefined,
-      signal: controller.signal
-    });
-    clearTimeout(timeout);
-    const json = await response.json().catch(() => ({}));
-    return { ok: response.ok, status: response.status, json };
-  } catch (error) {
-    return { ok: false, status: 0, json: { error: error.message } };
-  }
+  return registrationService.call(path, options);
 }
 
 async function callCrowdStream(path, options = {}) {
-  const url = `http://localhost:5004${path}`;
-  const timeoutMs = options.timeoutMs ?? 2000;
-  const method = options.method ?? 'GET';
-  const body = options.body ? JSON.stringify(options.body) : undefined;
-  const headers = { 'Content-Type': 'application/json', ...(options.headers || {}) };
-  try {
-    const controller = new AbortController();
-    const timer = setTimeout(() => controller.abort(), timeoutMs);
-    const resp = await fetch(url, { method, body, headers, signal: controller.signal });
-    clearTimeout(timer);
-    const json = await resp.json().catch(() => ({}));
-    return { ok: resp.ok, status: resp.status, json };
-  } catch (error) {
-    return { ok: false, status: 0, json: { error: error.message } };
+  return crowdService.call(path, options);
+}
+
+// --- Frame push channel ---
+// Each Python service pushes every new frame once on GET /frames as length-prefixed
+// binary records (4-byte header length, JSON header, JPEG). server.js keeps a single
+// upstream stream per service while browsers are subscribed and fans records out to
+// them over chunked HTTP responses, so no per-frame requests reach Python.
+const FRAME_SERVICE_PORTS = {
+  registration: REGISTRATION_PORT,
+  'single-face': 5002,
+  'multi-face': 5003,
+  crowd: 5004
+};
+// Drop frames for a browser whose socket buffer holds more than this (slow client)
+const FRAME_CLIENT_MAX_BUFFER = 2 * 1024 * 1024;
+const frameChannels = {};
+
+function getFrameChannel(service) {
+  if (!frameChannels[service]) {
+    frameChannels[service] = {
+      clients: new Set(),
+      upstream: null,
+      reconnectTimer: null,
+      stats: {
+        upstreamConnects: 0,
+        framesIn: 0,
+        framesOut: 0,
+        framesDropped: 0,
+        bytesOut: 0,
+        relayLatencyMsSum: 0,
+        clientLatencyMsSum: 0,
+        clientLatencySamples: 0,
+        clientLatencyMsMax: 0
+      }
+    };
   }
+  return frameChannels[service];
+}
+
+function broadcastFrameRecord(channel, record, header) {
+  const { stats } = channel;
+  if (header.size > 0) {
+    stats.framesIn += 1;
+    if (typeof header.ts === 'number') {
+      stats.relayLatencyMsSum += Math.max(0, Date.now() - header.ts * 1000);
+    }
+  }
+  for (const client of channel.clients) {
+    if (header.size > 0 && client.writableLength > FRAME_CLIENT_MAX_BUFFER) {
+      stats.framesDropped += 1;
+      continue;
+    }
+    client.write(record);
+    if (header.size > 0) {
+      stats.framesOut += 1;
+      stats.bytesOut += record.length;
+    }
+  }
+}
+
+function connectFrameUpstream(service) {
+  const channel = getFrameChannel(service);
+  if (channel.upstream || channel.clients.size === 0) return;
+  channel.stats.upstreamConnects += 1;
+  let pending = Buffer.alloc(0);
+  const upstream = http.get(
+    { host: 'localhost', port: FRAME_SERVICE_PORTS[service], path: '/frames' },
+    (resp) => {
+      resp.on('data', (chunk) => {
+        pending = pending.length ? Buffer.concat([pending, chunk]) : chunk;
+        while (pending.length >= 4) {
+          const headerLength = pending.readUInt32BE(0);
+          if (pending.length < 4 + headerLength) break;
+          let header;
+          try {
+            header = JSON.parse(pending.subarray(4, 4 + headerLength).toString('utf8'));
+          } catch {
+            upstream.destroy();
+            return;
+          }
+          const total = 4 + headerLength + (header.size || 0);
+          if (pending.length < total) break;
+          broadcastFrameRecord(channel, pending.subarray(0, total), header);
+          pending = pending.subarray(total);
+        }
+      });
+      resp.on('end', () => upstream.destroy());
+    }
+  );
+  upstream.on('error', () => {});
+  upstream.on('close', () => {
+    channel.upstream = null;
+    // Service not up yet or restarted: retry while anyone is still watching
+    if (channel.clients.size > 0 && !channel.reconnectTimer) {
+      channel.reconnectTimer = setTimeout(() => {
+        channel.reconnectTimer = null;
+        connectFrameUpstream(service);
+      }, 500);
+    }
+  });
+  channel.upstream = upstream;
+}
+
+app.get('/frames/:service', (req, res) => {
+  const { service } = req.params;
+  if (!FRAME_SERVICE_PORTS[service]) {
+    return res.status(404).json({ message: `Unknown frame service: ${service}` });
+  }
+  const channel = getFrameChannel(service);
+  res.status(200).set({
+    'Content-Type': 'application/octet-stream',
+    'Cache-Control': 'no-store',
+    'X-Accel-Buffering': 'no'
+  });
+  res.flushHeaders();
+  channel.clients.add(res);
+  connectFrameUpstream(service);
+  res.on('close', () => {
+    channel.clients.delete(res);
+    if (channel.clients.size === 0 && channel.upstream) {
+      // Nobody watching: close upstream so the service stops encoding frames
+      channel.upstream.destroy();
+    }
+  });
+});
+
+// Browsers report end-to-end latency (capture timestamp -> frame decoded) in batches
+app.post('/frames/:service/latency', (req, res) => {
+  const { service } = req.params;
+  if (!FRAME_SERVICE_PORTS[service]) {
+    return res.status(404).json({ message: `Unknown frame service: ${service}` });
+  }
+  const { count, sumMs, maxMs } = req.body || {};
+  if (Number.isFinite(count) && count > 0 && Number.isFinite(sumMs)) {
+    const { stats } = getFrameChannel(service);
+    stats.clientLatencySamples += count;
+    stats.clientLatencyMsSum += sumMs;
+    stats.clientLatencyMsMax = Math.max(stats.clientLatencyMsMax, Number(maxMs) || 0);
+  }
+  res.status(204).end();
+});
+
+app.get('/proxy/stats', (req, res) => {
+  res.json({
+    registration: registrationService.stats,
+    'multi-face': multiFaceService.stats,
+    crowd: crowdService.stats
+  });
+});
+
+app.get('/frame-channel/stats', (req, res) => {
+  const services = {};
+  for (const [service, channel] of Object.entries(frameChannels)) {
+    const { stats } = channel;
+    services[service] = {
+      clients: channel.clients.size,
+      upstreamConnected: Boolean(channel.upstream),
+      upstreamConnects: stats.upstreamConnects,
+      framesIn: stats.framesIn,
+      framesOut: stats.framesOut,
+      framesDropped: stats.framesDropped,
+      bytesOut: stats.bytesOut,
+      avgRelayLatencyMs: stats.framesIn ? stats.relayLatencyMsSum / stats.framesIn : null,
+      avgEndToEndLatencyMs: stats.clientLatencySamples ? stats.clientLatencyMsSum / stats.clientLatencySamples : null,
+      maxEndToEndLatencyMs: stats.clientLatencyMsMax
+    };
+  }
+  res.json({ services, requestCounts });
+});
+
+// --- Status event relay ---
+// Each Python service streams status transitions and count/recognition deltas as
+// Server-Sent Events on GET /events. Like frames, server.js holds one upstream
+// stream per service while browsers listen and replays the latest status event
+// to late subscribers, so pages no longer poll /status.
+const eventChannels = {};
+
+function getEventChannel(service) {
+  if (!eventChannels[service]) {
+    eventChannels[service] = {
+      clients: new Set(),
+      upstream: null,
+      reconnectTimer: null,
+      lastStatus: null,
+      upstreamDown: false,
+      stats: { upstreamConnects: 0, eventsIn: 0, eventsOut: 0 }
+    };
+  }
+  return eventChannels[service];
+}
+
+function broadcastEvent(channel, block) {
+  const message = `${block}\n\n`;
+  if (/^event: status$/m.test(block)) {
+    // Drop the id so a replay to a late subscriber does not confuse Last-Event-ID
+    channel.lastStatus = message.replace(/^id: .*\n/m, '');
+  }
+  if (!block.startsWith(':')) channel.stats.eventsIn += 1;
+  for (const client of channel.clients) {
+    client.write(message);
+    if (!block.startsWith(':')) channel.stats.eventsOut += 1;
+  }
+}
+
+function connectEventUpstream(service) {
+  const channel = getEventChannel(service);
+  if (channel.upstream || channel.clients.size === 0) return;
+  channel.stats.upstreamConnects += 1;
+  let pending = '';
+  // agent: false keeps this long-lived stream out of the pooled service sockets
+  const upstream = http.get(
+    { host: 'localhost', port: FRAME_SERVICE_PORTS[service], path: '/events', agent: false },
+    (resp) => {
+      channel.upstreamDown = false;
+      resp.setEncoding('utf8');
+      resp.on('data', (chunk) => {
+        pending += chunk;
+        let boundary = pending.indexOf('\n\n');
+        while (boundary >= 0) {
+          broadcastEvent(channel, pending.slice(0, boundary));
+          pending = pending.slice(boundary + 2);
+          boundary = pending.indexOf('\n\n');
+        }
+      });
+      resp.on('end', () => upstream.destroy());
+    }
+  );
+  upstream.on('error', () => {});
+  upstream.on('close', () => {
+    channel.upstream = null;
+    channel.lastStatus = null;
+    if (channel.clients.size > 0 && !channel.upstreamDown) {
+      // Once per outage, so the pages stop waiting on a service that went away;
+      // the retries below keep the channel open for when it comes back
+      channel.upstreamDown = true;
+      broadcastEvent(channel, `event: status\ndata: ${JSON.stringify({
+        status: 'error', success: false, message: 'Service unavailable'
+      })}`);
+    }
+    if (channel.clients.size > 0 && !channel.reconnectTimer) {
+      channel.reconnectTimer = setTimeout(() => {
+        channel.reconnectTimer = null;
+        connectEventUpstream(service);
+      }, 1000);
+    }
+  });
+  channel.upstream = upstream;
 }
 
+app.get('/events/:service', (req, res) => {
+  const { service } = req.params;
+  if (!FRAME_SERVICE_PORTS[service]) {
+    return res.status(404).json({ message: `Unknown event service: ${service}` });
+  }
+  const channel = getEventChannel(service);
+  res.status(200).set({
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+  });
+  res.flushHeaders();
+  // Reconnect quickly when a service restarts; the browser's EventSource retries on its own
+  res.write('retry: 1000\n\n');
+  if (channel.lastStatus) res.write(channel.lastStatus);
+  channel.clients.add(res);
+  connectEventUpstream(service);
+  res.on('close', () => {
+    channel.clients.delete(res);
+    if (channel.clients.size === 0 && channel.upstream) {
+      channel.upstream.destroy();
+    }
+  });
+});
+
+app.get('/event-channel/stats', (req, res) => {
+  const services = {};
+  for (const [service, channel] of Object.entries(eventChannels)) {
+    services[service] = {
+      clients: channel.clients.size,
+      upstreamConnected: Boolean(channel.upstream),
+      ...channel.stats
+    };
+  }
+  res.json({ services });
+});
+
 // Endpoint to start the face registration stream
 app.post('/register-face/start', async (req, res) => {
   if (!ensureDbReady(res)) return;
@@ -368,10 +577,14 @@ app.get('/register-face/status', async (req, res) => {
   res.status(result.status || 500).json({ status, message, progress });
 });
 
-// Endpoint to get the current camera frame
-app.get('/register-face/current-frame', async (req, res) => {
-  const result = await callRegistrationStream('/current-frame');
-  res.status(result.status || 500).json(result.json);
+// Endpoints to get the current camera frame, piped without buffering.
+// Query strings (?after=&wait=) and If-None-Match pass through for conditional fetches.
+app.get('/register-face/current-frame', (req, res) => {
+  registrationService.pipe(req.originalUrl.replace('/register-face', ''), req, res);
+});
+
+app.get('/register-face/current-frame.jpg', (req, res) => {
+  registrationService.pipe(req.originalUrl.replace('/register-face', ''), req, res);
 });
 
 // Endpoint to stop the registration process (always return success)
@@ -585,17 +798,14 @@ app.post('/crowd-counting/start', async (req, res) => {
     });
     python.unref?.();
 
-    // Wait briefly for service health
+    // Wait briefly for the service to report active; a successful /status implies health
     let started = false;
     for (let i = 0; i < 12; i++) {
       await sleep(250);
-      const h = await callCrowdStream('/health', { timeoutMs: 800 });
-      if (h.ok) {
-        const s = await callCrowdStream('/status', { timeoutMs: 800 });
-        if (s.ok && s.json?.active) {
-          started = true;
-          break;
-        }
+      const s = await callCrowdStream('/status', { timeoutMs: 800, fresh: true });
+      if (s.ok && s.json?.active) {
+        started = true;
+        break;
       }
     }
 
@@ -711,6 +921,11 @@ app.get('/crowd-counting/status', async (req, res) => {
   }
 });
 
+// Crowd count history (?from=&to=&resolution=), served by the crowd service from its time-series tiers
+app.get('/crowd-counting/history', (req, res) => {
+  crowdService.pipe(req.originalUrl.replace('/crowd-counting', ''), req, res);
+});
+
 // Legacy endpoint for backward compatibility
 app.post('/crowd-counting', async (req, res) => {
   try {
@@ -756,6 +971,221 @@ app.post('/crowd-counting', async (req, res) => {
   }
 });
 
+// --- Attendance queries ---
+// Backed by the indexes from attendance_rollups.py: (recognized_users.email, timestamp) and
+// (timestamp) on attendances, and unique (date) on the attendance_daily rollups maintained
+// by multi_face_stream.py when a session closes.
+const ATTENDANCE_MAX_LIMIT = 1000;
+
+// Accepts epoch seconds or anything Date can parse; returns epoch seconds or undefined
+function parseTimeParam(value) {
+  if (value === undefined || value === '') return undefined;
+  const numeric = Number(value);
+  if (Number.isFinite(numeric)) return numeric;
+  const parsed = Date.parse(value);
+  return Number.isNaN(parsed) ? NaN : parsed / 1000;
+}
+
+function timeRangeFilter(req) {
+  const from = parseTimeParam(req.query.from);
+  const to = parseTimeParam(req.query.to);
+  if (Number.isNaN(from) || Number.isNaN(to)) return null;
+  const range = {};
+  if (from !== undefined) range.$gte = from;
+  if (to !== undefined) range.$lt = to;
+  return range;
+}
+
+function queryLimit(req, fallback = 100) {
+  const limit = parseInt(req.query.limit, 10);
+  return Number.isInteger(limit) && limit > 0 ? Math.min(limit, ATTENDANCE_MAX_LIMIT) : fallback;
+}
+
+// Sessions a user was recognized in, newest first
+app.get('/attendance/users/:email', async (req, res) => {
+  if (!ensureDbReady(res)) return;
+  const range = timeRangeFilter(req);
+  if (!range) return res.status(400).json({ message: 'Invalid from/to parameter' });
+  try {
+    const filter = { 'recognized_users.email': req.params.email };
+    if (Object.keys(range).length) filter.timestamp = range;
+    const sessions = await db.collection('attendances')
+      .find(filter, {
+        projection: { _id: 0, session_id: 1, timestamp: 1, status: 1, total_recognized: 1, 'recognized_users.$': 1 }
+      })
+      .sort({ timestamp: -1 })
+      .limit(queryLimit(req))
+      .toArray();
+    res.json({
+      email: req.params.email,
+      sessions: sessions.map(({ recognized_users: matched, ...session }) => ({
+        ...session,
+        similarity: matched?.[0]?.similarity
+      }))
+    });
+  } catch (error) {
+    console.error('Attendance history error:', error);
+    res.status(500).json({ message: 'Internal server error' });
+  }
+});
+
+// Sessions in a time range, newest first (without the embedded user lists)
+app.get('/attendance/sessions', async (req, res) => {
+  if (!ensureDbReady(res)) return;
+  const range = timeRangeFilter(req);
+  if (!range) return res.status(400).json({ message: 'Invalid from/to parameter' });
+  try {
+    const filter = Object.keys(range).length ? { timestamp: range } : { timestamp: { $exists: true } };
+    const sessions = await db.collection('attendances')
+      .find(filter, { projection: { _id: 0, recognized_users: 0 } })
+      .sort({ timestamp: -1 })
+      .limit(queryLimit(req))
+      .toArray();
+    res.json({ sessions });
+  } catch (error) {
+    console.error('Attendance sessions error:', error);
+    res.status(500).json({ message: 'Internal server error' });
+  }
+});
+
+// Per-day headcounts from the rollup documents (from/to are YYYY-MM-DD, UTC)
+app.get('/attendance/daily', async (req, res) => {
+  if (!ensureDbReady(res)) return;
+  const { from, to } = req.query;
+  const datePattern = /^\d{4}-\d{2}-\d{2}$/;
+  if ((from && !datePattern.test(from)) || (to && !datePattern.test(to))) {
+    return res.status(400).json({ message: 'from/to must be YYYY-MM-DD' });
+  }
+  try {
+    const match = {};
+    if (from || to) {
+      match.date = {};
+      if (from) match.date.$gte = from;
+      if (to) match.date.$lte = to;
+    }
+    const days = await db.collection('attendance_daily')
+      .aggregate([
+        { $match: match },
+        { $sort: { date: 1 } },
+        { $limit: queryLimit(req, 366) },
+        {
+          $project: {
+            _id: 0,
+            date: 1,
+            sessions: 1,
+            successful_sessions: 1,
+            recognitions: 1,
+            headcount: { $size: { $ifNull: ['$users', []] } }
+          }
+        }
+      ])
+      .toArray();
+    res.json({ days });
+  } catch (error) {
+    console.error('Attendance daily error:', error);
+    res.status(500).json({ message: 'Internal server error' });
+  }
+});
+
+// --- Session performance ---
+// Every multi-face and crowd session stores a `performance` summary (frame counts, effective FPS,
+// per-stage p50/p95/p99, warm-up, host) next to its result; see session_perf.py.
+const PERFORMANCE_COLLECTIONS = { multi_face: 'attendances', crowd_counting: 'crowd_sessions' };
+
+function performanceSources(req) {
+  const { service } = req.query;
+  if (!service) return Object.entries(PERFORMANCE_COLLECTIONS);
+  return PERFORMANCE_COLLECTIONS[service] ? [[service, PERFORMANCE_COLLECTIONS[service]]] : null;
+}
+
+function performanceFilter(req, range) {
+  const filter = { performance: { $exists: true } };
+  if (Object.keys(range).length) filter.timestamp = range;
+  if (req.query.host) filter['performance.host'] = req.query.host;
+  if (req.query.site) filter['performance.site'] = req.query.site;
+  return filter;
+}
+
+// Session summaries, newest first (?service=&host=&site=&from=&to=&limit=)
+app.get('/performance/sessions', async (req, res) => {
+  if (!ensureDbReady(res)) return;
+  const range = timeRangeFilter(req);
+  if (!range) return res.status(400).json({ message: 'Invalid from/to parameter' });
+  const sources = performanceSources(req);
+  if (!sources) return res.status(400).json({ message: `service must be one of ${Object.keys(PERFORMANCE_COLLECTIONS).join(', ')}` });
+  try {
+    const limit = queryLimit(req);
+    const filter = performanceFilter(req, range);
+    const results = await Promise.all(sources.map(([service, collection]) => db.collection(collection)
+      .find(filter, { projection: { _id: 0, session_id: 1, timestamp: 1, performance: 1 } })
+      .sort({ timestamp: -1 })
+      .limit(limit)
+      .toArray()
+      .then(sessions => sessions.map(session => ({ service, ...session })))));
+    const sessions = results.flat().sort((a, b) => b.timestamp - a.timestamp).slice(0, limit);
+    res.json({ sessions });
+  } catch (error) {
+    console.error('Performance sessions error:', error);
+    res.status(500).json({ message: 'Internal server error' });
+  }
+});
+
+// Per site/host averages, slowest first, for spotting degraded deployments (?service=&from=&to=)
+app.get('/performance/hosts', async (req, res) => {
+  if (!ensureDbReady(res)) return;
+  const range = timeRangeFilter(req);
+  if (!range) return res.status(400).json({ message: 'Invalid from/to parameter' });
+  const sources = performanceSources(req);
+  if (!sources) return res.status(400).json({ message: `service must be one of ${Object.keys(PERFORMANCE_COLLECTIONS).join(', ')}` });
+  try {
+    const filter = performanceFilter(req, range);
+    const results = await Promise.all(sources.map(([service, collection]) => db.collection(collection)
+      .aggregate([
+        { $match: filter },
+        {
+          $group: {
+            _id: { site: '$performance.site', host: '$performance.host' },
+            sessions: { $sum: 1 },
+            last_session: { $max: '$timestamp' },
+            effective_fps: { $avg: '$performance.effective_fps' },
+            warmup_s: { $avg: '$performance.warmup_s' },
+            detect_p95_ms: { $avg: '$performance.stages.detect.p95_ms' },
+            embed_p95_ms: { $avg: '$performance.stages.embed.p95_ms' },
+            frames_captured: { $sum: '$performance.frames_captured' },
+            frames_dropped: { $sum: '$performance.frames_dropped' }
+          }
+        },
+        {
+          $project: {
+            _id: 0,
+            site: '$_id.site',
+            host: '$_id.host',
+            sessions: 1,
+            last_session: 1,
+            effective_fps: { $round: ['$effective_fps', 2] },
+            warmup_s: { $round: ['$warmup_s', 2] },
+            detect_p95_ms: { $round: ['$detect_p95_ms', 1] },
+            embed_p95_ms: { $round: ['$embed_p95_ms', 1] },
+            drop_rate: {
+              $cond: [
+                { $gt: [{ $add: ['$frames_captured', '$frames_dropped'] }, 0] },
+                { $round: [{ $divide: ['$frames_dropped', { $add: ['$frames_captured', '$frames_dropped'] }] }, 4] },
+                null
+              ]
+            }
+          }
+        }
+      ])
+      .toArray()
+      .then(hosts => hosts.map(host => ({ service, ...host })))));
+    const hosts = results.flat().sort((a, b) => (a.effective_fps ?? Infinity) - (b.effective_fps ?? Infinity));
+    res.json({ hosts });
+  } catch (error) {
+    console.error('Performance hosts error:', error);
+    res.status(500).json({ message: 'Internal server error' });
+  }
+});
+
 // Get available recognition modes
 app.get('/recognition-modes', (req, res) => {
   res.json({
@@ -823,7 +1253,20 @@ app.listen(3001, () => {
   console.log('   - POST /crowd-counting/stop - Stop crowd counting');
   console.log('   - POST /crowd-counting/force-stop - Force stop crowd counting');
   console.log('   - GET /crowd-counting/status - Get crowd counting status');
+  console.log('   - GET /crowd-counting/history - Crowd count history (1s/1m/1h tiers)');
   console.log('   - POST /crowd-counting - Legacy crowd counting endpoint');
+  console.log('   Attendance:');
+  console.log('   - GET /attendance/users/:email - Sessions a user attended');
+  console.log('   - GET /attendance/sessions - Sessions in a time range');
+  console.log('   - GET /attendance/daily - Per-day headcounts');
+  console.log('   - GET /performance/sessions - Per-session performance summaries');
+  console.log('   - GET /performance/hosts - Session performance averaged per site/host');
+  console.log('   Live Frames:');
+  console.log('   - GET /frames/:service - Binary push stream (registration, single-face, multi-face, crowd)');
+  console.log('   - GET /frame-channel/stats - Frame relay and request counters');
+  console.log('   - GET /events/:service - Status event stream (SSE; registration, single-face, multi-face, crowd)');
+  console.log('   - GET /event-channel/stats - Status event relay counters');
+  console.log('   - GET /proxy/stats - Upstream calls, coalesced polls and errors per service');
   console.log('   Utility:');
   console.log('   - GET /recognition-modes - List available recognition modes');
 });
@@ -0,0 +1,254 @@
+import bisect
+import threading
+import time
+
+from flask import Response
+
+try:
+    import psutil
+except ImportError:  # RSS/CPU metrics are simply left out
+    psutil = None
+
+# Seconds; spans a ~1 ms JPEG encode up to a multi-second gallery load or MongoDB stall
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGES = ("capture", "detect", "embed", "match", "encode", "db")
+# Capture FPS is averaged over the last few complete seconds
+FPS_WINDOW_S = 5
+METRIC_PREFIX = "mlfrs"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+
+
+class TimedLock:
+    """threading.Lock that counts blocking acquisitions and the time spent waiting for them.
+
+    The uncontended path is one non-blocking acquire; counters are updated
+    while the lock is held, so they need no lock of their own. Works as the
+    lock of a threading.Condition.
+    """
+
+    __slots__ = ("_lock", "acquisitions", "contended", "wait_s")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_s = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not blocking:
+            # Condition probes ownership this way; not a real acquisition
+            return self._lock.acquire(False)
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_s += time.perf_counter() - started
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ServiceMetrics:
+    """In-process counters and latency histograms for one stream service, rendered as Prometheus text.
+
+    Hot-path calls (observe, frame_captured) take one short lock and do a
+    bisect over the bucket bounds; everything else is computed at scrape time.
+    """
+
+    def __init__(self, service, tracer=None):
+        self.service = service
+        # Optional FrameTracer: every observation also becomes a trace span while tracing is on
+        self.tracer = tracer
+        # SessionPerf of the running session, fed alongside the process-wide counters
+        self.session = None
+        self._lock = threading.Lock()
+        self._buckets = {stage: [0] * (len(LATENCY_BUCKETS) + 1) for stage in STAGES}
+        self._sums = dict.fromkeys(STAGES, 0.0)
+        self._frames = 0
+        self._dropped = 0
+        self._per_second = {}
+        self._source = None
+        self._source_drops = 0
+        self._gauges = {}
+        self._locks = {}
+        self._process = psutil.Process() if psutil else None
+        self._started = time.time()
+
+    # --- Hot path ---
+    def observe(self, stage, seconds):
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self._buckets[stage][index] += 1
+            self._sums[stage] += seconds
+        if self.tracer is not None and self.tracer.enabled:
+            self.tracer.record(stage, seconds)
+        session = self.session
+        if session is not None:
+            session.observe(stage, seconds)
+
+    def stage(self, name):
+        """Context manager timing one stage: `with metrics.stage("detect"): ...`"""
+        return _StageTimer(self, name)
+
+    def frame_captured(self):
+        second = int(time.monotonic())
+        with self._lock:
+            self._frames += 1
+            if second not in self._per_second:
+                for old in [s for s in self._per_second if s < second - FPS_WINDOW_S]:
+                    del self._per_second[old]
+                self._per_second[second] = 0
+            self._per_second[second] += 1
+        if self.session is not None:
+            self.session.frame_captured()
+
+    def frame_dropped(self, count=1):
+        with self._lock:
+            self._dropped += count
+        if self.session is not None:
+            self.session.frame_dropped(count)
+
+    # --- Sessions ---
+    def start_session(self, session):
+        """Attach a SessionPerf; it sees every observation until end_session()."""
+        self.session = session
+        return session
+
+    def end_session(self):
+        """Detach the running SessionPerf and return its summary (None when no session was attached)."""
+        session, self.session = self.session, None
+        return session.summary() if session is not None else None
+
+    def read_frame(self, cap):
+        """cap.read() with capture timing, frame counts and the frames a paced source skipped."""
+        started = time.perf_counter()
+        ret, frame = cap.read()
+        self.observe("capture", time.perf_counter() - started)
+        source_drops = getattr(cap, "frames_dropped", 0)
+        if cap is not self._source:
+            self._source, self._source_drops = cap, 0
+        if source_drops > self._source_drops:
+            self.frame_dropped(source_drops - self._source_drops)
+            self._source_drops = source_drops
+        if ret:
+            self.frame_captured()
+        elif not getattr(cap, "exhausted", False):
+            self.frame_dropped()
+        return ret, frame
+
+    # --- Locks ---
+    def lock(self, name):
+        """A TimedLock whose wait time is exported as mlfrs_lock_wait_seconds_total{lock=name}."""
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = TimedLock()
+        return lock
+
+    # --- Gauges ---
+    def gauge(self, name, help_text, fn):
+        """Register a gauge read at scrape time from fn()."""
+        self._gauges[name] = (help_text, fn)
+
+    def set_gauge(self, name, value, help_text=""):
+        help_text = help_text or self._gauges.get(name, ("",))[0]
+        self._gauges[name] = (help_text, lambda: value)
+
+    def capture_fps(self):
+        now = int(time.monotonic())
+        with self._lock:
+            frames = sum(count for second, count in self._per_second.items() if now - FPS_WINDOW_S <= second < now)
+        return frames / FPS_WINDOW_S
+
+    # --- Exposition ---
+    def render(self):
+        label = f'service="{self.service}"'
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            full = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{full}{suffix}{{{label}{labels}}} {value}")
+
+        with self._lock:
+            frames, dropped = self._frames, self._dropped
+            buckets = {stage: list(counts) for stage, counts in self._buckets.items()}
+            sums = dict(self._sums)
+
+        metric("frames_captured_total", "counter", "Frames read from the frame source", [("", "", frames)])
+        metric("frames_dropped_total", "counter", "Failed reads plus frames a paced source skipped",
+               [("", "", dropped)])
+        metric("capture_fps", "gauge", f"Frames captured per second over the last {FPS_WINDOW_S}s",
+               [("", "", round(self.capture_fps(), 2))])
+
+        samples = []
+        for stage in STAGES:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, buckets[stage]):
+                cumulative += count
+                samples.append(("_bucket", f',stage="{stage}",le="{bound}"', cumulative))
+            cumulative += buckets[stage][-1]
+            samples.append(("_bucket", f',stage="{stage}",le="+Inf"', cumulative))
+            samples.append(("_sum", f',stage="{stage}"', round(sums[stage], 6)))
+            samples.append(("_count", f',stage="{stage}"', cumulative))
+        metric("stage_latency_seconds", "histogram", "Per-stage latency of the processing loop", samples)
+
+        if self._locks:
+            locks = sorted(self._locks.items())
+            metric("lock_acquisitions_total", "counter", "Blocking acquisitions of shared locks",
+                   [("", f',lock="{name}"', lock.acquisitions) for name, lock in locks])
+            metric("lock_contended_total", "counter", "Acquisitions that had to wait for another thread",
+                   [("", f',lock="{name}"', lock.contended) for name, lock in locks])
+            metric("lock_wait_seconds_total", "counter", "Time threads spent waiting to acquire shared locks",
+                   [("", f',lock="{name}"', round(lock.wait_s, 6)) for name, lock in locks])
+
+        for name, (help_text, fn) in sorted(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is not None:
+                metric(name, "gauge", help_text, [("", "", value)])
+
+        if self._process is not None:
+            memory = self._process.memory_info()
+            cpu = self._process.cpu_times()
+            metric("process_resident_memory_bytes", "gauge", "Resident set size", [("", "", memory.rss)])
+            metric("process_cpu_seconds_total", "counter", "User plus system CPU time",
+                   [("", "", round(cpu.user + cpu.system, 3))])
+        metric("process_start_time_seconds", "gauge", "Unix time the process started", [("", "", int(self._started))])
+        return "\n".join(lines) + "\n"
+
+    def register(self, app):
+        """Mount GET /metrics on a Flask app."""
+        app.add_url_rule("/metrics", "metrics", lambda: Response(self.render(), content_type=CONTENT_TYPE))
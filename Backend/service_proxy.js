@@ -0,0 +1,109 @@
+// service_proxy.js
+// Keep-alive HTTP client for the local Python stream services.
+// One agent per service reuses sockets across calls, hot GET endpoints are
+// coalesced for a short TTL, and frame endpoints are piped without buffering.
+const http = require('http');
+
+const DEFAULT_CACHE_TTL_MS = 250;
+
+function createServiceClient(port, options = {}) {
+  const host = options.host || 'localhost';
+  const agent = new http.Agent({ keepAlive: true, maxSockets: options.maxSockets || 16 });
+  const cacheTtlMs = options.cacheTtlMs ?? DEFAULT_CACHE_TTL_MS;
+  const cachedPaths = new Set(options.cachedPaths || ['/status', '/health']);
+  // path -> { promise, expiresAt }
+  const cache = new Map();
+  const stats = { upstreamRequests: 0, coalesced: 0, errors: 0 };
+
+  function request(path, opts = {}) {
+    const method = opts.method || 'GET';
+    const timeoutMs = opts.timeoutMs ?? 2000;
+    const body = opts.body ? JSON.stringify(opts.body) : undefined;
+    const headers = { 'Content-Type': 'application/json', ...(opts.headers || {}) };
+    if (body) headers['Content-Length'] = Buffer.byteLength(body);
+    stats.upstreamRequests += 1;
+    return new Promise((resolve) => {
+      const req = http.request({ host, port, path, method, headers, agent }, (res) => {
+        const chunks = [];
+        res.on('data', (chunk) => chunks.push(chunk));
+        res.on('end', () => {
+          const ok = res.statusCode >= 200 && res.statusCode < 300;
+          let json = {};
+          try { json = JSON.parse(Buffer.concat(chunks).toString('utf8') || '{}'); } catch { json = {}; }
+          resolve({ ok, status: res.statusCode, json });
+        });
+        res.on('error', (err) => {
+          stats.errors += 1;
+          resolve({ ok: false, status: 0, json: { error: err.message } });
+        });
+      });
+      // Normalize network/timeout errors into a non-throwing response
+      req.setTimeout(timeoutMs, () => req.destroy(new Error('timeout')));
+      req.on('error', (err) => {
+        stats.errors += 1;
+        resolve({ ok: false, status: 0, json: { error: err.message || 'request_failed' } });
+      });
+      if (body) req.write(body);
+      req.end();
+    });
+  }
+
+  async function call(path, opts = {}) {
+    const method = opts.method || 'GET';
+    if (method !== 'GET') {
+      // State is about to change; do not serve stale status afterwards
+      cache.clear();
+      return request(path, opts);
+    }
+    if (!cachedPaths.has(path) || opts.fresh) {
+      return request(path, opts);
+    }
+    const now = Date.now();
+    const entry = cache.get(path);
+    if (entry && entry.expiresAt > now) {
+      stats.coalesced += 1;
+      return entry.promise;
+    }
+    const promise = request(path, opts);
+    // Until it settles the entry never expires, so concurrent polls share it
+    const pending = { promise, expiresAt: Infinity };
+    cache.set(path, pending);
+    promise.then((result) => {
+      if (cache.get(path) !== pending) return;
+      if (result.ok) pending.expiresAt = Date.now() + cacheTtlMs;
+      else cache.delete(path);
+    });
+    return promise;
+  }
+
+  // Stream an upstream response (status, headers, body) straight to an Express response
+  function pipe(path, req, res, opts = {}) {
+    const headers = {};
+    for (const name of ['if-none-match', 'accept']) {
+      if (req.headers[name]) headers[name] = req.headers[name];
+    }
+    stats.upstreamRequests += 1;
+    const upstream = http.request({ host, port, path, method: 'GET', headers, agent }, (upstreamRes) => {
+      const passHeaders = {};
+      for (const name of ['content-type', 'content-length', 'etag', 'x-frame-seq', 'cache-control']) {
+        if (upstreamRes.headers[name]) passHeaders[name] = upstreamRes.headers[name];
+      }
+      res.writeHead(upstreamRes.statusCode, passHeaders);
+      upstreamRes.pipe(res);
+    });
+    upstream.setTimeout(opts.timeoutMs ?? 20000, () => upstream.destroy(new Error('timeout')));
+    upstream.on('error', (err) => {
+      stats.errors += 1;
+      if (!res.headersSent) res.status(502).json({ error: err.message });
+      else res.destroy();
+    });
+    res.on('close', () => {
+      if (!res.writableFinished) upstream.destroy();
+    });
+    upstream.end();
+  }
+
+  return { call, pipe, stats, agent, invalidate: () => cache.clear() };
+}
+
+module.exports = { createServiceClient };
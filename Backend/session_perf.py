@@ -0,0 +1,130 @@
+import os
+import platform
+import random
+import socket
+import threading
+import time
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+# Optional label for the deployment (room, building, customer); the hostname is always recorded too
+SITE_ID = os.getenv("SITE_ID", "")
+CROWD_SESSIONS_COLLECTION = "crowd_sessions"
+# Per-stage samples kept for percentiles; longer sessions are reservoir-sampled down to this
+MAX_STAGE_SAMPLES = 10000
+
+
+def host_info():
+    return {
+        "site": SITE_ID or None,
+        "host": socket.gethostname(),
+        "platform": platform.platform(terse=True),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class SessionPerf:
+    """Performance summary of one session: frame counts, FPS, per-stage latency percentiles, warm-up.
+
+    Fed by ServiceMetrics while the session is attached to it (stage timings,
+    captured/dropped frames); the loop itself only reports processed frames.
+    """
+
+    def __init__(self, service, detection_label="faces", **meta):
+        self.service = service
+        self.detection_label = detection_label
+        self.meta = meta
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._first_processed = None
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+        self._sums = {}
+        self._random = random.Random(0)
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.peak_detections = 0
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            count = self._counts.get(stage, 0) + 1
+            self._counts[stage] = count
+            self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+            samples = self._samples.setdefault(stage, [])
+            if len(samples) < MAX_STAGE_SAMPLES:
+                samples.append(seconds)
+            else:
+                slot = self._random.randrange(count)
+                if slot < MAX_STAGE_SAMPLES:
+                    samples[slot] = seconds
+
+    def frame_captured(self):
+        self.frames_captured += 1
+
+    def frame_dropped(self, count=1):
+        self.frames_dropped += count
+
+    def frame_processed(self, detections=0):
+        """Call once per frame that went through detection, with the number of faces/people found."""
+        if self._first_processed is None:
+            self._first_processed = time.perf_counter()
+        self.frames_processed += 1
+        if detections > self.peak_detections:
+            self.peak_detections = detections
+
+    def summary(self):
+        duration = time.perf_counter() - self._started
+        with self._lock:
+            stages = {}
+            for stage, samples in self._samples.items():
+                ordered = sorted(samples)
+                stages[stage] = {
+                    "count": self._counts[stage],
+                    "mean_ms": round(self._sums[stage] / self._counts[stage] * 1000, 3),
+                    "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+                    "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+                    "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+                }
+        return {
+            "service": self.service,
+            **host_info(),
+            **self.meta,
+            "started_at": self.started_at,
+            "duration_s": round(duration, 3),
+            # Session start to the first processed frame: camera open, model/gallery load and first inference
+            "warmup_s": round(self._first_processed - self._started, 3) if self._first_processed else None,
+            "frames_captured": self.frames_captured,
+            "frames_processed": self.frames_processed,
+            "frames_skipped": max(0, self.frames_captured - self.frames_processed),
+            "frames_dropped": self.frames_dropped,
+            "effective_fps": round(self.frames_processed / duration, 2) if duration > 0 else None,
+            f"peak_{self.detection_label}": self.peak_detections,
+            "stages": stages,
+        }
+
+
+def ensure_performance_indexes(collection, time_field="timestamp"):
+    """Per-host lookups over a session collection that embeds a `performance` summary."""
+    collection.create_index([("performance.host", ASCENDING), (time_field, DESCENDING)])
+    collection.create_index([("performance.site", ASCENDING), (time_field, DESCENDING)], sparse=True)
+
+
+def save_crowd_session(collection, session_id, result, performance):
+    """Store a finished crowd session (counts plus its performance summary); never raises."""
+    try:
+        collection.update_one(
+            {"session_id": session_id},
+            {"$set": {"session_id": session_id, "timestamp": time.time(), **result, "performance": performance}},
+            upsert=True,
+        )
+        return True
+    except PyMongoError as e:
+        print(f"[Perf] Failed to save crowd session {session_id}: {e}")
+        return False
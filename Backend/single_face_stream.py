@@ -1,27 +1,43 @@
+from cpu_resources import configure_cpu
+cpu = configure_cpu("single_face")  # before numpy, OpenCV and TensorFlow size their thread pools
 import cv2
 import numpy as np
 import os
 from mtcnn import MTCNN
-from keras_facenet import FaceNet
 from pymongo import MongoClient
 from sklearn.metrics.pairwise import cosine_similarity
 import time
 import threading
 import json
-import base64
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import sys
 from env_config import get_required_env
+from embedding_store import EMBEDDING_MODEL_VERSION, EmbeddingVersionMismatch, load_embedder, select_embeddings, stored_model
+from frame_source import describe_source, open_frame_source, strip_source_args
+from service_metrics import ServiceMetrics
+from frame_tracer import FrameTracer
+from frame_governor import FrameGovernor, detect_faces_scaled
+from memory_accounting import MemoryLedger
+from debug_profiler import register_debug_routes
+from event_bus import EventBus, sse_response
+from frame_buffer import FrameBuffer, conditional_frame, jpeg_response, mjpeg_response, not_modified, push_stream_response, tag_frame_response
+cpu.apply_frameworks()
 
 # Global variables
 auth_active = False
 auth_thread = None
 stop_flag = threading.Event()
 cap = None
-current_frame = None
-frame_lock = threading.Lock()
+memory = MemoryLedger()
+tracer = FrameTracer("single_face")
+metrics = ServiceMetrics("single_face", tracer=tracer)
+frame_buffer = FrameBuffer(on_encode=lambda seconds: metrics.observe("encode", seconds),
+                           lock=metrics.lock("frame_buffer"))
 auth_result = None
+events = EventBus()
+# Paces the authentication loop (SINGLE_FACE_TARGET_FPS / _CPU_BUDGET / _ADAPTIVE)
+governor = FrameGovernor.from_env("SINGLE_FACE", 10)
 
 # MongoDB Setup
 client = MongoClient(get_required_env("MONGODB_URI"))
@@ -29,54 +45,84 @@ db = client[os.getenv("MONGODB_DB_NAME", "face_recognition")]
 users_collection = db['users']
 
 # Initialize models
-embedder = FaceNet()
-detector = MTCNN()
+with memory.measure("facenet"):
+    embedder = load_embedder()
+with memory.measure("mtcnn"):
+    detector = MTCNN()
+memory.component("frame_buffer", frame_buffer.nbytes)
+memory.start()
 
 # Flask app
 app = Flask(__name__)
 CORS(app)
+metrics.register(app)
+register_debug_routes(app, worker=lambda: auth_thread, tracer=tracer)
+metrics.gauge("active_sessions", "Authentication sessions in progress", lambda: 1 if auth_active else 0)
+governor.register(metrics)
 
 def align_face(face, output_size=(160, 160)):
     return cv2.resize(face, output_size)
 
 def get_embeddings_from_db(email):
-    user_data = users_collection.find_one({"email": email})
-    if user_data and "embeddings" in user_data:
-        return [np.array(embedding) for embedding in user_data['embeddings']]
-    return None
+    with metrics.stage("db"):
+        user_data = users_collection.find_one(
+            {"email": email},
+            {"embeddings": 1, "embedding_model": 1, "pending_embeddings": 1, "pending_embedding_model": 1}
+        )
+    if not user_data or "embeddings" not in user_data:
+        return None
+    embeddings = select_embeddings(user_data)
+    if embeddings is None:
+        # Never compare vectors from different models; the user needs re-embedding or re-registration
+        raise EmbeddingVersionMismatch(
+            f"Stored face data is from {stored_model(user_data)}, this service uses {EMBEDDING_MODEL_VERSION}")
+    return [np.array(embedding) for embedding in embeddings]
 
 def authenticate_continuous(email, threshold=0.5):
-    global auth_active, stop_flag, cap, current_frame, auth_result
+    global auth_active, stop_flag, cap, auth_result
     
+    trace_mark = tracer.mark()
     try:
         stored_embeddings = get_embeddings_from_db(email)
         if not stored_embeddings:
             auth_result = {"success": False, "message": "No face data found"}
             return
+        metrics.set_gauge("gallery_size", len(stored_embeddings), "Stored embeddings matched against")
+        memory.set_bytes("gallery", sum(e.nbytes for e in stored_embeddings))
 
-        cap = cv2.VideoCapture(0)
+        cap = open_frame_source()
         if not cap.isOpened():
-            auth_result = {"success": False, "message": "Cannot open webcam"}
+            auth_result = {"success": False, "message": f"Cannot open {cap.kind} source"}
             return
 
         start_time = time.time()
         timeout = 30
         
+        governor.reset()
         while auth_active and not stop_flag.is_set():
-            ret, frame = cap.read()
+            tracer.next_frame()
+            governor.start_frame()
+            ret, frame = metrics.read_frame(cap)
             if not ret:
+                if cap.exhausted:
+                    auth_result = {"success": False, "message": "Frame source ended"}
+                    break
                 continue
 
             # Store frame for streaming
-            with frame_lock:
-                _, buffer = cv2.imencode('.jpg', frame)
-                current_frame = base64.b64encode(buffer).decode('utf-8')
+            frame_buffer.publish(frame)
 
             if time.time() - start_time > timeout:
                 auth_result = {"success": False, "message": "Timeout"}
                 break
 
-            faces = detector.detect_faces(frame)
+            if not governor.should_detect():
+                governor.end_frame(sleep=stop_flag.wait)
+                continue
+
+            with metrics.stage("detect"):
+                faces = detect_faces_scaled(detector, frame, governor.scale)
+            tracer.annotate(faces=len(faces or []))
             if faces:
                 for face in faces:
                     x1, y1, width, height = face['box']
@@ -87,18 +133,23 @@ def authenticate_continuous(email, threshold=0.5):
                     if face_pixels.size == 0:
                         continue
 
-                    face_pixels = cv2.cvtColor(face_pixels, cv2.COLOR_BGR2RGB)
-                    face_pixels = align_face(face_pixels)
-                    face_pixels = np.expand_dims(face_pixels, axis=0)
-                    face_embedding = embedder.embeddings(face_pixels).flatten()
+                    with tracer.span("crop"):
+                        face_pixels = cv2.cvtColor(face_pixels, cv2.COLOR_BGR2RGB)
+                        face_pixels = align_face(face_pixels)
+                        face_pixels = np.expand_dims(face_pixels, axis=0)
+                    with metrics.stage("embed"):
+                        face_embedding = embedder.embeddings(face_pixels).flatten()
 
-                    similarities = [cosine_similarity([face_embedding], [stored])[0][0] for stored in stored_embeddings]
-                    max_similarity = max(similarities) if similarities else 0
+                    with metrics.stage("match"):
+                        similarities = [cosine_similarity([face_embedding], [stored])[0][0] for stored in stored_embeddings]
+                        max_similarity = max(similarities) if similarities else 0
 
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    with tracer.span("draw"):
+                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
                     
                     if max_similarity >= threshold:
-                        user_info = users_collection.find_one({"email": email})
+                        with metrics.stage("db"):
+                            user_info = users_collection.find_one({"email": email})
                         auth_result = {
                             "success": True,
                             "message": "Authentication successful!",
@@ -106,54 +157,78 @@ def authenticate_continuous(email, threshold=0.5):
                         }
                         cv2.putText(frame, "AUTHENTICATED!", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
                         
-                        with frame_lock:
-                            _, buffer = cv2.imencode('.jpg', frame)
-                            current_frame = base64.b64encode(buffer).decode('utf-8')
+                        frame_buffer.publish(frame)
                         
                         auth_active = False
                         break
                     else:
-                        cv2.putText(frame, f"Authenticating... {max_similarity:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+                        with tracer.span("draw"):
+                            cv2.putText(frame, f"Authenticating... {max_similarity:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
 
-            time.sleep(0.1)
+            governor.end_frame(sleep=stop_flag.wait)
 
     except Exception as e:
         auth_result = {"success": False, "message": f"Error: {str(e)}"}
     finally:
+        tracer.end_frame()
         cleanup_resources()
+        events.publish("status", status_payload())
+        tracer.dump_session(time.strftime("%Y%m%d-%H%M%S"), since=trace_mark)
 
 def cleanup_resources():
-    global cap, current_frame
+    global cap
     if cap:
         cap.release()
         cap = None
     # Clear any stale frame so UI doesn't show old image after stop
-    try:
-        with frame_lock:
-            current_frame = None
-    except Exception:
-        current_frame = None
+    frame_buffer.clear()
 
 @app.route('/current-frame')
 def get_current_frame():
-    global current_frame, auth_active
+    global auth_active
     # Only return a frame when session is active to avoid stale frames
-    with frame_lock:
-        frame_to_send = current_frame if auth_active else None
-    return jsonify({
+    seq, frame_to_send, modified = conditional_frame(frame_buffer, auth_active, as_base64=True)
+    if not modified:
+        return not_modified(frame_buffer, seq)
+    response = jsonify({
         'frame': frame_to_send,
-        'active': auth_active
+        'active': auth_active,
+        'seq': seq
     })
+    return tag_frame_response(response, frame_buffer, seq, len(frame_to_send or ''))
+
+@app.route('/current-frame.jpg')
+def get_current_frame_jpeg():
+    return jpeg_response(frame_buffer, auth_active)
+
+@app.route('/stream')
+def video_stream():
+    return mjpeg_response(frame_buffer, lambda: auth_active)
+
+@app.route('/frames')
+def push_frames():
+    return push_stream_response(frame_buffer, lambda: auth_active)
+
+@app.route('/frame-stats')
+def get_frame_stats():
+    return jsonify(frame_buffer.stats())
+
+def status_payload():
+    if auth_result:
+        return auth_result
+    return {"status": "running" if auth_active else "idle"}
 
 @app.route('/status')
 def get_status():
-    global auth_result, auth_active
-    if auth_result:
-        return jsonify(auth_result)
-    return jsonify({"status": "running" if auth_active else "idle"})
+    return jsonify(status_payload())
+
+@app.route('/events')
+def status_events():
+    """Server-Sent Events: status transitions"""
+    return sse_response(events, status_payload)
 
 def start_authentication(email):
-    global auth_active, auth_thread, stop_flag, auth_result, current_frame
+    global auth_active, auth_thread, stop_flag, auth_result
     
     if auth_active:
         return {"success": False, "message": "Already running"}
@@ -161,12 +236,12 @@ def start_authentication(email):
     auth_active = True
     stop_flag.clear()
     auth_result = None
-    with frame_lock:
-        current_frame = None
+    frame_buffer.clear()
     
     auth_thread = threading.Thread(target=authenticate_continuous, args=(email,))
     auth_thread.daemon = True
     auth_thread.start()
+    events.publish("status", status_payload())
     
     return {"success": True, "message": "Started"}
 
@@ -175,6 +250,7 @@ def stop_authentication():
     auth_active = False
     stop_flag.set()
     cleanup_resources()
+    events.publish("status", status_payload())
     return {"success": True, "message": "Stopped"}
 
 @app.route('/stop', methods=['POST'])
@@ -195,9 +271,12 @@ def start_route():
 
 @app.route('/health')
 def health_route():
-    return jsonify({ 'ok': True, 'status': 'running' if auth_active else 'idle' })
+    return jsonify({ 'ok': True, 'status': 'running' if auth_active else 'idle', 'memory': memory.report(),
+                     'governor': governor.stats(), 'cpu': cpu.effective() })
 
 if __name__ == "__main__":
+    strip_source_args(sys.argv)
+    print(f"[Auth] Frame source: {describe_source()}")
     if len(sys.argv) > 1:
         command = sys.argv[1]
         if command == "start" and len(sys.argv) > 2:
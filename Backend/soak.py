@@ -0,0 +1,185 @@
+"""Soak test: run a stream service against a replayed source for hours and fail on memory growth.
+
+Starts the service (or attaches to a running one with --attach), keeps a session running by
+POSTing /start whenever it goes idle, and samples the memory report from /health every
+--interval seconds. After --warmup minutes, the least-squares RSS slope must stay under
+--max-slope MiB/hour. The run also fails if the service dies or stops answering. Samples and
+the verdict are written as JSON; the exit status is 1 on failure.
+
+Usage: python soak.py --service crowd --source video:samples/lobby.mp4 [--hours 4] [--interval 30]
+                      [--warmup 15] [--max-slope 10] [--output soak_crowd.json]
+       python soak.py --service multi-face --attach [--hours 8]
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+
+from memory_accounting import MIB, rss_slope
+
+# service -> (script, port, extra arguments)
+SERVICES = {
+    "registration": ("face_registration_stream.py", 5001, []),
+    "single-face": ("single_face_stream.py", 5002, []),
+    "multi-face": ("multi_face_stream.py", 5003, []),
+    "crowd": ("crowd_counting_stream.py", 5004, ["start"]),
+}
+REQUEST_TIMEOUT_S = 10.0
+# Consecutive failed /health polls before the service counts as hung
+MAX_MISSED_POLLS = 5
+STARTUP_TIMEOUT_S = 300.0
+
+
+def request_json(port, method, path, body=None):
+    """(status, parsed JSON) from the service, or (None, None) when it does not answer."""
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT_S)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+    except (OSError, http.client.HTTPException):
+        return None, None
+    try:
+        return response.status, json.loads(payload or b"{}")
+    except ValueError:
+        return response.status, None
+
+
+def session_active(health):
+    # The services report activity as either a status string or an active flag
+    return health.get("active") is True or health.get("status") == "running"
+
+
+def launch(args):
+    script, _, extra = SERVICES[args.service]
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), script), *extra]
+    if args.source:
+        command += ["--source", args.source, "--pace", args.pace]
+    env = {**os.environ, "FRAME_SOURCE_LOOP": "1", "MEMORY_SAMPLE_INTERVAL_S": str(args.interval)}
+    log = open(args.log, "w") if args.log else subprocess.DEVNULL
+    print(f"[Soak] Starting {' '.join(command)}")
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_up(port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        status, _ = request_json(port, "GET", "/health")
+        if status == 200:
+            return True
+        time.sleep(2)
+    return False
+
+
+def verdict(samples, args):
+    """Slope over the post-warm-up samples and whether it passes."""
+    cutoff = samples[0][0] + args.warmup * 60 if samples else 0
+    measured = [(t, rss) for t, rss in samples if t >= cutoff]
+    slope = rss_slope(measured)
+    slope_mb = slope / MIB if slope is not None else None
+    passed = slope_mb is not None and slope_mb <= args.max_slope
+    return {
+        "samples_measured": len(measured),
+        "slope_mb_per_hour": round(slope_mb, 3) if slope_mb is not None else None,
+        "max_slope_mb_per_hour": args.max_slope,
+        "growth_mb": round((measured[-1][1] - measured[0][1]) / MIB, 1) if len(measured) > 1 else None,
+        "passed": passed,
+    }
+
+
+def soak(args):
+    _, port, _ = SERVICES[args.service]
+    process = None if args.attach else launch(args)
+    samples, reports, failure = [], [], None
+    restarts = 0
+    try:
+        if not wait_until_up(port, process):
+            failure = "service did not come up"
+            return samples, reports, restarts, failure
+        deadline = time.monotonic() + args.hours * 3600
+        missed = 0
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                failure = f"service exited with status {process.returncode}"
+                break
+            status, health = request_json(port, "GET", "/health")
+            if status != 200 or not health:
+                missed += 1
+                if missed >= MAX_MISSED_POLLS:
+                    failure = f"/health unanswered {missed} times in a row"
+                    break
+                time.sleep(args.interval)
+                continue
+            missed = 0
+            memory = health.get("memory") or {}
+            if memory.get("rss_bytes"):
+                samples.append((time.time(), memory["rss_bytes"]))
+                reports.append({"ts": round(time.time()), "rss_mb": round(memory["rss_bytes"] / MIB, 1),
+                                "components": memory.get("components")})
+            if not session_active(health):
+                # Multi-face sessions time out after 30 s; restarting them also soaks session setup/teardown
+                request_json(port, "POST", "/start", json.loads(args.start_body))
+                restarts += 1
+            if len(samples) % 10 == 1:
+                interim = verdict(samples, args)
+                print(f"[Soak] {len(samples)} samples, RSS {reports[-1]['rss_mb'] if reports else '?'} MiB, "
+                      f"slope {interim['slope_mb_per_hour']} MiB/h, {restarts} session starts")
+            time.sleep(args.interval)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return samples, reports, restarts, failure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--service", choices=sorted(SERVICES), required=True)
+    parser.add_argument("--source", help="frame source spec for the launched service (looped)")
+    parser.add_argument("--pace", default="realtime", help="realtime, fast or frames per second")
+    parser.add_argument("--attach", action="store_true", help="soak an already running service instead of starting one")
+    parser.add_argument("--hours", type=float, default=4.0)
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds between memory samples")
+    parser.add_argument("--warmup", type=float, default=15.0, help="minutes excluded from the slope (caches filling)")
+    parser.add_argument("--max-slope", type=float, default=10.0, help="allowed RSS growth in MiB/hour")
+    parser.add_argument("--start-body", default="{}", help='JSON POSTed to /start, e.g. {"email": "a@b.c"} for single-face')
+    parser.add_argument("--log", help="write the launched service's output here")
+    parser.add_argument("--output", help="JSON report (default soak_<service>.json)")
+    args = parser.parse_args()
+
+    samples, reports, restarts, failure = soak(args)
+    result = verdict(samples, args)
+    if failure:
+        result["passed"] = False
+        result["failure"] = failure
+    elif result["slope_mb_per_hour"] is None:
+        result["failure"] = "not enough samples after warm-up"
+    elif not result["passed"]:
+        result["failure"] = f"RSS grew {result['slope_mb_per_hour']} MiB/h (limit {args.max_slope})"
+
+    output = args.output or f"soak_{args.service}.json"
+    with open(output, "w") as f:
+        json.dump({
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "config": vars(args),
+            "session_starts": restarts,
+            "result": result,
+            "samples": reports,
+        }, f, indent=2)
+    print(f"[Soak] {'PASS' if result['passed'] else 'FAIL'}: slope {result['slope_mb_per_hour']} MiB/h over "
+          f"{result['samples_measured']} samples{'; ' + result['failure'] if result.get('failure') else ''}. Wrote {output}")
+    return 0 if result["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""AttendanceWriter against a fake collection that fails for a while.
+
+Run from Backend/: python -m unittest discover tests
+"""
+import threading
+import time
+import unittest
+
+from pymongo.errors import AutoReconnect, WriteError
+
+from attendance_writer import AttendanceWriter
+
+
+class FlakyCollection:
+    """bulk_write raises error until `until` (monotonic time), then records the operations."""
+
+    def __init__(self, error, until):
+        self.error = error
+        self.until = until
+        self.calls = 0
+        self.written = []
+        self._lock = threading.Lock()
+
+    def bulk_write(self, operations, ordered=False):
+        with self._lock:
+            self.calls += 1
+            if time.monotonic() < self.until:
+                raise self.error
+            self.written.extend(operations)
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class WriterTest(unittest.TestCase):
+    def make_writer(self, collection, **kwargs):
+        """A writer whose background thread retries quickly, with one closed session queued."""
+        settings = {"flush_interval": 0.02, "backoff_base": 0.01, **kwargs}
+        writer = AttendanceWriter(collection, **settings)
+
+        def heal_and_close():
+            collection.until = 0.0
+            writer.close(timeout=1.0)
+        self.addCleanup(heal_and_close)
+        writer.close_session("s1", {"recognized_users": [{"email": "a@example.com"}]})
+        return writer
+
+
+class FlushDuringOutageTest(WriterTest):
+    def test_outage_within_timeout_is_written_not_dropped(self):
+        collection = FlakyCollection(AutoReconnect("no primary"), time.monotonic() + 0.5)
+        writer = self.make_writer(collection, max_retries=1)
+        self.assertTrue(writer.flush(timeout=3.0))
+        stats = writer.stats()
+        self.assertEqual(stats["dropped_sessions"], 0)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(len(collection.written), 1)
+        self.assertGreater(collection.calls, 2)
+
+    def test_outage_past_timeout_returns_false_and_keeps_session(self):
+        collection = FlakyCollection(AutoReconnect("no primary"), time.monotonic() + 60)
+        writer = self.make_writer(collection, max_retries=1)
+        self.assertFalse(writer.flush(timeout=0.5))
+        stats = writer.stats()
+        self.assertEqual(stats["dropped_sessions"], 0)
+        self.assertEqual(stats["queue_depth"], 1)
+        self.assertGreater(collection.calls, 2)
+
+
+class BackgroundRetryTest(WriterTest):
+    def test_outage_gives_up_by_time_not_count(self):
+        collection = FlakyCollection(AutoReconnect("no primary"), time.monotonic() + 60)
+        writer = self.make_writer(collection, max_retries=1, give_up_after=0.5)
+        self.assertTrue(wait_for(lambda: collection.calls > 3))
+        self.assertEqual(writer.stats()["dropped_sessions"], 0)
+        self.assertTrue(wait_for(lambda: writer.stats()["dropped_sessions"] == 1))
+        self.assertEqual(writer.stats()["queue_depth"], 0)
+
+    def test_rejected_write_is_dropped_after_max_retries(self):
+        collection = FlakyCollection(WriteError("document failed validation", 121), time.monotonic() + 60)
+        writer = self.make_writer(collection, max_retries=2)
+        self.assertTrue(wait_for(lambda: writer.stats()["dropped_sessions"] == 1))
+        # The first write plus max_retries retries
+        self.assertEqual(collection.calls, 3)
+        collection.until = 0.0
+        writer.save_session("s2", {"status": "running"})
+        self.assertTrue(writer.flush(timeout=1.0))
+        self.assertEqual(len(collection.written), 1)
+
+    def test_flush_reports_false_when_a_session_is_dropped_while_it_runs(self):
+        collection = FlakyCollection(WriteError("document failed validation", 121), time.monotonic() + 60)
+        # The background retry that drops the session comes backoff_base after the first failure
+        writer = self.make_writer(collection, max_retries=1, backoff_base=0.3)
+        self.assertTrue(wait_for(lambda: writer.stats()["failures"] >= 1))
+        started = time.monotonic()
+        self.assertFalse(writer.flush(timeout=3.0))
+        self.assertLess(time.monotonic() - started, 2.5)
+        self.assertEqual(writer.stats()["dropped_sessions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Gallery row count and loader against a fake users collection.
+
+Run from Backend/: python -m unittest discover tests
+"""
+import unittest
+
+import numpy as np
+
+from embedding_store import DEFAULT_EMBEDDING_MODEL
+from face_gallery import _count_rows, load_gallery
+
+MODEL = "facenet-test"
+OLD_MODEL = DEFAULT_EMBEDDING_MODEL
+
+
+def evaluate(expression, doc):
+    """The aggregation operators _count_rows uses, with MongoDB's behaviour for them."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return doc.get(expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    (operator, args), = expression.items()
+    if operator == "$ifNull":
+        value = evaluate(args[0], doc)
+        return evaluate(args[1], doc) if value is None else value
+    if operator == "$eq":
+        return evaluate(args[0], doc) == evaluate(args[1], doc)
+    if operator == "$cond":
+        return evaluate(args[1], doc) if evaluate(args[0], doc) else evaluate(args[2], doc)
+    if operator == "$size":
+        value = evaluate(args, doc)
+        if not isinstance(value, list):
+            raise ValueError(f"The argument to $size must be an array, not {type(value).__name__}")
+        return len(value)
+    raise NotImplementedError(operator)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def hint(self, index):
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeUsers:
+    """aggregate/find over in-memory documents; registered_later are added once the count has run."""
+
+    def __init__(self, docs, registered_later=()):
+        self.docs = list(docs)
+        self.registered_later = list(registered_later)
+
+    def aggregate(self, pipeline):
+        match, group = pipeline[0]["$match"], pipeline[1]["$group"]
+        docs = [d for d in self.docs if all(field in d for field in match)]
+        rows = sum(evaluate(group["rows"]["$sum"], d) for d in docs)
+        self.docs.extend(self.registered_later)
+        return [{"_id": None, "users": len(docs), "rows": rows}] if docs else []
+
+    def find(self, query, projection, batch_size=None):
+        return FakeCursor([{k: v for k, v in d.items() if k in query or projection.get(k)}
+                           for d in self.docs if all(field in d for field in query)])
+
+    def index_information(self):
+        return {}
+
+
+def user(email, embeddings, model=MODEL, **fields):
+    return {"email": email, "name": email.split("@")[0], "embeddings": embeddings, "embedding_model": model, **fields}
+
+
+def vectors(rows, seed):
+    return np.random.default_rng(seed).normal(size=(rows, 4)).tolist()
+
+
+class CountRowsTest(unittest.TestCase):
+    def test_null_embeddings_count_as_a_user_with_no_rows(self):
+        users = FakeUsers([user("a@example.com", None), user("b@example.com", vectors(3, 1))])
+        self.assertEqual(_count_rows(users, MODEL), (2, 3))
+
+    def test_pending_rows_count_only_for_their_model(self):
+        users = FakeUsers([
+            user("a@example.com", vectors(2, 1), OLD_MODEL, pending_embeddings=vectors(4, 2), pending_embedding_model=MODEL),
+            user("b@example.com", vectors(2, 3), OLD_MODEL),
+            user("c@example.com", vectors(2, 4), OLD_MODEL, pending_embeddings=None, pending_embedding_model=MODEL),
+        ])
+        self.assertEqual(_count_rows(users, MODEL), (3, 4))
+        self.assertEqual(_count_rows(users, OLD_MODEL), (3, 6))
+
+
+class LoadGalleryTest(unittest.TestCase):
+    def assert_rows(self, gallery, email, expected):
+        owner = [e for e, _ in gallery.users].index(email)
+        rows = gallery.matrix[gallery.owners == owner]
+        expected = np.asarray(expected, dtype=np.float32)
+        np.testing.assert_allclose(rows, expected / np.linalg.norm(expected, axis=1, keepdims=True), rtol=1e-6)
+
+    def test_null_embeddings_and_other_models_are_left_out(self):
+        users = FakeUsers([
+            user("a@example.com", None),
+            user("b@example.com", vectors(3, 1)),
+            user("c@example.com", vectors(2, 2), OLD_MODEL),
+        ])
+        gallery = load_gallery(users, model_version=MODEL)
+        self.assertEqual([email for email, _ in gallery.users], ["b@example.com"])
+        self.assertEqual(gallery.matrix.shape, (3, 4))
+        self.assertEqual(gallery.load_stats["other_model_users"], 2)
+
+    def test_pending_embeddings_of_the_model_are_loaded(self):
+        pending = vectors(4, 2)
+        users = FakeUsers([
+            user("a@example.com", vectors(2, 1), OLD_MODEL, pending_embeddings=pending, pending_embedding_model=MODEL),
+            user("b@example.com", vectors(2, 3)),
+        ])
+        gallery = load_gallery(users, model_version=MODEL)
+        self.assertEqual(gallery.matrix.shape, (6, 4))
+        self.assert_rows(gallery, "a@example.com", pending)
+
+    def test_users_registered_after_the_count_grow_the_matrix(self):
+        first, later = vectors(2, 1), [vectors(3, seed) for seed in range(2, 6)]
+        users = FakeUsers([user("a@example.com", first)],
+                          [user(f"late{n}@example.com", rows) for n, rows in enumerate(later)])
+        gallery = load_gallery(users, model_version=MODEL)
+        self.assertEqual(gallery.load_stats["expected_users"], 1)
+        self.assertEqual(len(gallery.users), 5)
+        self.assertEqual(gallery.matrix.shape, (14, 4))
+        self.assertEqual(len(gallery.owners), 14)
+        self.assert_rows(gallery, "a@example.com", first)
+        for n, rows in enumerate(later):
+            self.assert_rows(gallery, f"late{n}@example.com", rows)
+        match = gallery.best_match(later[3][1], threshold=0.99, model_version=MODEL)
+        self.assertEqual(match["email"], "late3@example.com")
+
+
+if __name__ == "__main__":
+    unittest.main()
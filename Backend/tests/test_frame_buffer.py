@@ -0,0 +1,58 @@
+"""Conditional frame requests (?after= / If-None-Match) against a FrameBuffer.
+
+Run from Backend/: python -m unittest discover tests
+"""
+import time
+import unittest
+
+from flask import Flask
+
+from frame_buffer import FrameBuffer, conditional_frame, frame_etag, jpeg_response
+
+app = Flask(__name__)
+
+
+def buffer_at(seq):
+    """A buffer whose current frame has sequence seq (published frames are numbered from 1)."""
+    frame_buffer = FrameBuffer()
+    for n in range(seq):
+        frame_buffer.publish_jpeg(b"jpeg-%d" % (n + 1))
+    return frame_buffer
+
+
+class ConditionalFrameTest(unittest.TestCase):
+    def test_known_equal_to_seq_is_not_modified(self):
+        frame_buffer = buffer_at(3)
+        with app.test_request_context("/frame?after=3"):
+            self.assertEqual(conditional_frame(frame_buffer), (3, None, False))
+        with app.test_request_context("/frame", headers={"If-None-Match": frame_etag(3)}):
+            response = jpeg_response(frame_buffer)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], frame_etag(3))
+
+    def test_known_behind_seq_gets_the_current_frame(self):
+        frame_buffer = buffer_at(3)
+        with app.test_request_context("/frame?after=1"):
+            self.assertEqual(conditional_frame(frame_buffer), (3, b"jpeg-3", True))
+        with app.test_request_context("/frame", headers={"If-None-Match": 'W/"2"'}):
+            response = jpeg_response(frame_buffer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), b"jpeg-3")
+        self.assertEqual(response.headers["ETag"], frame_etag(3))
+
+    def test_known_ahead_of_seq_is_stale_and_gets_the_current_frame_without_waiting(self):
+        # The client's sequence was issued before the service restarted
+        frame_buffer = buffer_at(2)
+        started = time.monotonic()
+        with app.test_request_context("/frame?after=40&wait=5"):
+            self.assertEqual(conditional_frame(frame_buffer), (2, b"jpeg-2", True))
+        with app.test_request_context("/frame?wait=5", headers={"If-None-Match": frame_etag(40)}):
+            response = jpeg_response(frame_buffer)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), b"jpeg-2")
+        self.assertEqual(response.headers["ETag"], frame_etag(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Candidate duplicate pairs from the tiled search and from k-NN (HNSW) results.
+
+Run from Backend/: python -m unittest discover tests
+"""
+import unittest
+
+import numpy as np
+
+from gallery_audit import _neighbour_hits, _tile_pairs, _unique_pairs
+
+CUTOFF = 0.9
+# Users 0 and 1 are near-duplicates (similarity 0.96); every other pair is far apart
+VECTORS = np.array([
+    [1.0, 0.0, 0.0],
+    [0.96, 0.28, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.0, 0.0, 1.0],
+], dtype=np.float32)
+
+
+def knn_pairs(blocks):
+    """The HNSW path's filtering and de-duplication over hand-written index.search() results."""
+    found = [_neighbour_hits(sims, ids, start, CUTOFF) for start, sims, ids in blocks]
+    return _unique_pairs(*(np.concatenate(column) for column in zip(*found)), len(VECTORS))
+
+
+class CandidatePairsTest(unittest.TestCase):
+    def test_tiled_search_finds_the_pair_once(self):
+        pairs_i, pairs_j, sims, _ = _tile_pairs(VECTORS, CUTOFF, block=2)
+        self.assertEqual(list(zip(pairs_i.tolist(), pairs_j.tolist())), [(0, 1)])
+        self.assertAlmostEqual(float(sims[0]), 0.96, places=5)
+
+    def test_pair_found_only_from_the_higher_side_is_kept_as_min_max(self):
+        # User 0's neighbour list misses user 1; user 1's lists user 0. Blocks of two rows, -1 padding.
+        blocks = [
+            (0, np.array([[1.0, 0.0, 0.0], [1.0, 0.96, 0.28]], dtype=np.float32),
+             np.array([[0, 2, 3], [1, 0, 2]])),
+            (2, np.array([[1.0, 0.28, -np.inf], [1.0, 0.0, 0.0]], dtype=np.float32),
+             np.array([[2, 1, -1], [3, 0, 2]])),
+        ]
+        pairs_i, pairs_j, sims = knn_pairs(blocks)
+        self.assertEqual(list(zip(pairs_i.tolist(), pairs_j.tolist())), [(0, 1)])
+        self.assertAlmostEqual(float(sims[0]), 0.96, places=5)
+        self.assertFalse(np.any(pairs_i == pairs_j))
+
+        tiled_i, tiled_j, _, _ = _tile_pairs(VECTORS, CUTOFF, block=2)
+        self.assertEqual(set(zip(pairs_i.tolist(), pairs_j.tolist())), set(zip(tiled_i.tolist(), tiled_j.tolist())))
+
+    def test_pair_found_from_both_sides_is_reported_once(self):
+        blocks = [
+            (0, np.array([[1.0, 0.96], [1.0, 0.96], [1.0, 0.28], [1.0, 0.0]], dtype=np.float32),
+             np.array([[0, 1], [1, 0], [2, 1], [3, 0]])),
+        ]
+        pairs_i, pairs_j, _ = knn_pairs(blocks)
+        self.assertEqual(list(zip(pairs_i.tolist(), pairs_j.tolist())), [(0, 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
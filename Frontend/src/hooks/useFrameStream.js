@@ -0,0 +1,101 @@
+import { useEffect, useRef, useState } from 'react';
+
+const API_BASE = 'http://localhost:3001';
+const LATENCY_REPORT_MS = 5000;
+const RECONNECT_MS = 1000;
+
+// Subscribe to the server.js frame push channel for a stream service.
+// Records are: 4-byte big-endian header length, JSON header, JPEG bytes.
+// Returns the latest record header (seq, ts, active and service-specific
+// counts) with `url` set to an object URL for frame records and null for
+// keepalives.
+const useFrameStream = (service, enabled) => {
+  const [frame, setFrame] = useState(null);
+  const frameUrlRef = useRef(null);
+
+  useEffect(() => {
+    if (!enabled) return undefined;
+
+    let cancelled = false;
+    let controller = null;
+    let reconnectTimer = null;
+    const latency = { count: 0, sumMs: 0, maxMs: 0 };
+
+    const reportLatency = () => {
+      if (latency.count === 0) return;
+      const payload = { ...latency };
+      latency.count = 0;
+      latency.sumMs = 0;
+      latency.maxMs = 0;
+      fetch(`${API_BASE}/frames/${service}/latency`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+      }).catch(() => {});
+    };
+    const latencyTimer = setInterval(reportLatency, LATENCY_REPORT_MS);
+
+    const frameUrlFor = (header, jpeg) => {
+      const url = URL.createObjectURL(new Blob([jpeg], { type: 'image/jpeg' }));
+      if (frameUrlRef.current) URL.revokeObjectURL(frameUrlRef.current);
+      frameUrlRef.current = url;
+      if (typeof header.ts === 'number') {
+        const ms = Math.max(0, Date.now() - header.ts * 1000);
+        latency.count += 1;
+        latency.sumMs += ms;
+        latency.maxMs = Math.max(latency.maxMs, ms);
+      }
+      return url;
+    };
+
+    const connect = async () => {
+      controller = new AbortController();
+      try {
+        const response = await fetch(`${API_BASE}/frames/${service}`, { signal: controller.signal });
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let pending = new Uint8Array(0);
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done || cancelled) break;
+          const merged = new Uint8Array(pending.length + value.length);
+          merged.set(pending);
+          merged.set(value, pending.length);
+          pending = merged;
+          while (pending.length >= 4) {
+            const headerLength = new DataView(pending.buffer, pending.byteOffset).getUint32(0);
+            if (pending.length < 4 + headerLength) break;
+            const header = JSON.parse(decoder.decode(pending.subarray(4, 4 + headerLength)));
+            const total = 4 + headerLength + (header.size || 0);
+            if (pending.length < total) break;
+            const url = header.size > 0 ? frameUrlFor(header, pending.slice(4 + headerLength, total)) : null;
+            setFrame({ ...header, url });
+            pending = pending.slice(total);
+          }
+        }
+      } catch (err) {
+        if (err.name !== 'AbortError') console.error('Frame stream error:', err);
+      }
+      if (!cancelled) reconnectTimer = setTimeout(connect, RECONNECT_MS);
+    };
+
+    connect();
+
+    return () => {
+      cancelled = true;
+      if (controller) controller.abort();
+      if (reconnectTimer) clearTimeout(reconnectTimer);
+      clearInterval(latencyTimer);
+      reportLatency();
+      if (frameUrlRef.current) {
+        URL.revokeObjectURL(frameUrlRef.current);
+        frameUrlRef.current = null;
+      }
+      setFrame(null);
+    };
+  }, [service, enabled]);
+
+  return frame;
+};
+
+export default useFrameStream;
@@ -0,0 +1,38 @@
+import { useEffect, useRef } from 'react';
+
+const API_BASE = 'http://localhost:3001';
+const EVENT_TYPES = ['status', 'count', 'recognition'];
+
+// Subscribe to the server.js status event relay (Server-Sent Events) for a
+// stream service. onEvent(type, data) is called for the current status on
+// connect and then for every status transition, count change or recognition.
+// EventSource reconnects on its own if the service restarts; while the
+// service is unreachable the relay sends a status event with status 'error'.
+const useServiceEvents = (service, enabled, onEvent) => {
+  const handlerRef = useRef(onEvent);
+
+  useEffect(() => {
+    handlerRef.current = onEvent;
+  }, [onEvent]);
+
+  useEffect(() => {
+    if (!enabled) return undefined;
+
+    const source = new EventSource(`${API_BASE}/events/${service}`);
+    const listener = (event) => {
+      try {
+        handlerRef.current(event.type, JSON.parse(event.data));
+      } catch (err) {
+        console.error('Bad status event:', err);
+      }
+    };
+    EVENT_TYPES.forEach((type) => source.addEventListener(type, listener));
+
+    return () => {
+      EVENT_TYPES.forEach((type) => source.removeEventListener(type, listener));
+      source.close();
+    };
+  }, [service, enabled]);
+};
+
+export default useServiceEvents;
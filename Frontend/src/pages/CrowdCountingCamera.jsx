@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import useFrameStream from '../hooks/useFrameStream';
+import useServiceEvents from '../hooks/useServiceEvents';
 import './CrowdCountingCamera.css';
 
 const CrowdCountingCamera = () => {
@@ -11,8 +13,6 @@ const CrowdCountingCamera = () => {
   const [result, setResult] = useState(null);
   const [currentFrame, setCurrentFrame] = useState(null);
   const [maxCount, setMaxCount] = useState(0);
-  const statusIntervalRef = useRef(null);
-  const frameIntervalRef = useRef(null);
   const isActiveRef = useRef(false);
   const maxCountRef = useRef(0);
 
@@ -26,26 +26,56 @@ const CrowdCountingCamera = () => {
 
   useEffect(() => {
     checkStatus();
-    return () => {
-      if (statusIntervalRef.current) clearInterval(statusIntervalRef.current);
-      if (frameIntervalRef.current) clearInterval(frameIntervalRef.current);
-    };
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, []); // Empty dependency array - only run on mount/unmount
+  }, []); // Empty dependency array - only run on mount
+
+  // Frames are pushed through server.js while counting is active
+  const pushedFrame = useFrameStream('crowd', isActive);
+
+  useEffect(() => {
+    if (!pushedFrame) return;
+    if (pushedFrame.url) {
+      setCurrentFrame(pushedFrame.url);
+      setMaxCount(pushedFrame.max_count || 0);
+    }
+    if (!pushedFrame.active && isActiveRef.current) {
+      cleanupIntervals();
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [pushedFrame]);
 
   const cleanupIntervals = () => {
     setIsActive(false);
-    if (statusIntervalRef.current) {
-      clearInterval(statusIntervalRef.current);
-      statusIntervalRef.current = null;
+    setCurrentFrame(null);
+  };
+
+  const finishCounting = (data) => {
+    cleanupIntervals();
+    setResult({
+      success: true,
+      message: data.message || 'Counting completed',
+      final_count: data.max_count || maxCountRef.current
+    });
+  };
+
+  // Status transitions and count changes are pushed by the service instead of polled
+  const handleStatusEvent = (type, data) => {
+    if (type === 'status' && data.status === 'error') {
+      // The relay reports this when the crowd counting service goes away
+      if (isActiveRef.current) {
+        cleanupIntervals();
+        setError('Connection lost to crowd counting server');
+      }
+      return;
     }
-    if (frameIntervalRef.current) {
-      clearInterval(frameIntervalRef.current);
-      frameIntervalRef.current = null;
+    setMaxCount(data.max_count || 0);
+    if (type === 'status' && ['completed', 'stopped'].includes(data.status) && isActiveRef.current) {
+      finishCounting(data);
     }
-    setCurrentFrame(null);
   };
 
+  useServiceEvents('crowd', isActive, handleStatusEvent);
+
   const startCrowdCounting = async () => {
     setIsLoading(true);
     setError('');
@@ -56,10 +86,6 @@ const CrowdCountingCamera = () => {
       if (response.data.success) {
         cleanupIntervals();
         setIsActive(true);
-        const statInt = setInterval(checkStatus, 2000);
-        const frameInt = setInterval(fetchCurrentFrame, 200);
-        statusIntervalRef.current = statInt;
-        frameIntervalRef.current = frameInt;
       } else {
         setError('Failed to start crowd counting');
       }
@@ -91,39 +117,11 @@ const CrowdCountingCamera = () => {
     }
   };
 
-  const fetchCurrentFrame = async () => {
-    try {
-      const response = await axios.get('http://localhost:5004/current-frame');
-      if (response.data.frame) {
-        setCurrentFrame(response.data.frame);
-        setMaxCount(response.data.max_count || 0);
-      }
-      if (!response.data.active && isActiveRef.current) {
-        cleanupIntervals();
-      }
-    } catch (err) {
-      console.error('Frame fetch error:', err);
-      // If frame fetching fails consistently, stop trying
-      if (isActiveRef.current && err.code === 'ECONNREFUSED') {
-        console.log('Stream server not responding, cleaning up...');
-        cleanupIntervals();
-      }
-    }
-  };
-
   const checkStatus = async () => {
     try {
       const response = await axios.get('http://localhost:3001/crowd-counting/status');
       if (response.data.success) {
         setMaxCount(response.data.max_count || 0);
-        if (['completed', 'stopped'].includes(response.data.status)) {
-          cleanupIntervals();
-          setResult({
-            success: true,
-            message: response.data.message || 'Counting completed',
-            final_count: response.data.max_count || maxCountRef.current
-          });
-        }
       }
     } catch (err) {
       console.error('Status check failed:', err);
@@ -188,7 +186,7 @@ const CrowdCountingCamera = () => {
               {currentFrame ? (
                 <>
                   <img 
-                    src={`data:image/jpeg;base64,${currentFrame}`} 
+                    src={currentFrame} 
                     alt="Live Feed" 
                     className="camera-feed square-feed" 
                   />
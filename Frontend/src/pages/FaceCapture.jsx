@@ -2,6 +2,8 @@ import { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import "./FaceCapture.css";
 import axios from 'axios';
+import useFrameStream from '../hooks/useFrameStream';
+import useServiceEvents from '../hooks/useServiceEvents';
 import './CrowdCountingCamera.css';
 
 function FaceCapture() {
@@ -12,6 +14,7 @@ function FaceCapture() {
   const [currentFrame, setCurrentFrame] = useState(null);
   const [progress, setProgress] = useState(0);
   const [finalStatus, setFinalStatus] = useState(null);
+  const [streaming, setStreaming] = useState(false);
   const lastResultRef = useRef({ status: null, message: '' });
   const isUnmounted = useRef(false);
 
@@ -22,14 +25,18 @@ function FaceCapture() {
   }
 
   const API_BASE = 'http://localhost:3001';
-  const statusIntervalRef = useRef(null);
-  const frameIntervalRef = useRef(null);
+
+  // Frames are pushed through server.js while the registration stream runs
+  const pushedFrame = useFrameStream('registration', streaming);
+
+  useEffect(() => {
+    if (pushedFrame?.url && !finalStatus && !isUnmounted.current) {
+      setCurrentFrame(pushedFrame.url);
+    }
+  }, [pushedFrame, finalStatus]);
 
   const cleanup = () => {
-    if (statusIntervalRef.current) clearInterval(statusIntervalRef.current);
-    if (frameIntervalRef.current) clearInterval(frameIntervalRef.current);
-    statusIntervalRef.current = null;
-    frameIntervalRef.current = null;
+    setStreaming(false);
   };
 
   // Helper to safely update state only if mounted and not finalized
@@ -37,6 +44,20 @@ function FaceCapture() {
     if (!isUnmounted.current && !finalStatus) setter();
   };
 
+  // Registration status (including capture progress) is pushed by the service
+  const handleStatusEvent = (type, data) => {
+    if (type !== 'status' || lastResultRef.current.status || isUnmounted.current) return;
+    safeSetState(() => setStatus(data.status || 'capturing'));
+    safeSetState(() => setMessage(data.message || '...'));
+    safeSetState(() => setProgress(typeof data.progress === 'number' ? data.progress : 0));
+    if (["completed", "error", "stopped"].includes(data.status)) {
+      safeSetFinal(data.status, data.message || (data.status === 'completed' ? 'Registration complete.' : 'Registration failed.'));
+      cleanup();
+    }
+  };
+
+  useServiceEvents('registration', streaming, handleStatusEvent);
+
   const stopRegistration = async () => {
     cleanup();
     try {
@@ -66,37 +87,8 @@ function FaceCapture() {
       await axios.post(`${API_BASE}/register-face/start`, { name: storedName, email: storedEmail });
       safeSetState(() => setStatus('capturing'));
       
-      // Start polling for status and frames
-      statusIntervalRef.current = setInterval(async () => {
-        try {
-          const { data } = await axios.get(`${API_BASE}/register-face/status`);
-          if (!lastResultRef.current.status && !isUnmounted.current) {
-            safeSetState(() => setStatus(data.status || 'capturing'));
-            safeSetState(() => setMessage(data.message || '...'));
-            safeSetState(() => setProgress(typeof data.progress === 'number' ? data.progress : 0));
-            if (["completed", "error", "stopped"].includes(data.status)) {
-              safeSetFinal(data.status, data.message || (data.status === 'completed' ? 'Registration complete.' : 'Registration failed.'));
-              cleanup();
-            }
-          }
-        } catch {
-          if (!lastResultRef.current.status && !isUnmounted.current) {
-            safeSetFinal('error', 'Connection to server lost.');
-            cleanup();
-          }
-        }
-      }, 1000);
-
-      frameIntervalRef.current = setInterval(async () => {
-        try {
-          const { data } = await axios.get(`${API_BASE}/register-face/current-frame`);
-          if (data.frame && !finalStatus && !isUnmounted.current) {
-            setCurrentFrame(data.frame);
-          }
-        } catch {
-          // Ignore frame errors silently, status poll will handle connection loss
-        }
-      }, 100);
+      // Status events and frames arrive over push streams while this is set
+      setStreaming(true);
 
     } catch (error) {
       setFinalStatus('error');
@@ -161,7 +153,7 @@ function FaceCapture() {
           <div className={`camera-overlay ${status === 'capturing' ? 'active' : ''}`}>
             <div className="camera-feed-container square">
               {currentFrame ? (
-                <img src={`data:image/jpeg;base64,${currentFrame}`} alt="Live registration feed" className="camera-feed square-feed" />
+                <img src={currentFrame} alt="Live registration feed" className="camera-feed square-feed" />
               ) : (
                 <div className="multi-face-placeholder">
                   <div className="loading-spinner" />
@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import useFrameStream from '../hooks/useFrameStream';
+import useServiceEvents from '../hooks/useServiceEvents';
 import './CrowdCountingCamera.css';
 
 const MultiFaceCamera = () => {
@@ -15,9 +17,7 @@ const MultiFaceCamera = () => {
   const [sessionId, setSessionId] = useState(() => Date.now());
   const [serverSessionId, setServerSessionId] = useState(null);
 
-  // Refs to avoid stale closures inside setInterval callbacks
-  const frameIntervalRef = useRef(null);
-  const statusIntervalRef = useRef(null);
+  // Refs to avoid stale closures inside timer and stream callbacks
   const authTimeoutRef = useRef(null);
   const completionTimeoutRef = useRef(null);
   const serverSessionIdRef = useRef(null);
@@ -78,126 +78,81 @@ const MultiFaceCamera = () => {
     };
   }, []);
 
-  useEffect(() => {
-    if (authenticationStarted) {
-      // Start polling for frames
-      const interval = setInterval(fetchCurrentFrame, 200);
-      frameIntervalRef.current = interval;
-      
-      // Start checking authentication status
-      const statusInt = setInterval(checkAuthStatus, 2000);
-      statusIntervalRef.current = statusInt;
-      
-      return () => {
-        if (interval) clearInterval(interval);
-        if (statusInt) clearInterval(statusInt);
-      };
-    }
-  }, [authenticationStarted]);
+  // Frames are pushed through server.js while authentication runs
+  const pushedFrame = useFrameStream('multi-face', authenticationStarted);
 
-  const fetchCurrentFrame = async () => {
-    try {
-      const response = await axios.get('http://localhost:5003/current-frame', {
-        headers: {
-          'Cache-Control': 'no-cache',
-          Pragma: 'no-cache',
-          Expires: '0',
-        },
-        params: { t: Date.now() }
-      });
-      if (response.data) {
-        // If server provided a session id and we don't have it yet, adopt it
-        if (response.data.session_id && !serverSessionIdRef.current) {
-          setServerSessionId(response.data.session_id);
-        }
-        // Ignore frames from an older/different server session
-        if (serverSessionIdRef.current && response.data.session_id && response.data.session_id !== serverSessionIdRef.current) {
-          return;
-        }
-        setCurrentFrame(response.data.frame || null);
-        setIsActive(Boolean(response.data.active));
-        if (response.data.recognized_count !== undefined) {
-          // Update recognized users count if needed
-        }
-      }
-      if (!response.data.active && isActiveRef.current) {
-        cleanupIntervals();
-        setCurrentFrame(null);
+  useEffect(() => {
+    if (!pushedFrame) return;
+    if (pushedFrame.url) {
+      // If server provided a session id and we don't have it yet, adopt it
+      if (pushedFrame.session_id && !serverSessionIdRef.current) {
+        setServerSessionId(pushedFrame.session_id);
       }
-    } catch (err) {
-      console.error('Frame fetch error:', err);
-      // If frame fetching fails consistently, stop trying
-      if (isActiveRef.current && err.code === 'ECONNREFUSED') {
-        console.log('Stream server not responding, cleaning up...');
-        cleanupIntervals();
-        setError('Connection lost to authentication server');
+      // Ignore frames from an older/different server session
+      if (serverSessionIdRef.current && pushedFrame.session_id && pushedFrame.session_id !== serverSessionIdRef.current) {
+        return;
       }
+      setCurrentFrame(pushedFrame.url);
+      setIsActive(Boolean(pushedFrame.active));
     }
-  };
+    if (!pushedFrame.active && isActiveRef.current) {
+      cleanupIntervals();
+      setCurrentFrame(null);
+    }
+  }, [pushedFrame]);
 
-  const checkAuthStatus = async () => {
-    try {
-      const response = await axios.get('http://localhost:5003/status', {
-        headers: {
-          'Cache-Control': 'no-cache',
-        },
-        params: { t: Date.now() }
-      });
-      if (response.data.session_id && !serverSessionIdRef.current) {
-        setServerSessionId(response.data.session_id);
-      }
-      if (serverSessionIdRef.current && response.data.session_id && response.data.session_id !== serverSessionIdRef.current) {
-        return;
-      }
-      if (response.data.recognized_users) {
-        setRecognizedUsers(response.data.recognized_users);
-      }
+  // Status transitions and recognitions are pushed by the service instead of polled
+  const handleStatusEvent = (type, data) => {
+    if (data.session_id && !serverSessionIdRef.current) {
+      setServerSessionId(data.session_id);
+    }
+    if (serverSessionIdRef.current && data.session_id && data.session_id !== serverSessionIdRef.current) {
+      return;
+    }
+    if (data.recognized_users) {
+      setRecognizedUsers(data.recognized_users);
+    }
+    if (type !== 'status') return;
 
-      // Decide completion based on backend status/result only (avoid stale gating)
-      const status = response.data.status;
-      const backendHasResult = typeof response.data.success === 'boolean' && !!response.data.message;
-      const shouldFinalize = backendHasResult || status === 'completed' || status === 'stopped' || status === 'failed';
+    if (data.status === 'error') {
+      // The relay reports this when the authentication service goes away
+      cleanupIntervals();
+      setIsLoading(false);
+      setAuthenticationStarted(false);
+      setError('Connection lost to authentication server');
+      return;
+    }
 
-      if (shouldFinalize) {
-        const finalUsers = response.data.recognized_users || recognizedUsersRef.current;
-        const success = backendHasResult
-          ? response.data.success
-          : (status === 'completed' || status === 'stopped') && finalUsers.length > 0;
-        const message = response.data.message || (status === 'stopped'
-          ? `Multi-face authentication completed. ${finalUsers.length} users recognized.`
-          : 'Authentication completed');
-        setResult({
-          success,
-          message,
-          recognizedUsers: finalUsers,
-          totalRecognized: finalUsers.length
-        });
-        setIsLoading(false);
-        setAuthenticationStarted(false);
-        setIsActive(false);
-        cleanupIntervals();
-      }
-    } catch (err) {
-      console.error('Error checking status:', err);
-      // Only cleanup if it's a connection error and we're supposed to be active
-      if (isActiveRef.current && (err.code === 'ECONNREFUSED' || err.response?.status === 404)) {
-        console.log('Authentication server not responding, cleaning up...');
-        cleanupIntervals();
-        setError('Connection lost to authentication server');
-      }
+    // Decide completion based on backend status/result only (avoid stale gating)
+    const status = data.status;
+    const backendHasResult = typeof data.success === 'boolean' && !!data.message;
+    const shouldFinalize = backendHasResult || status === 'completed' || status === 'stopped' || status === 'failed';
+
+    if (shouldFinalize) {
+      const finalUsers = data.recognized_users || recognizedUsersRef.current;
+      const success = backendHasResult
+        ? data.success
+        : (status === 'completed' || status === 'stopped') && finalUsers.length > 0;
+      const message = data.message || (status === 'stopped'
+        ? `Multi-face authentication completed. ${finalUsers.length} users recognized.`
+        : 'Authentication completed');
+      setResult({
+        success,
+        message,
+        recognizedUsers: finalUsers,
+        totalRecognized: finalUsers.length
+      });
+      setIsLoading(false);
+      setAuthenticationStarted(false);
+      setIsActive(false);
+      cleanupIntervals();
     }
   };
 
+  useServiceEvents('multi-face', authenticationStarted, handleStatusEvent);
+
   const cleanupIntervals = () => {
     setIsActive(false);
-    if (statusIntervalRef.current) {
-      clearInterval(statusIntervalRef.current);
-      statusIntervalRef.current = null;
-    }
-    if (frameIntervalRef.current) {
-      clearInterval(frameIntervalRef.current);
-      frameIntervalRef.current = null;
-    }
     setCurrentFrame(null);
     
     if (authTimeoutRef.current) {
@@ -241,11 +196,11 @@ const MultiFaceCamera = () => {
         if (response.data.sessionId) {
           setServerSessionId(response.data.sessionId);
         }
-        // Only begin polling after backend acknowledges start
+        // Only subscribe to status events after backend acknowledges start
         setSessionId(Date.now());
         setAuthenticationStarted(true);
         setIsActive(true);
-        setCurrentFrame(null); // ensure UI doesn't show a stale frame before the first fetch
+        setCurrentFrame(null); // ensure UI doesn't show a stale frame before the first pushed frame
         
         // Set a timeout to automatically complete authentication after 30 seconds
         const timeout = window.setTimeout(() => {
@@ -253,7 +208,7 @@ const MultiFaceCamera = () => {
         }, 30000);
         authTimeoutRef.current = timeout;
         
-        // Don't set result immediately, let the status polling handle it
+        // Don't set result immediately, let the status events handle it
       } else {
         throw new Error(response.data.message || 'Multi-face authentication failed');
       }
@@ -267,14 +222,14 @@ const MultiFaceCamera = () => {
   };
 
   const completeAuthentication = async () => {
-    // Clear auto-complete timer but keep polling until backend reports completion
+    // Clear auto-complete timer but keep listening until backend reports completion
     if (authTimeoutRef.current) {
       clearTimeout(authTimeoutRef.current);
       authTimeoutRef.current = null;
     }
     try {
       setIsLoading(true);
-      // Ask backend to stop the stream; status polling will capture the final result
+      // Ask backend to stop the stream; the final status event carries the result
       await axios.post('http://localhost:5003/stop');
       // Start a completion timeout to avoid indefinite wait
       if (!completionTimeoutRef.current) {
@@ -287,10 +242,10 @@ const MultiFaceCamera = () => {
         }, 15000);
         completionTimeoutRef.current = timeoutId;
       }
-      // Do NOT cleanup or set result here; wait for /status to report completion
+      // Do NOT cleanup or set result here; wait for the status event to report completion
     } catch (error) {
       void error;
-      // Don't fail immediately; keep polling for backend to finalize
+      // Don't fail immediately; keep listening for backend to finalize
       if (!completionTimeoutRef.current) {
         const timeoutId = window.setTimeout(() => {
           setIsLoading(false);
@@ -374,7 +329,7 @@ const MultiFaceCamera = () => {
               {currentFrame ? (
                 <img
                   key={`${sessionId}-${serverSessionId || 'na'}`}
-                  src={`data:image/jpeg;base64,${currentFrame}`}
+                  src={currentFrame}
                   alt="Live Multi-Face Authentication"
                   className="camera-feed square-feed"
                 />
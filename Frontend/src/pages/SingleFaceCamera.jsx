@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import useFrameStream from '../hooks/useFrameStream';
+import useServiceEvents from '../hooks/useServiceEvents';
 import './CrowdCountingCamera.css';
 
 const SingleFaceCamera = () => {
@@ -11,8 +13,6 @@ const SingleFaceCamera = () => {
   const [result, setResult] = useState(null);
   const [authenticationStarted, setAuthenticationStarted] = useState(false);
   const [currentFrame, setCurrentFrame] = useState(null);
-  const frameIntervalRef = useRef(null);
-  const statusIntervalRef = useRef(null);
   const isActiveRef = useRef(false);
 
   useEffect(() => {
@@ -28,22 +28,42 @@ const SingleFaceCamera = () => {
     }
   }, []);
 
+  // Frames are pushed through server.js while authentication runs
+  const pushedFrame = useFrameStream('single-face', authenticationStarted);
+
   useEffect(() => {
-    if (authenticationStarted) {
-      // Start polling for frames
-      const interval = setInterval(fetchCurrentFrame, 200);
-      frameIntervalRef.current = interval;
-      
-      // Start checking authentication status
-      const statusInt = setInterval(checkAuthStatus, 2000);
-      statusIntervalRef.current = statusInt;
-      
-      return () => {
-        if (interval) clearInterval(interval);
-        if (statusInt) clearInterval(statusInt);
-      };
+    if (!pushedFrame) return;
+    if (pushedFrame.url) {
+      setCurrentFrame(pushedFrame.url);
+      setIsActive(pushedFrame.active);
+    }
+    if (!pushedFrame.active && isActiveRef.current) {
+      cleanupIntervals();
+    }
+  }, [pushedFrame]);
+
+  // Status transitions are pushed by the service instead of polled
+  const handleStatusEvent = (type, data) => {
+    if (type === 'status' && data.status === 'error') {
+      // The relay reports this when the authentication service goes away
+      cleanupIntervals();
+      setAuthenticationStarted(false);
+      setError('Connection lost to authentication server');
+      return;
+    }
+    if (type === 'status' && data.success) {
+      setResult({
+        success: true,
+        message: data.message,
+        user: data.user
+      });
+      setAuthenticationStarted(false);
+      setIsActive(false);
+      cleanupIntervals();
     }
-  }, [authenticationStarted]);
+  };
+
+  useServiceEvents('single-face', authenticationStarted, handleStatusEvent);
 
   useEffect(() => {
     return () => {
@@ -52,61 +72,8 @@ const SingleFaceCamera = () => {
     };
   }, []);
 
-  const fetchCurrentFrame = async () => {
-    try {
-      const response = await axios.get('http://localhost:5002/current-frame');
-      if (response.data.frame) {
-        setCurrentFrame(response.data.frame);
-        setIsActive(response.data.active);
-      }
-      if (!response.data.active && isActiveRef.current) {
-        cleanupIntervals();
-      }
-    } catch (err) {
-      console.error('Frame fetch error:', err);
-      // If frame fetching fails consistently, stop trying
-      if (isActiveRef.current && err.code === 'ECONNREFUSED') {
-        console.log('Stream server not responding, cleaning up...');
-        cleanupIntervals();
-        setError('Connection lost to authentication server');
-      }
-    }
-  };
-
-  const checkAuthStatus = async () => {
-    try {
-      const response = await axios.get('http://localhost:5002/status');
-      if (response.data.success) {
-        setResult({
-          success: true,
-          message: response.data.message,
-          user: response.data.user
-        });
-        setAuthenticationStarted(false);
-        setIsActive(false);
-        cleanupIntervals();
-      }
-    } catch (err) {
-      console.error('Error checking status:', err);
-      // Only cleanup if it's a connection error and we're supposed to be active
-      if (isActiveRef.current && (err.code === 'ECONNREFUSED' || err.response?.status === 404)) {
-        console.log('Authentication server not responding, cleaning up...');
-        cleanupIntervals();
-        setError('Connection lost to authentication server');
-      }
-    }
-  };
-
   const cleanupIntervals = () => {
     setIsActive(false);
-    if (statusIntervalRef.current) {
-      clearInterval(statusIntervalRef.current);
-      statusIntervalRef.current = null;
-    }
-    if (frameIntervalRef.current) {
-      clearInterval(frameIntervalRef.current);
-      frameIntervalRef.current = null;
-    }
     setCurrentFrame(null);
   };
 
@@ -219,7 +186,7 @@ const SingleFaceCamera = () => {
             <div className="camera-feed-container square">
               {currentFrame ? (
                 <img 
-                  src={`data:image/jpeg;base64,${currentFrame}`} 
+                  src={currentFrame} 
                   alt="Live Authentication" 
                   className="camera-feed square-feed" 
                 />